@@ -64,7 +64,16 @@ import socket
 
 
 from listview import ListView
+from queueview import QueueView
 import opds
+import downloadqueue
+import covercache
+import filelistcache
+import httppool
+import bandwidth
+import peershare
+import journalindex
+import feedcache
 import languagenames
 import devicemanager
 
@@ -72,6 +81,16 @@ _MIMETYPES = {'PDF': 'application/pdf', 'PDF BW': 'application/pdf-bw',
                 'EPUB': 'application/epub+zip', 'DJVU': 'image/x.djvu'}
 _SOURCES = {}
 _SOURCES_CONFIG = {}
+_ALL_SOURCES = 'all_sources'
+
+# decoded covers, already scaled to the size they are shown at
+_PIXBUF_CACHE_SIZE = 64
+
+# get-books.cfg options for the bandwidth.BandwidthManager limits
+_BANDWIDTH_OPTIONS = (('total', 'bandwidth_limit'),
+                      ('foreground', 'foreground_limit'),
+                      ('background', 'background_limit'),
+                      ('per_transfer', 'transfer_limit'))
 
 READ_STREAM_SERVICE = 'read-activity-http'
 
@@ -90,18 +109,62 @@ class GetIABooksActivity(activity.Activity):
         self._sequence = 0
         self.selected_book = None
         self.queryresults = None
-        self._getter = None
         self.show_images = True
+        self.prefetch_pages = 1
+        self.federated_workers = 4
+        self.download_segments = 1
+        self.max_downloads = 2
+        self.cover_cache_size = 16 * 1024 * 1024
+        self.file_list_ttl = 7
+        self.segment_min_size = 8 * 1024 * 1024
+        self.peer_sharing = False
+        self.peer_address = ''
+        self.peer_port = peershare.PORT
         self.languages = {}
         self._lang_code_handler = languagenames.LanguageNames()
         self.catalogs_configuration = {}
         self.catalog_history = []
+        self._feed_cache = feedcache.FeedCache(
+            os.path.join(self.get_activity_root(), 'data', 'feeds'))
 
         if os.path.exists('/etc/get-books.cfg'):
             self._read_configuration('/etc/get-books.cfg')
         else:
             self._read_configuration()
 
+        self._cover_cache = covercache.CoverCache(
+            os.path.join(self.get_activity_root(), 'data', 'covers'),
+            self.cover_cache_size)
+        self._pixbuf_cache = covercache.LRUCache(_PIXBUF_CACHE_SIZE)
+        opds.set_file_list_cache(filelistcache.FileListCache(
+            os.path.join(self.get_activity_root(), 'data'),
+            self.file_list_ttl * 24 * 60 * 60))
+        self._cover_url = None
+
+        self._peer_share = None
+        if self.peer_sharing:
+            try:
+                self._peer_share = peershare.PeerShare(
+                    self.__get_shared_file_cb, port=self.peer_port,
+                    address=self.peer_address)
+            except OSError as e:
+                logging.error('Could not share books with peers: %s', e)
+
+        self._journal_index = journalindex.JournalIndex()
+        self._pending_download = None
+        datastore.find({'mime_type': list(set(_MIMETYPES.values()))},
+                       properties=journalindex.PROPERTIES,
+                       reply_handler=self.__journal_found_cb,
+                       error_handler=self.__journal_find_error_cb)
+        datastore.deleted.connect(self.__journal_deleted_cb)
+
+        self.download_queue = downloadqueue.DownloadQueue(
+            self.get_path, self.max_downloads, self.download_segments,
+            self.segment_min_size, self._peer_share)
+        self.download_queue.connect('item-added', self.__download_added_cb)
+        self.download_queue.connect('item-finished',
+                                    self.__download_finished_cb)
+
         toolbar_box = ToolbarBox()
         activity_button = ToolButton()
         color = profile.get_color()
@@ -128,7 +191,8 @@ class GetIABooksActivity(activity.Activity):
 
         self.using_powerd = os.access(POWERD_INHIBIT_DIR, os.W_OK)
 
-        self.__book_downloader = self.__image_downloader = None
+        self.__image_downloader = None
+        self.__links_resolver = None
 
     def get_path(self):
         self._sequence += 1
@@ -146,6 +210,8 @@ class GetIABooksActivity(activity.Activity):
         return False
 
     def _allow_suspend(self):
+        if self.download_queue.is_active():
+            return False
         if self.using_powerd:
             if os.path.exists(POWERD_INHIBIT_DIR + "/%u" % os.getpid()):
                 os.unlink(POWERD_INHIBIT_DIR + "/%u" % os.getpid())
@@ -161,6 +227,40 @@ class GetIABooksActivity(activity.Activity):
         config.read_file(open(file_name))
         if config.has_option('GetBooks', 'show_images'):
             self.show_images = config.getboolean('GetBooks', 'show_images')
+        if config.has_option('GetBooks', 'prefetch_pages'):
+            self.prefetch_pages = config.getint('GetBooks', 'prefetch_pages')
+        if config.has_option('GetBooks', 'federated_workers'):
+            self.federated_workers = config.getint('GetBooks',
+                                                   'federated_workers')
+        if config.has_option('GetBooks', 'cover_cache_size'):
+            # in megabytes
+            self.cover_cache_size = config.getint(
+                'GetBooks', 'cover_cache_size') * 1024 * 1024
+        if config.has_option('GetBooks', 'file_list_ttl'):
+            # in days
+            self.file_list_ttl = config.getint('GetBooks', 'file_list_ttl')
+        if config.has_option('GetBooks', 'max_downloads'):
+            self.max_downloads = config.getint('GetBooks', 'max_downloads')
+        if config.has_option('GetBooks', 'download_segments'):
+            self.download_segments = config.getint('GetBooks',
+                                                   'download_segments')
+        if config.has_option('GetBooks', 'segment_min_size'):
+            # in megabytes
+            self.segment_min_size = config.getint(
+                'GetBooks', 'segment_min_size') * 1024 * 1024
+        limits = {}
+        for key, option in _BANDWIDTH_OPTIONS:
+            if config.has_option('GetBooks', option):
+                # in kilobytes per second, 0 for no limit
+                limits[key] = config.getint('GetBooks', option) * 1024
+        if limits:
+            bandwidth.get_manager().set_limits(**limits)
+        if config.has_option('GetBooks', 'peer_sharing'):
+            self.peer_sharing = config.getboolean('GetBooks', 'peer_sharing')
+        if config.has_option('GetBooks', 'peer_address'):
+            self.peer_address = config.get('GetBooks', 'peer_address')
+        if config.has_option('GetBooks', 'peer_port'):
+            self.peer_port = config.getint('GetBooks', 'peer_port')
         self.languages = {}
         if config.has_option('GetBooks', 'languages'):
             languages_param = config.get('GetBooks', 'languages')
@@ -195,6 +295,8 @@ class GetIABooksActivity(activity.Activity):
                 else:
                     repo_config['ignore_mimetypes'] = []
 
+                self._read_network_policy(config, section,
+                                          repo_config['query_uri'])
                 _SOURCES_CONFIG[section] = repo_config
 
         logging.debug('_SOURCES %s', pformat(_SOURCES))
@@ -229,6 +331,38 @@ class GetIABooksActivity(activity.Activity):
         logging.debug('languages %s', pformat(self.languages))
         logging.debug('catalogs %s', pformat(self.catalogs))
 
+    def _read_network_policy(self, config, section, query_uri):
+        """
+        Applies the timeouts, retries, circuit breaker, rate limit and
+        caching proxy settings of a source section to its hosts, the
+        host of query_uri unless the section lists them in 'hosts'
+        """
+        policy = {}
+        for option in list(httppool.DEFAULT_POLICY.keys()):
+            if config.has_option(section, option):
+                policy[option] = config.getfloat(section, option)
+        for option in ('retries', 'failure_threshold', 'max_connections'):
+            if option in policy:
+                policy[option] = int(policy[option])
+        proxy_uri = None
+        if config.has_option(section, 'proxy_uri'):
+            proxy_uri = config.get(section, 'proxy_uri').strip()
+        if not policy and not proxy_uri:
+            return
+
+        if config.has_option(section, 'hosts'):
+            hosts = [host.strip() for host in
+                     config.get(section, 'hosts').split(',')]
+        else:
+            hosts = [urllib.parse.urlsplit(query_uri).hostname]
+        for host in hosts:
+            if not host:
+                continue
+            if policy:
+                httppool.get_pool().set_host_policy(host, **policy)
+            if proxy_uri:
+                httppool.get_pool().set_host_proxy(host, proxy_uri)
+
     def _add_search_controls(self, toolbar):
         book_search_item = Gtk.ToolItem()
         toolbar.search_entry = iconentry.IconEntry()
@@ -259,6 +393,12 @@ class GetIABooksActivity(activity.Activity):
         if len(self.catalogs) > 0:
             self.bt_catalogs.show()
 
+        self.bt_downloads = ToggleToolButton('data-download')
+        self.bt_downloads.set_tooltip(_('Downloads'))
+        toolbar.insert(self.bt_downloads, -1)
+        self.bt_downloads.connect('toggled', self.__toggle_downloads_cb)
+        self.bt_downloads.show()
+
         if len(self.languages) > 0:
             toolbar.config_toolbarbutton = ToolbarButton()
             toolbar.config_toolbarbutton.props.icon_name = 'preferences-system'
@@ -316,7 +456,7 @@ class GetIABooksActivity(activity.Activity):
             self.queryresults = None
 
         self.queryresults = opds.RemoteQueryResult(catalog_config,
-                '', query_language)
+                '', query_language, self._feed_cache, self.prefetch_pages)
         self.show_message(_('Performing lookup, please wait...'))
         # README: I think we should create some global variables for
         # each cursor that we are using to avoid the creation of them
@@ -331,7 +471,12 @@ class GetIABooksActivity(activity.Activity):
         for key in list(_MIMETYPES.keys()):
             if _MIMETYPES[key] in list(links.keys()) and \
                     not _MIMETYPES[key] in self.ignore_mimetypes:
-                self.format_combo.append_item(_MIMETYPES[key], key)
+                label = key
+                size = links[_MIMETYPES[key]]
+                # resolved links give the real size of the files
+                if isinstance(size, int) and size > 0:
+                    label = '%s (%s)' % (key, GLib.format_size(size))
+                self.format_combo.append_item(_MIMETYPES[key], label)
         self.format_combo.set_active(0)
         self.format_combo.handler_unblock(self.__format_changed_cb_id)
 
@@ -355,6 +500,9 @@ class GetIABooksActivity(activity.Activity):
             _SOURCES_CONFIG[key]['position'] = position
             position = position + 1
 
+        toolbar.source_combo.append_item(_ALL_SOURCES, _('All sources'),
+            icon_name='system-search')
+
         # Add menu for local books
         if len(_SOURCES) > 0:
             toolbar.source_combo.append_separator()
@@ -464,6 +612,12 @@ class GetIABooksActivity(activity.Activity):
             self.tree_scroller.hide()
             self.separa.hide()
 
+    def __toggle_downloads_cb(self, button):
+        if button.get_active():
+            self.queue_view.show_all()
+        else:
+            self.queue_view.hide()
+
     def _create_controls(self):
         self._download_content_length = 0
         self._download_content_type = None
@@ -571,11 +725,6 @@ class GetIABooksActivity(activity.Activity):
         self.progressbar.set_fraction(0.0)
         self.progressbox.pack_start(self.progressbar, expand=True, fill=True,
                 padding=0)
-        self.cancel_btn = Gtk.Button(stock=Gtk.STOCK_CANCEL)
-        self.cancel_btn.set_image(Icon(icon_name='dialog-cancel'))
-        self.cancel_btn.connect('clicked', self.__cancel_btn_clicked_cb)
-        self.progressbox.pack_start(self.cancel_btn, expand=False,
-                fill=False, padding=0)
         vbox_download.pack_start(self.progressbox, False, False, 10)
 
         bottom_hbox = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL)
@@ -592,6 +741,8 @@ class GetIABooksActivity(activity.Activity):
         vbox = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
         vbox.pack_start(self.msg_label, False, False, 10)
         vbox.pack_start(self.list_box, True, True, 0)
+        self.queue_view = QueueView(self.download_queue)
+        vbox.pack_start(self.queue_view, False, False, 0)
         vbox.pack_start(bottom_hbox, False, False, 10)
         self.set_canvas(vbox)
         self.listview.show()
@@ -608,11 +759,9 @@ class GetIABooksActivity(activity.Activity):
     def progress_hide(self):
         self.clear_downloaded_bytes()
         self.progressbar.set_sensitive(False)
-        self.cancel_btn.set_sensitive(False)
 
     def progress_show(self):
         self.progressbar.set_sensitive(True)
-        self.cancel_btn.set_sensitive(True)
 
     def filter_catalogs_by_source(self):
         self.catalogs = {}
@@ -641,11 +790,32 @@ class GetIABooksActivity(activity.Activity):
         if self.queryresults is not None:
             self.queryresults.cancel()
             self.queryresults = None
+        # unfinished transfers are kept and resume on the next download
+        self.download_queue.stop()
+        self._cover_cache.close()
+        if self._peer_share is not None:
+            self._peer_share.close()
+        logging.debug('HTTP pool %s',
+                      pformat(httppool.get_pool().get_stats()))
+        httppool.get_pool().close()
         return True
 
+    def get_book_source(self, book):
+        '''
+        Returns the source a book comes from, which differs from the
+        selected source when searching all of them
+        '''
+        if book is not None and book.get_source() is not None:
+            return book.get_source()
+        return self.source
+
     def selection_cb(self, widget):
         selected_book = self.listview.get_selected_book()
-        if self.source == 'local_books':
+        book_source = self.get_book_source(selected_book)
+        if self.source == _ALL_SOURCES and book_source in _SOURCES_CONFIG:
+            self.ignore_mimetypes = \
+                _SOURCES_CONFIG[book_source]['ignore_mimetypes']
+        if book_source == 'local_books':
             if selected_book:
                 self.selected_book = selected_book
                 self._download.hide()
@@ -655,12 +825,32 @@ class GetIABooksActivity(activity.Activity):
                         self.selected_title)
         else:
             self.clear_downloaded_bytes()
+            if self.__links_resolver is not None:
+                self.__links_resolver.stop()
+                self.__links_resolver = None
             if selected_book:
                 # print(selected_book.get_types())
                 self.update_format_combo(selected_book.get_types())
                 self.selected_book = selected_book
                 self._download.show()
                 self.show_book_data()
+                # find the files to download while the user looks at
+                # the book, so that Get Book can start right away
+                self.__links_resolver = selected_book.resolve_links(
+                    self.__links_resolved_cb, self.get_path())
+
+    def __links_resolved_cb(self, book):
+        if book is not self.selected_book:
+            # the resolver kept is that of the book selected since
+            return
+        self.__links_resolver = None
+        # keep the format the user may have picked meanwhile
+        value = self.format_combo.props.value
+        self.update_format_combo(book.get_types())
+        for position, row in enumerate(self.format_combo.get_model()):
+            if row[0] == value:
+                self.format_combo.set_active(position)
+                break
 
     def show_message(self, text):
         self.msg_label.set_text(text)
@@ -695,7 +885,7 @@ class GetIABooksActivity(activity.Activity):
         # Cover Image
         self.exist_cover_image = False
         if self.show_images and load_image:
-            if self.source == 'local_books':
+            if self.get_book_source(self.selected_book) == 'local_books':
                 cover_image_buffer = self.get_journal_entry_cover_image(
                         self.selected_book.get_object_id())
                 if (cover_image_buffer):
@@ -705,9 +895,37 @@ class GetIABooksActivity(activity.Activity):
                     self.add_default_image()
             else:
                 url_image = self.selected_book.get_image_url()
-                self.add_default_image()
+                self._cover_url = None
                 if url_image:
-                    self.download_image(list(url_image.values())[0])
+                    self.show_cover(list(url_image.values())[0])
+                else:
+                    self.add_default_image()
+
+    def show_cover(self, url):
+        '''
+        Shows the cover at url from the in-memory or the disk cache,
+        downloading it only when it is in neither
+        '''
+        self._cover_url = url
+        pixbuf = self._pixbuf_cache.get(url)
+        if pixbuf is None:
+            image_buffer = self._cover_cache.get(url)
+            if image_buffer is None:
+                self.add_default_image()
+                self.download_image(url)
+                return
+            try:
+                pixbuf = self.add_image_buffer(
+                    self.get_pixbuf_from_buffer(image_buffer))
+            except GLib.GError as e:
+                logging.error('Bad cached cover %s: %s', url, e)
+                self.add_default_image()
+                self.download_image(url)
+                return
+            self._pixbuf_cache.put(url, pixbuf)
+        else:
+            self.image.set_from_pixbuf(pixbuf)
+        self.exist_cover_image = True
 
     def get_pixbuf_from_buffer(self, image_buffer):
         """Buffer To Pixbuf"""
@@ -732,18 +950,29 @@ class GetIABooksActivity(activity.Activity):
         self.progress_show()
         if self.__image_downloader is not None:
             self.__image_downloader.stop()
-        self.__image_downloader = opds.FileDownloader(url, self.get_path())
-        self.__image_downloader.connect('updated', self.__image_updated_cb)
+        self.__image_downloader = opds.FileDownloader(
+            url, self.get_path(), priority=httppool.PRIORITY_INTERACTIVE)
+        self.__image_downloader.connect('updated', self.__image_updated_cb,
+                                        url)
         self.__image_downloader.connect('progress', self.__image_progress_cb)
 
-    def __image_updated_cb(self, downloader, path, content_type):
+    def __image_updated_cb(self, downloader, path, content_type, url):
         if path is not None:
-            self.add_image(path)
-            self.exist_cover_image = True
+            with open(path, 'rb') as f:
+                image_buffer = f.read()
             os.remove(path)
-        else:
-            self.add_default_image()
-        self.__image_downloader = None
+            try:
+                pixbuf = self.get_pixbuf_from_buffer(image_buffer)
+            except GLib.GError as e:
+                logging.error('Bad cover %s: %s', url, e)
+                pixbuf = None
+            if pixbuf is not None:
+                self._cover_cache.put(url, image_buffer)
+                if url == self._cover_url:
+                    self._pixbuf_cache.put(url, self.add_image_buffer(pixbuf))
+                    self.exist_cover_image = True
+        if downloader is self.__image_downloader:
+            self.__image_downloader = None
         GLib.timeout_add(500, self.progress_hide)
         self._allow_suspend()
 
@@ -786,6 +1015,7 @@ class GetIABooksActivity(activity.Activity):
                 GdkPixbuf.InterpType.BILINEAR)
 
         self.image.set_from_pixbuf(pixbuf2)
+        return pixbuf2
 
     def get_query_language(self):
         query_language = None
@@ -820,14 +1050,19 @@ class GetIABooksActivity(activity.Activity):
                 self.show_message(_('You must enter at least 3 letters.'))
                 self._books_toolbar.search_entry.grab_focus()
                 return
-            if self.source == 'Internet Archive':
+            if self.source == _ALL_SOURCES:
+                self.queryresults = opds.FederatedQueryResult(
+                        self._get_federated_backends(search_text,
+                                                     query_language),
+                        self.federated_workers)
+            elif self.source == 'Internet Archive':
                 self.queryresults = \
-                        opds.InternetArchiveQueryResult(search_text,
-                                                        self.get_path())
+                        opds.InternetArchiveQueryResult(search_text)
             elif self.source in _SOURCES_CONFIG:
                 repo_configuration = _SOURCES_CONFIG[self.source]
                 self.queryresults = opds.RemoteQueryResult(repo_configuration,
-                        search_text, query_language)
+                        search_text, query_language, self._feed_cache,
+                        self.prefetch_pages)
             else:
                 self.queryresults = opds.LocalVolumeQueryResult(self.source,
                         search_text, query_language)
@@ -836,8 +1071,64 @@ class GetIABooksActivity(activity.Activity):
             self.get_window().set_cursor(Gdk.Cursor(Gdk.CursorType.WATCH))
             self.queryresults.connect('updated', self.__query_updated_cb)
 
+    def _get_federated_backends(self, search_text, query_language):
+        # the Journal is searched in a thread, its datastore.find blocks
+        backends = [('local_books', _('My books'),
+                     lambda: opds.BookListQueryResult(
+                         lambda: self.get_entrys_info(search_text)))]
+        for key in list(_SOURCES.keys()):
+            if key == 'Internet Archive':
+                factory = lambda: opds.InternetArchiveQueryResult(search_text)
+            else:
+                factory = lambda config=_SOURCES_CONFIG[key]: \
+                    opds.RemoteQueryResult(config, search_text,
+                                           query_language, self._feed_cache,
+                                           self.prefetch_pages)
+            backends.append((key, _SOURCES[key], factory))
+
+        devices = self._device_manager.get_devices()
+        for device in list(devices.values()):
+            if device['have_catalog']:
+                mount_point = device['mount_path']
+                factory = lambda path=mount_point: \
+                    opds.LocalVolumeQueryResult(path, search_text,
+                                                query_language)
+                backends.append((mount_point, device['label'], factory))
+        return backends
+
+    def _get_federated_status_text(self):
+        texts = []
+        for status in self.queryresults.get_source_status():
+            if status['status'] in ('ok', 'empty') and status['more']:
+                # more results come when scrolling down
+                text = _('%(name)s: %(books)d+ (%(latency).1f s)') % status
+            elif status['status'] in ('ok', 'empty'):
+                text = _('%(name)s: %(books)d (%(latency).1f s)') % status
+            elif status['status'] == 'running' and status['books'] > 0:
+                text = _('%(name)s: %(books)d (%(latency).1f s)...') % status
+            elif status['status'] == 'running':
+                text = _('%s: searching...') % status['name']
+            elif status['status'] == 'queued':
+                text = _('%s: waiting') % status['name']
+            elif status['status'] == 'timeout':
+                text = _('%s: no answer') % status['name']
+            else:
+                text = _('%s: error') % status['name']
+            texts.append(text)
+        return '   '.join(texts)
+
     def __query_updated_cb(self, query, midway):
         self.listview.populate(self.queryresults)
+        if isinstance(self.queryresults, opds.FederatedQueryResult):
+            self.show_message(self._get_federated_status_text())
+            if not midway:
+                self.get_window().set_cursor(None)
+                self._allow_suspend()
+            return
+        if midway:
+            # a batch of a catalog still being read only adds its rows,
+            # the catalogs and messages wait for the whole of it
+            return
         if hasattr(self.queryresults, '_feedobj') and \
            'bozo_exception' in self.queryresults._feedobj:
             # something went wrong and we have to inform about this
@@ -856,7 +1147,7 @@ class GetIABooksActivity(activity.Activity):
             self.catalogs_updated(query, midway)
         elif len(self.queryresults) == 0:
             self.show_message(_('Sorry, no books could be found.'))
-        if not midway and len(self.queryresults) > 0:
+        if len(self.queryresults) > 0:
             self.hide_message()
             query_language = self.get_query_language()
             if query_language != 'all' and query_language != 'en':
@@ -955,123 +1246,176 @@ class GetIABooksActivity(activity.Activity):
         finally:
             return
 
-    def __cancel_btn_clicked_cb(self, btn):
-        if self.__image_downloader is not None:
-            self.__image_downloader.stop()
-
-        if self.__book_downloader is not None:
-            self.__book_downloader.stop()
-
-        self.progress_hide()
-        self.enable_button(True)
-        self.listview.props.sensitive = True
-        self._books_toolbar.search_entry.set_sensitive(True)
-        self._allow_suspend()
-
     def get_book(self):
-        self.enable_button(False)
-        self.clear_downloaded_bytes()
-        self.progress_show()
-        if self.source != 'local_books':
-            self.selected_book.get_download_links(self.format_combo.props.value,
-                                                  self.download_book,
-                                                  self.get_path())
+        if self.get_book_source(self.selected_book) != 'local_books':
+            content_type = self.format_combo.props.value
+            object_id = self._find_in_journal(self.selected_book,
+                                              content_type)
+            self._pending_download = (self.selected_book, content_type,
+                                      self._get_journal_metadata())
+            if object_id is not None:
+                self._object_id = object_id
+                self._show_journal_alert(_('Already in your Journal'),
+                                         self.selected_title,
+                                         download_again=True)
+                return
+            self._download_pending()
+
+    def _download_pending(self):
+        book, content_type, metadata = self._pending_download
+        self._pending_download = None
+        self.download_queue.add(book, content_type, metadata)
 
-    def download_book(self,  url):
-        logging.debug('DOWNLOAD BOOK %s', url)
+    def __download_added_cb(self, queue, item):
         self._inhibit_suspend()
-        self.listview.props.sensitive = False
-        self._books_toolbar.search_entry.set_sensitive(False)
-        self.__book_downloader = opds.FileDownloader(url, self.get_path())
-        self.__book_downloader.connect('updated', self.__book_updated_cb)
-        self.__book_downloader.connect('progress', self.__book_progress_cb)
-
-    def __book_updated_cb(self, downloader, path, content_type):
-        self._books_toolbar.search_entry.set_sensitive(True)
-        self.listview.props.sensitive = True
+        self.bt_downloads.set_active(True)
+
+    def __download_finished_cb(self, queue, item):
+        if item.state == downloadqueue.STATE_DONE:
+            logging.debug("Got document %s", item.path)
+            self.create_journal_entry(item)
+        elif item.state == downloadqueue.STATE_FAILED:
+            self._show_error_alert(item.error)
         self._allow_suspend()
-        GLib.timeout_add(500, self.progress_hide)
-        self.enable_button(True)
-        self.__book_downloader = None
-
-        if path is None:
-            self._show_error_alert(_('Error: Could not download %s. ' +
-                    'The path in the catalog seems to be incorrect.') %
-                    self.selected_title)
-            return
-
-        if os.stat(path).st_size == 0:
-            self._show_error_alert(_('Error: Could not download %s. ' +
-                    'The other end sent an empty file.') %
-                    self.selected_title)
-            return
-
-        if content_type.startswith('text/html'):
-            self._show_error_alert(_('Error: Could not download %s. ' +
-                    'The other end sent text/html instead of a book.') %
-                    self.selected_title)
-            return
-
-        self.process_downloaded_book(path)
-
-    def __book_progress_cb(self, downloader, progress):
-        self.progressbar.set_fraction(progress)
-        while Gtk.events_pending():
-            Gtk.main_iteration()
 
     def clear_downloaded_bytes(self):
         self.progressbar.set_fraction(0.0)
 
-    def process_downloaded_book(self, path):
-        logging.debug("Got document %s", path)
-        self.create_journal_entry(path)
-        self._getter = None
-        self._allow_suspend()
-
-    def create_journal_entry(self, path):
-        journal_entry = datastore.create()
+    def _get_journal_metadata(self):
+        '''
+        Returns the metadata of the Journal entry for the selected book,
+        taken now as the selection may change while it downloads
+        '''
+        metadata = {}
         journal_title = self.selected_title
         if self.selected_author != '':
             journal_title = journal_title + ', by ' + self.selected_author
-        journal_entry.metadata['title'] = journal_title
-        journal_entry.metadata['title_set_by_user'] = '1'
-        journal_entry.metadata['keep'] = '0'
-        journal_entry.metadata['mime_type'] = \
-                self.format_combo.props.value
+        metadata['title'] = journal_title
+        metadata['title_set_by_user'] = '1'
+        metadata['keep'] = '0'
+        metadata['mime_type'] = self.format_combo.props.value
         # Fix fake mime type for black&white pdfs
-        if journal_entry.metadata['mime_type'] == _MIMETYPES['PDF BW']:
-            journal_entry.metadata['mime_type'] = _MIMETYPES['PDF']
+        if metadata['mime_type'] == _MIMETYPES['PDF BW']:
+            metadata['mime_type'] = _MIMETYPES['PDF']
 
-        journal_entry.metadata['buddies'] = ''
-        journal_entry.metadata['icon-color'] = profile.get_color().to_string()
+        metadata['buddies'] = ''
+        metadata['icon-color'] = profile.get_color().to_string()
         textbuffer = self.textview.get_buffer()
-        journal_entry.metadata['description'] = \
+        metadata['description'] = \
             textbuffer.get_text(textbuffer.get_start_iter(),
                                 textbuffer.get_end_iter(), True)
         if self.exist_cover_image:
             image_buffer = self._get_preview_image_buffer()
-            journal_entry.metadata['preview'] = dbus.ByteArray(image_buffer)
+            metadata['preview'] = dbus.ByteArray(image_buffer)
             image_buffer = self._get_cover_image_buffer()
-            journal_entry.metadata['cover_image'] = \
+            metadata['cover_image'] = \
                 dbus.ByteArray(base64.b64encode(image_buffer))
         else:
-            journal_entry.metadata['cover_image'] = ""
+            metadata['cover_image'] = ""
+
+        source = self.get_book_source(self.selected_book)
+        metadata['tags'] = source
+        metadata['source'] = source
+        metadata['author'] = self.selected_author
+        metadata['publisher'] = self.selected_publisher
+        metadata['summary'] = self.selected_summary
+        metadata['language'] = self.selected_language_code
+        return metadata
+
+    def __journal_found_cb(self, entries, total_count):
+        # the books downloaded before, found without blocking the UI
+        for entry in entries:
+            self._journal_index.add(str(entry['uid']), entry)
+        logging.debug('%d books downloaded before',
+                      len(self._journal_index))
+        if self._peer_share is not None:
+            for sha1, object_id, mime_type in \
+                    self._journal_index.get_checksums():
+                self._peer_share.add(sha1, object_id, mime_type)
+
+    def __journal_find_error_cb(self, error):
+        logging.error('Could not index the Journal: %s', error)
+
+    def __journal_deleted_cb(self, sender, object_id=None, **kwargs):
+        sha1 = self._journal_index.remove(object_id)
+        if self._peer_share is None or not sha1:
+            return
+        self._peer_share.remove(sha1)
+        # another copy of the same book can still be shared
+        for other_sha1, other_id, mime_type in \
+                self._journal_index.get_checksums():
+            if other_sha1.lower() == sha1.lower():
+                self._peer_share.add(other_sha1, other_id, mime_type)
+                break
 
-        journal_entry.metadata['tags'] = self.source
-        journal_entry.metadata['source'] = self.source
-        journal_entry.metadata['author'] = self.selected_author
-        journal_entry.metadata['publisher'] = self.selected_publisher
-        journal_entry.metadata['summary'] = self.selected_summary
-        journal_entry.metadata['language'] = self.selected_language_code
+    def _find_in_journal(self, book, content_type):
+        '''
+        Returns the object id of the Journal entry holding book in
+        content_type, downloaded before, or None
+        '''
+        url = book.get_types().get(content_type)
+        if not isinstance(url, str) or not url.startswith('http'):
+            url = None
+        mime_type = content_type
+        if mime_type == _MIMETYPES['PDF BW']:
+            mime_type = _MIMETYPES['PDF']
+        return self._journal_index.lookup(
+            self.get_book_source(book), book.get_identifier(), mime_type,
+            url, book.get_checksum(content_type))
+
+    def __get_shared_file_cb(self, object_id):
+        # a link of our own, as the copy given by the datastore goes
+        # away with ds_object
+        ds_object = datastore.get(object_id)
+        try:
+            path = self.get_path()
+            os.link(ds_object.get_file_path(), path)
+        finally:
+            ds_object.destroy()
+        return path
 
-        journal_entry.file_path = path
+    def create_journal_entry(self, item):
+        journal_entry = datastore.create()
+        for key, value in item.metadata.items():
+            journal_entry.metadata[key] = value
+        if item.checksum is not None:
+            journal_entry.metadata['sha1'] = item.checksum
+        if item.book.get_identifier():
+            journal_entry.metadata['source_id'] = item.book.get_identifier()
+        if item.url is not None:
+            journal_entry.metadata['source_url'] = item.url
+        # the datastore can only create entries synchronously, so the
+        # entry is created without its file, which is added afterwards
+        # by an asynchronous update while the UI keeps running.  The
+        # file is handed over rather than copied: the datastore renames
+        # it into place, as the activity root is normally on the same
+        # filesystem, and only copies it, then removes it, otherwise
         datastore.write(journal_entry)
-        os.remove(path)
-        self.progress_hide()
-        self._object_id = journal_entry.object_id
-        self._show_journal_alert(_('Download completed'), self.selected_title)
-
-    def _show_journal_alert(self, title, msg):
+        journal_entry.file_path = item.path
+
+        def write_cb(*args):
+            self._object_id = journal_entry.object_id
+            self._journal_index.add(journal_entry.object_id,
+                                    journal_entry.metadata)
+            if self._peer_share is not None and item.checksum is not None:
+                self._peer_share.add(item.checksum, journal_entry.object_id,
+                                     journal_entry.metadata['mime_type'])
+            self._show_journal_alert(_('Download completed'),
+                                     item.book.get_title())
+
+        def error_cb(error):
+            logging.error('Could not save %s: %s', item.path, error)
+            if os.path.exists(item.path):
+                os.remove(item.path)
+            # do not leave the entry created above without its book
+            datastore.delete(journal_entry.object_id)
+            self._show_error_alert(_('Error: Could not save %s in the '
+                                     'Journal.') % item.get_title())
+
+        datastore.write(journal_entry, transfer_ownership=True,
+                        reply_handler=write_cb, error_handler=error_cb)
+
+    def _show_journal_alert(self, title, msg, download_again=False):
         _stop_alert = Alert()
         _stop_alert.props.title = title
         _stop_alert.props.msg = msg
@@ -1089,6 +1433,12 @@ class GetIABooksActivity(activity.Activity):
             _stop_alert.add_button(Gtk.ResponseType.APPLY, label, icon)
         icon.show()
 
+        if download_again:
+            download_icon = Icon(icon_name='data-download')
+            _stop_alert.add_button(Gtk.ResponseType.YES,
+                                   _('Download again'), download_icon)
+            download_icon.show()
+
         ok_icon = Icon(icon_name='dialog-ok')
         _stop_alert.add_button(Gtk.ResponseType.OK, _('Ok'), ok_icon)
         ok_icon.show()
@@ -1105,6 +1455,9 @@ class GetIABooksActivity(activity.Activity):
             activity.show_object_in_journal(self._object_id)
         elif response_id is Gtk.ResponseType.ACCEPT:
             launch_bundle(object_id=self._object_id)
+        elif response_id is Gtk.ResponseType.YES and \
+                self._pending_download is not None:
+            self._download_pending()
         self.remove_alert(alert)
 
     def _get_preview_image_buffer(self):
@@ -0,0 +1,187 @@
+#! /usr/bin/env python3
+
+# Copyright (C) 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import logging
+import threading
+import time
+
+# limits are in bytes per second, 0 means unlimited; a transfer reads
+# from the network in chunks of about this share of a second of its
+# rate, so that its progress keeps moving smoothly
+_CHUNK_TIME = 0.25
+_MIN_CHUNK_SIZE = 1024
+
+# how far a bucket may run ahead, so that an idle bucket does not let
+# through a burst bigger than this many seconds of its rate
+_BURST_TIME = 1.0
+
+
+class TokenBucket(object):
+    """
+    Byte rate limiter shared by threads.  consume() charges the bytes
+    already read and returns how long the caller has to wait before it
+    reads more; going into debt instead of waiting for the tokens up
+    front keeps the readers of a shared bucket from starving each other.
+    """
+
+    def __init__(self, rate=0):
+        self._lock = threading.Lock()
+        self._rate = rate
+        self._tokens = 0.0
+        self._updated = time.time()
+
+    def get_rate(self):
+        return self._rate
+
+    def set_rate(self, rate):
+        with self._lock:
+            self._refill()
+            self._rate = rate
+
+    def _refill(self):
+        now = time.time()
+        if self._rate:
+            self._tokens = min(self._rate * _BURST_TIME, self._tokens +
+                               (now - self._updated) * self._rate)
+        self._updated = now
+
+    def consume(self, size):
+        with self._lock:
+            self._refill()
+            if not self._rate:
+                self._tokens = 0.0
+                return 0
+            self._tokens -= size
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self._rate
+
+
+class Transfer(object):
+    """
+    The throttle of one download, made of its own bucket and the
+    global one.  Background transfers yield to foreground ones.
+    """
+
+    def __init__(self, manager, background):
+        self._manager = manager
+        self.background = background
+        self.bucket = TokenBucket()
+
+    def get_chunk_size(self, default):
+        rates = [rate for rate in (self.bucket.get_rate(),
+                                   self._manager.total.get_rate()) if rate]
+        if not rates:
+            return default
+        return max(_MIN_CHUNK_SIZE,
+                   min(default, int(min(rates) * _CHUNK_TIME)))
+
+    def throttle(self, size, stopthread=None):
+        """
+        Charges size bytes just read, and sleeps until the transfer may
+        read again.  Returns False if stopthread got set meanwhile.
+        """
+        delay = max(self.bucket.consume(size),
+                    self._manager.total.consume(size))
+        if delay <= 0:
+            return True
+        if stopthread is not None:
+            return not stopthread.wait(delay)
+        time.sleep(delay)
+        return True
+
+    def set_background(self, background):
+        self._manager.set_background(self, background)
+
+    def close(self):
+        self._manager.remove(self)
+
+
+class BandwidthManager(object):
+    """
+    Splits the download bandwidth between the running transfers.
+
+    total caps all of them together.  Foreground and background
+    transfers share, in equal parts, their own cap, and every transfer
+    is also held to per_transfer.  The share of each transfer is worked
+    out again whenever one starts, ends or changes class, or when the
+    limits change, so that starting a download slows down the others.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._transfers = []
+        self._limits = {'total': 0, 'foreground': 0, 'background': 0,
+                        'per_transfer': 0}
+        self.total = TokenBucket()
+
+    def set_limits(self, **limits):
+        with self._lock:
+            for key, value in limits.items():
+                if key not in self._limits:
+                    raise KeyError(key)
+                self._limits[key] = max(0, int(value))
+            self.total.set_rate(self._limits['total'])
+            self._share()
+        logging.debug('Bandwidth limits set to %s', self._limits)
+
+    def get_limits(self):
+        with self._lock:
+            return dict(self._limits)
+
+    def add(self, background=False):
+        transfer = Transfer(self, background)
+        with self._lock:
+            self._transfers.append(transfer)
+            self._share()
+        return transfer
+
+    def remove(self, transfer):
+        with self._lock:
+            if transfer in self._transfers:
+                self._transfers.remove(transfer)
+                self._share()
+
+    def set_background(self, transfer, background):
+        with self._lock:
+            transfer.background = background
+            self._share()
+
+    def _share(self):
+        for background, key in ((False, 'foreground'),
+                                (True, 'background')):
+            transfers = [transfer for transfer in self._transfers
+                         if transfer.background == background]
+            rates = [rate for rate in (self._limits['per_transfer'],
+                                       self._limits[key] //
+                                       max(1, len(transfers))) if rate]
+            for transfer in transfers:
+                transfer.bucket.set_rate(min(rates) if rates else 0)
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_manager():
+    """Returns the process-wide BandwidthManager"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = BandwidthManager()
+    return _manager
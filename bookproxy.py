@@ -0,0 +1,858 @@
+#! /usr/bin/env python3
+
+# Copyright (C) 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+Caching proxy for Get Books, to run on a school server.
+
+The laptops ask it for {proxy_uri}/{scheme}/{host}/{path}, as done by
+httppool for the hosts of a source with 'proxy_uri' in get-books.cfg,
+and it answers from its disk cache, fetching from the real host only
+what it does not have yet or what has to be validated again.  Feeds,
+_files.xml lists, covers and book files are all kept, byte ranges are
+served from the cache so that resumed and segmented downloads work.
+What is being fetched is sent to the laptops asking for it as it
+arrives, so that a big book does not keep them waiting.  Only http
+and https URLs of the allowed hosts and their subdomains are fetched,
+archive.org unless told otherwise; it is not an open proxy.
+
+    python3 bookproxy.py serve --port 8081 --cache-dir /var/cache/books \
+        --allow-host archive.org
+    python3 bookproxy.py loadtest --clients 30 URL...
+
+The loadtest command plays a classroom of laptops against a proxy
+running on this machine and reports latencies and cache hits.
+"""
+
+import argparse
+import hashlib
+import http.client
+import http.server
+import json
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import httppool
+
+_PORT = 8081
+# the 'hosts' of the sources in get-books.cfg
+_HOSTS = ('archive.org',)
+_MAX_SIZE = 4 * 1024 * 1024 * 1024
+_MAX_OBJECT_SIZE = 512 * 1024 * 1024
+
+# feeds, search results and file lists change, covers and book files
+# hardly ever do; both are validated again with the origin once older
+_FEED_TTL = 60 * 60
+_FILE_TTL = 7 * 24 * 60 * 60
+_FEED_TYPES = ('xml', 'json', 'csv', 'text/')
+
+_CHUNK_SIZE = 64 * 1024
+_LOW_WATER = 0.9
+# how often a laptop waiting for the bytes of a fetch checks on it
+_WAIT_INTERVAL = 1
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# response headers kept with a cached object and sent to the laptops
+_KEPT_HEADERS = ('Content-Type', 'Content-Encoding', 'ETag',
+                 'Last-Modified')
+
+
+def get_upstream_url(path):
+    """Returns the origin URL of a proxy path, or None"""
+    scheme, _, rest = path.lstrip('/').partition('/')
+    if scheme not in ('http', 'https') or not rest:
+        return None
+    return '%s://%s' % (scheme, rest)
+
+
+def is_allowed_url(url, hosts):
+    """
+    True when url is http or https, without credentials, on one of
+    hosts or a subdomain of one
+    """
+    try:
+        parts = urllib.parse.urlsplit(url)
+        parts.port
+    except ValueError:
+        return False
+    if parts.scheme not in ('http', 'https') or '@' in parts.netloc:
+        return False
+    host = (parts.hostname or '').lower().rstrip('.')
+    if not host:
+        return False
+    for allowed in hosts:
+        allowed = allowed.lower()
+        if host == allowed or host.endswith('.' + allowed):
+            return True
+    return False
+
+
+class ProxyCache(object):
+    """
+    Responses of the origin servers on disk, one data file and one JSON
+    file with the kept headers per URL.  The least recently used are
+    evicted when the total goes over max_size.
+    """
+
+    def __init__(self, path, max_size=_MAX_SIZE,
+                 max_object_size=_MAX_OBJECT_SIZE):
+        self._path = path
+        self._max_size = max_size
+        self.max_object_size = max_object_size
+        self._lock = threading.Lock()
+        self._index = {}
+        if not os.path.exists(path):
+            os.makedirs(path)
+        for name in os.listdir(path):
+            if name.endswith('.tmp'):
+                # left by a transfer cut short
+                os.remove(os.path.join(path, name))
+                continue
+            if not name.endswith('.json'):
+                continue
+            key = name[:-len('.json')]
+            try:
+                with open(os.path.join(path, name), 'r') as f:
+                    meta = json.load(f)
+                meta['size'] = os.path.getsize(self._data_path(key))
+            except (IOError, OSError, ValueError):
+                self._remove(key)
+                continue
+            meta['used'] = meta['fetched']
+            self._index[key] = meta
+        logging.info('%d objects, %d bytes in the cache', len(self._index),
+                     sum(meta['size'] for meta in self._index.values()))
+
+    def _key(self, url):
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    def _data_path(self, key):
+        return os.path.join(self._path, key + '.data')
+
+    def _meta_path(self, key):
+        return os.path.join(self._path, key + '.json')
+
+    def _remove(self, key):
+        for path in (self._data_path(key), self._meta_path(key)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def lookup(self, url):
+        """Returns the kept headers of url, with its data 'path', or None"""
+        key = self._key(url)
+        with self._lock:
+            meta = self._index.get(key)
+            if meta is None:
+                return None
+            meta['used'] = time.time()
+            meta = dict(meta)
+        meta['path'] = self._data_path(key)
+        return meta
+
+    def open(self, url):
+        """
+        Returns the kept headers of url with its data opened as 'file',
+        or None; once open, the data stays readable if it is evicted
+        """
+        key = self._key(url)
+        with self._lock:
+            meta = self._index.get(key)
+            if meta is None:
+                return None
+            try:
+                f = open(self._data_path(key), 'rb')
+            except OSError:
+                del self._index[key]
+                self._remove(key)
+                return None
+            meta['used'] = time.time()
+            meta = dict(meta)
+        meta['path'] = self._data_path(key)
+        meta['file'] = f
+        return meta
+
+    def new_file(self):
+        """Returns a file to write a response into, in the cache directory"""
+        return tempfile.NamedTemporaryFile(dir=self._path, suffix='.tmp',
+                                           delete=False)
+
+    def store(self, url, meta, tmp_path):
+        key = self._key(url)
+        meta = dict(meta, url=url, size=os.path.getsize(tmp_path))
+        meta.pop('path', None)
+        with self._lock:
+            os.replace(tmp_path, self._data_path(key))
+            with open(self._meta_path(key) + '.tmp', 'w') as f:
+                json.dump(meta, f)
+            os.replace(self._meta_path(key) + '.tmp', self._meta_path(key))
+            meta['used'] = time.time()
+            self._index[key] = meta
+            self._evict()
+        meta['path'] = self._data_path(key)
+        return meta
+
+    def refresh(self, url, meta):
+        """Records that url was validated again with its origin"""
+        key = self._key(url)
+        with self._lock:
+            if key not in self._index:
+                return
+            self._index[key]['fetched'] = meta['fetched']
+            stored = dict(self._index[key])
+            stored.pop('used', None)
+            with open(self._meta_path(key) + '.tmp', 'w') as f:
+                json.dump(stored, f)
+            os.replace(self._meta_path(key) + '.tmp', self._meta_path(key))
+
+    def _evict(self):
+        size = sum(meta['size'] for meta in self._index.values())
+        if size <= self._max_size:
+            return
+        entries = sorted(self._index.items(),
+                         key=lambda item: item[1]['used'])
+        for key, meta in entries:
+            if size <= self._max_size * _LOW_WATER:
+                break
+            # files being sent stay readable until they are closed
+            self._remove(key)
+            del self._index[key]
+            size -= meta['size']
+            logging.debug('Evicted %s', meta['url'])
+
+
+class _Fetch(object):
+    """
+    A response of an origin on its way into the cache.  Its body is
+    written to 'path', 'written' bytes of it so far, and the laptops
+    that ask for it meanwhile are sent what is there while it grows.
+    When there is no body to send, 'result' tells what to answer.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.cond = threading.Condition()
+        self.ready = False
+        self.result = None
+        self.error = None
+        self.meta = None
+        self.length = None
+        self.path = None
+        self.stored = False
+        self.result_cache = 'MISS'
+        self.written = 0
+        self.finished = False
+
+    def wait_ready(self):
+        with self.cond:
+            while not self.ready:
+                self.cond.wait(_WAIT_INTERVAL)
+
+    def open(self):
+        """Returns the body file opened for reading, or None if it is gone"""
+        with self.cond:
+            if self.path is None:
+                return None
+            return open(self.path, 'rb')
+
+    def wait_for(self, position):
+        """
+        Waits until there is more than position bytes of the body, or
+        it ended.  Returns how many bytes there are.
+        """
+        with self.cond:
+            while self.written <= position and not self.finished:
+                self.cond.wait(_WAIT_INTERVAL)
+            return self.written
+
+
+class Proxy(object):
+    """Answers requests for origin URLs from a ProxyCache"""
+
+    def __init__(self, cache, feed_ttl=_FEED_TTL, file_ttl=_FILE_TTL,
+                 hosts=_HOSTS):
+        self._cache = cache
+        self._feed_ttl = feed_ttl
+        self._file_ttl = file_ttl
+        self._hosts = list(hosts)
+        # a URL is fetched by one thread at a time, so that a whole
+        # classroom asking for the same book fetches it once
+        self._lock = threading.Lock()
+        self._fetches = {}
+        self._stats_lock = threading.Lock()
+        self.stats = {'HIT': 0, 'MISS': 0, 'REVALIDATED': 0, 'STALE': 0,
+                      'UNCACHED': 0}
+
+    def is_allowed(self, url):
+        '''True when url, or a URL it redirects to, may be fetched'''
+        return is_allowed_url(url, self._hosts)
+
+    def _is_fresh(self, meta):
+        content_type = meta['headers'].get('Content-Type') or ''
+        ttl = self._file_ttl
+        if any(kind in content_type for kind in _FEED_TYPES):
+            ttl = self._feed_ttl
+        return time.time() - meta['fetched'] < ttl
+
+    def get(self, url):
+        """
+        Returns what to answer to a GET of url, with the 'cache'
+        outcome: the headers of a cached object with its data open as
+        'file', or those of the _Fetch 'fetch' of it with its body file
+        open, or the status of an error of the origin, with no file.
+        Raises URLError when the origin cannot be reached and nothing
+        is cached.
+        """
+        while True:
+            meta = self._cache.open(url)
+            if meta is not None:
+                if self._is_fresh(meta):
+                    return self._outcome(meta, 'HIT')
+                meta['file'].close()
+
+            fetch, leader = self._get_fetch(url)
+            fetch.wait_ready()
+            if fetch.error is not None:
+                raise urllib.error.URLError(fetch.error)
+            if fetch.result is not None:
+                if fetch.result['path'] is None:
+                    return self._outcome(fetch.result, 'UNCACHED')
+                meta = self._cache.open(url)
+                if meta is None:
+                    # evicted already, ask again
+                    continue
+                return self._outcome(meta, fetch.result['cache'])
+            f = fetch.open()
+            if f is None:
+                # done and not kept, ask again
+                continue
+            cache = fetch.result_cache if leader else 'HIT'
+            return self._outcome(dict(fetch.meta, fetch=fetch, file=f),
+                                 cache)
+
+    def head(self, url):
+        """
+        Returns the headers to answer a HEAD of url with, and its
+        'length' when known, from the cache, from the fetch in progress
+        or from the origin, which is not asked for the body
+        """
+        meta = self._cache.lookup(url)
+        if meta is not None and self._is_fresh(meta):
+            return self._outcome(dict(meta, length=meta['size']), 'HIT')
+
+        with self._lock:
+            fetch = self._fetches.get(url)
+        if fetch is not None:
+            fetch.wait_ready()
+            if fetch.meta is not None:
+                return self._outcome(dict(fetch.meta, length=fetch.length),
+                                     'HIT')
+
+        response = httppool.get_pool().request(url, method='HEAD',
+                                               allow=self.is_allowed)
+        response.close()
+        meta = self._get_meta(response)
+        length = response.getheader('Content-Length')
+        meta['length'] = int(length) if length is not None else None
+        return self._outcome(meta, 'UNCACHED')
+
+    def get_range(self, url, headers):
+        """
+        Returns the response of the origin to a range request for url,
+        which is not cached
+        """
+        response = httppool.get_pool().request(url, headers,
+                                               allow=self.is_allowed)
+        with self._stats_lock:
+            self.stats['UNCACHED'] += 1
+        return response
+
+    def _get_fetch(self, url):
+        with self._lock:
+            fetch = self._fetches.get(url)
+            if fetch is not None:
+                return fetch, False
+            fetch = _Fetch(url)
+            self._fetches[url] = fetch
+        thread = threading.Thread(target=self._run_fetch, args=(fetch,))
+        thread.daemon = True
+        thread.start()
+        return fetch, True
+
+    def _get_meta(self, response):
+        meta = {'status': response.status, 'reason': response.reason,
+                'fetched': time.time(), 'headers': {}}
+        for header in _KEPT_HEADERS:
+            if response.getheader(header):
+                meta['headers'][header] = response.getheader(header)
+        return meta
+
+    def _run_fetch(self, fetch):
+        try:
+            self._fetch(fetch)
+        except (urllib.error.URLError, http.client.HTTPException,
+                OSError) as e:
+            logging.error('Could not fetch %s: %s', fetch.url, e)
+            with fetch.cond:
+                fetch.error = e
+        finally:
+            with self._lock:
+                del self._fetches[fetch.url]
+            with fetch.cond:
+                if fetch.path is not None and not fetch.stored:
+                    # not kept, readers that have it open keep reading
+                    try:
+                        os.remove(fetch.path)
+                    except OSError:
+                        pass
+                    fetch.path = None
+                fetch.ready = True
+                fetch.finished = True
+                fetch.cond.notify_all()
+
+    def _set_result(self, fetch, result, cache):
+        with fetch.cond:
+            fetch.result = dict(result, cache=cache)
+            fetch.ready = True
+            fetch.cond.notify_all()
+
+    def _fetch(self, fetch):
+        """
+        Fetches fetch.url into a new file of the cache, or validates
+        the cached copy again
+        """
+        url = fetch.url
+        cached = self._cache.lookup(url)
+        headers = {}
+        if cached is not None:
+            if cached['headers'].get('ETag'):
+                headers['If-None-Match'] = cached['headers']['ETag']
+            if cached['headers'].get('Last-Modified'):
+                headers['If-Modified-Since'] = \
+                    cached['headers']['Last-Modified']
+        try:
+            response = httppool.get_pool().request(url, headers,
+                                                   allow=self.is_allowed)
+        except urllib.error.URLError as e:
+            if cached is None:
+                raise
+            logging.warning('Serving stale %s: %s', url, e)
+            self._set_result(fetch, cached, 'STALE')
+            return
+
+        try:
+            if response.status == 304 and cached is not None:
+                cached['fetched'] = time.time()
+                self._cache.refresh(url, cached)
+                self._set_result(fetch, cached, 'REVALIDATED')
+                return
+            if response.status != 200:
+                if cached is not None and response.status >= 500:
+                    self._set_result(fetch, cached, 'STALE')
+                    return
+                self._set_result(fetch, {'status': response.status,
+                                         'reason': response.reason,
+                                         'headers': {}, 'path': None},
+                                 'UNCACHED')
+                return
+            self._fetch_body(fetch, response)
+        finally:
+            response.close()
+
+    def _fetch_body(self, fetch, response):
+        meta = self._get_meta(response)
+        length = response.getheader('Content-Length')
+        length = int(length) if length is not None else None
+        keep = 'no-store' not in (response.getheader('Cache-Control') or '')
+        if length is not None and length > self._cache.max_object_size:
+            keep = False
+
+        with self._cache.new_file() as f:
+            tmp_path = f.name
+            with fetch.cond:
+                fetch.meta = meta
+                fetch.length = length
+                fetch.path = tmp_path
+                fetch.result_cache = 'MISS' if keep else 'UNCACHED'
+                fetch.ready = True
+                fetch.cond.notify_all()
+            size = 0
+            while True:
+                data = response.read(_CHUNK_SIZE)
+                if not data:
+                    break
+                f.write(data)
+                f.flush()
+                size += len(data)
+                with fetch.cond:
+                    fetch.written = size
+                    fetch.cond.notify_all()
+
+        if length is not None and length != size:
+            raise urllib.error.URLError('%s closed after %d of %d bytes' %
+                                        (fetch.url, size, length))
+        if not keep or size > self._cache.max_object_size:
+            return
+        with fetch.cond:
+            stored = self._cache.store(fetch.url, meta, tmp_path)
+            fetch.path = stored['path']
+            fetch.stored = True
+
+    def _outcome(self, meta, cache):
+        with self._stats_lock:
+            self.stats[cache] += 1
+        return dict(meta, cache=cache)
+
+
+class ProxyHandler(http.server.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logging.debug('%s %s', self.address_string(), format % args)
+
+    def _get_url(self):
+        url = get_upstream_url(self.path)
+        if url is None:
+            self.send_error(404)
+            return None
+        if not self.server.proxy.is_allowed(url):
+            self.send_error(403)
+            return None
+        return url
+
+    def do_GET(self):
+        url = self._get_url()
+        if url is None:
+            return
+        try:
+            meta = self.server.proxy.get(url)
+        except urllib.error.URLError as e:
+            logging.error('Could not fetch %s: %s', url, e)
+            self.send_error(502, str(e))
+            return
+        f = meta.get('file')
+        try:
+            self._send(url, meta)
+        finally:
+            if f is not None:
+                f.close()
+
+    def do_HEAD(self):
+        url = self._get_url()
+        if url is None:
+            return
+        try:
+            meta = self.server.proxy.head(url)
+        except urllib.error.URLError as e:
+            logging.error('Could not ask %s: %s', url, e)
+            self.send_error(502, str(e))
+            return
+        self.send_response(meta['status'], meta['reason'])
+        if meta['status'] == 200:
+            self._send_headers(meta)
+        else:
+            self.send_header('X-Cache', meta['cache'])
+        if meta['length'] is not None:
+            self.send_header('Content-Length', str(meta['length']))
+        self.end_headers()
+
+    def _is_current(self, meta):
+        etag = meta['headers'].get('ETag')
+        modified = meta['headers'].get('Last-Modified')
+        if self.headers.get('If-None-Match'):
+            return etag is not None and \
+                etag in [tag.strip() for tag in
+                         self.headers['If-None-Match'].split(',')]
+        if self.headers.get('If-Modified-Since') and modified:
+            return self.headers['If-Modified-Since'] == modified
+        return False
+
+    def _get_range(self, meta, size):
+        # a single 'bytes=start-end' range, when If-Range still matches
+        match = _RANGE_RE.match(self.headers.get('Range') or '')
+        if match is None or not (match.group(1) or match.group(2)):
+            return None
+        if_range = self.headers.get('If-Range')
+        if if_range and if_range not in (meta['headers'].get('ETag'),
+                                         meta['headers'].get(
+                                             'Last-Modified')):
+            return None
+        if not match.group(1):
+            start = max(0, size - int(match.group(2)))
+            end = size - 1
+        else:
+            start = int(match.group(1))
+            end = min(size - 1, int(match.group(2) or size - 1))
+        return start, end
+
+    def _send(self, url, meta):
+        if meta.get('file') is None:
+            self.send_response(meta['status'], meta['reason'])
+            self.send_header('Content-Length', '0')
+            self.send_header('X-Cache', meta['cache'])
+            self.end_headers()
+            return
+
+        if self._is_current(meta):
+            self.send_response(304)
+            self._send_headers(meta)
+            self.end_headers()
+            return
+
+        fetch = meta.get('fetch')
+        if fetch is None:
+            size = os.fstat(meta['file'].fileno()).st_size
+        else:
+            size = fetch.length
+        byte_range = None
+        if size is not None:
+            byte_range = self._get_range(meta, size)
+        if byte_range is not None and byte_range[0] >= size:
+            self.send_response(416)
+            self.send_header('Content-Range', 'bytes */%d' % size)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if byte_range is not None and fetch is not None and \
+                byte_range[0] > fetch.written:
+            # far ahead of what has arrived, the origin sends it sooner
+            self._pass_through(url)
+            return
+
+        if byte_range is None:
+            start, length = 0, size
+            self.send_response(200)
+        else:
+            start, length = byte_range[0], byte_range[1] - byte_range[0] + 1
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' %
+                             (byte_range[0], byte_range[1], size))
+        self._send_headers(meta)
+        if length is None:
+            # the origin did not tell the length, the end tells it
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        else:
+            self.send_header('Content-Length', str(length))
+        self.end_headers()
+        if fetch is None:
+            if length:
+                self.connection.sendfile(meta['file'], start, length)
+            return
+
+        position = start
+        while length is None or position < start + length:
+            available = fetch.wait_for(position)
+            if available <= position:
+                break
+            if length is not None:
+                available = min(available, start + length)
+            self.connection.sendfile(meta['file'], position,
+                                     available - position)
+            position = available
+        if length is not None and position < start + length:
+            # the fetch failed, closing tells the laptop to resume
+            self.close_connection = True
+
+    def _pass_through(self, url):
+        headers = {}
+        for header in ('Range', 'If-Range'):
+            if self.headers.get(header):
+                headers[header] = self.headers[header]
+        try:
+            response = self.server.proxy.get_range(url, headers)
+        except urllib.error.URLError as e:
+            logging.error('Could not fetch %s: %s', url, e)
+            self.send_error(502, str(e))
+            return
+        try:
+            self.send_response(response.status, response.reason)
+            for header in _KEPT_HEADERS + ('Content-Range', 'Content-Length',
+                                           'Accept-Ranges'):
+                if response.getheader(header):
+                    self.send_header(header, response.getheader(header))
+            self.send_header('X-Cache', 'UNCACHED')
+            if response.getheader('Content-Length') is None:
+                self.send_header('Connection', 'close')
+                self.close_connection = True
+            self.end_headers()
+            while True:
+                data = response.read(_CHUNK_SIZE)
+                if not data:
+                    break
+                self.wfile.write(data)
+        finally:
+            response.close()
+
+    def _send_headers(self, meta):
+        for header, value in meta['headers'].items():
+            self.send_header(header, value)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('X-Cache', meta['cache'])
+
+
+class ProxyServer(http.server.ThreadingHTTPServer):
+
+    daemon_threads = True
+    # a classroom connects all at once
+    request_queue_size = 128
+
+    def __init__(self, address, proxy):
+        http.server.ThreadingHTTPServer.__init__(self, address, ProxyHandler)
+        self.proxy = proxy
+
+    def handle_error(self, request, client_address):
+        error = sys.exc_info()[1]
+        if isinstance(error, ConnectionError):
+            # a laptop that went away, or closed a kept-alive connection
+            logging.debug('%s: %s', client_address[0], error)
+            return
+        logging.exception('Error serving %s', client_address[0])
+
+
+def serve(args):
+    cache = ProxyCache(args.cache_dir, args.max_size * 1024 * 1024,
+                       args.max_object_size * 1024 * 1024)
+    proxy = Proxy(cache, args.feed_ttl * 60, args.file_ttl * 24 * 60 * 60,
+                  args.allow_host or _HOSTS)
+    server = ProxyServer((args.address, args.port), proxy)
+    logging.info('Serving on %s:%d', args.address, server.server_port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        logging.info('Cache outcomes: %s', proxy.stats)
+
+
+def loadtest(args):
+    """
+    Starts args.clients threads that each, like a laptop, fetch the
+    URLs in their own random order through the proxy, args.rounds
+    times, with a fresh connection per client
+    """
+    results = []
+    results_lock = threading.Lock()
+
+    def client(number):
+        rng = random.Random(number)
+        for round_ in range(args.rounds):
+            urls = list(args.urls)
+            rng.shuffle(urls)
+            for url in urls:
+                parts = urllib.parse.urlsplit(url)
+                proxied = '%s/%s/%s' % (args.proxy.rstrip('/'), parts.scheme,
+                                        url.split('://', 1)[1])
+                start = time.time()
+                outcome = 'ERROR'
+                size = 0
+                try:
+                    with urllib.request.urlopen(proxied) as response:
+                        size = len(response.read())
+                        outcome = response.headers.get('X-Cache', 'NONE')
+                except (urllib.error.URLError, OSError) as e:
+                    logging.debug('Client %d: %s failed: %s', number, url, e)
+                with results_lock:
+                    results.append((time.time() - start, outcome, size))
+
+    start = time.time()
+    clients = [threading.Thread(target=client, args=(number,))
+               for number in range(args.clients)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    elapsed = time.time() - start
+
+    latencies = sorted(result[0] for result in results)
+    outcomes = {}
+    for result in results:
+        outcomes[result[1]] = outcomes.get(result[1], 0) + 1
+    total_bytes = sum(result[2] for result in results)
+    print('%d requests by %d clients in %.2f s, %.1f requests/s, '
+          '%.1f MB/s' % (len(results), args.clients, elapsed,
+                          len(results) / elapsed,
+                          total_bytes / elapsed / 1024 / 1024))
+    if latencies:
+        print('latency p50 %.3f s, p95 %.3f s, max %.3f s' %
+              (latencies[len(latencies) // 2],
+               latencies[int(len(latencies) * 0.95)], latencies[-1]))
+    print('outcomes: %s' % ', '.join('%s %d' % item
+                                     for item in sorted(outcomes.items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Caching proxy for the Get Books activity')
+    parser.add_argument('-v', '--verbose', action='store_true')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    serve_parser = commands.add_parser('serve', help='run the proxy')
+    serve_parser.add_argument('--address', default='')
+    serve_parser.add_argument('--port', type=int, default=_PORT)
+    serve_parser.add_argument('--cache-dir', required=True)
+    serve_parser.add_argument('--max-size', type=int,
+                              default=_MAX_SIZE // 1024 // 1024,
+                              help='cache quota in megabytes')
+    serve_parser.add_argument('--max-object-size', type=int,
+                              default=_MAX_OBJECT_SIZE // 1024 // 1024,
+                              help='biggest object cached, in megabytes')
+    serve_parser.add_argument('--feed-ttl', type=int,
+                              default=_FEED_TTL // 60,
+                              help='minutes before feeds are validated')
+    serve_parser.add_argument('--file-ttl', type=int,
+                              default=_FILE_TTL // 24 // 60 // 60,
+                              help='days before files are validated')
+    serve_parser.add_argument('--allow-host', action='append',
+                              metavar='HOST',
+                              help='host whose URLs, and those of its '
+                              'subdomains, may be fetched; can be given '
+                              'more than once, archive.org by default')
+    serve_parser.set_defaults(function=serve)
+
+    load_parser = commands.add_parser(
+        'loadtest', help='simulate many laptops using a running proxy')
+    load_parser.add_argument('--proxy',
+                             default='http://127.0.0.1:%d' % _PORT)
+    load_parser.add_argument('--clients', type=int, default=30)
+    load_parser.add_argument('--rounds', type=int, default=1)
+    load_parser.add_argument('urls', nargs='+', metavar='URL',
+                             help='origin URL, e.g. a catalog feed')
+    load_parser.set_defaults(function=loadtest)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.DEBUG if args.verbose
+                        else logging.INFO)
+    args.function(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+#! /usr/bin/env python3
+
+# Copyright (C) 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import collections
+import hashlib
+import json
+import logging
+import mmap
+import os
+import threading
+import time
+
+_MAX_SIZE = 16 * 1024 * 1024
+
+# entries are evicted down to this fraction of the budget, so that a
+# full cache does not evict on every new cover
+_LOW_WATER = 0.9
+
+
+class LRUCache(object):
+    """In-memory mapping that forgets the least recently used items."""
+
+    def __init__(self, capacity):
+        self._capacity = capacity
+        self._items = collections.OrderedDict()
+
+    def get(self, key):
+        try:
+            self._items.move_to_end(key)
+        except KeyError:
+            return None
+        return self._items[key]
+
+    def put(self, key, value):
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self._capacity:
+            self._items.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+
+class CoverCache(object):
+    """
+    Persistent cache of cover images keyed by their URL.
+
+    All images are packed one after the other in a single blob file,
+    read through mmap, and an index file maps the SHA-1 of every URL to
+    the offset and length of its bytes.  The least recently used covers
+    are evicted when the total size goes over max_size, and the space
+    they leave in the blob is reclaimed once it is more than half of it.
+    """
+
+    def __init__(self, path, max_size=_MAX_SIZE):
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        if not os.path.exists(path):
+            os.makedirs(path)
+        self._blob_path = os.path.join(path, 'covers.blob')
+        self._index_path = os.path.join(path, 'covers.idx')
+        self._blob = open(self._blob_path, 'a+b')
+        self._mmap = None
+        self._dirty = False
+        try:
+            with open(self._index_path, 'r') as f:
+                self._index = json.load(f)
+        except (IOError, ValueError):
+            self._index = {}
+
+        # drop what points past the end of a blob truncated by a crash
+        blob_size = os.fstat(self._blob.fileno()).st_size
+        for key, (offset, length, used) in list(self._index.items()):
+            if offset + length > blob_size:
+                del self._index[key]
+
+    def _key(self, url):
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    def _map(self, end):
+        if self._mmap is not None and len(self._mmap) >= end:
+            return self._mmap
+        if self._mmap is not None:
+            self._mmap.close()
+        self._blob.flush()
+        self._mmap = mmap.mmap(self._blob.fileno(), 0,
+                               access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def get(self, url):
+        """Returns the cached bytes of url, or None"""
+        key = self._key(url)
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                return None
+            offset, length, used = entry
+            data = self._map(offset + length)[offset:offset + length]
+            entry[2] = time.time()
+            self._dirty = True
+        return data
+
+    def put(self, url, data):
+        key = self._key(url)
+        with self._lock:
+            self._blob.seek(0, os.SEEK_END)
+            offset = self._blob.tell()
+            self._blob.write(data)
+            self._index[key] = [offset, len(data), time.time()]
+            self._evict()
+            self._save_index()
+
+    def _evict(self):
+        size = sum(length for offset, length, used in self._index.values())
+        if size > self._max_size:
+            entries = sorted(self._index.items(), key=lambda item: item[1][2])
+            for key, (offset, length, used) in entries:
+                if size <= self._max_size * _LOW_WATER:
+                    break
+                del self._index[key]
+                size -= length
+
+        blob_size = self._blob.tell()
+        if blob_size > 2 * size:
+            self._compact()
+
+    def _compact(self):
+        # rewrite the blob with only the live covers, in index order
+        tmp_path = self._blob_path + '.tmp'
+        mapped = self._map(self._blob.tell())
+        with open(tmp_path, 'wb') as tmp:
+            for entry in sorted(self._index.values()):
+                offset, length, used = entry
+                data = mapped[offset:offset + length]
+                entry[0] = tmp.tell()
+                tmp.write(data)
+        self._mmap.close()
+        self._mmap = None
+        self._blob.close()
+        os.replace(tmp_path, self._blob_path)
+        self._blob = open(self._blob_path, 'a+b')
+        logging.debug('Cover cache compacted to %d bytes',
+                      os.path.getsize(self._blob_path))
+
+    def _save_index(self):
+        self._blob.flush()
+        try:
+            with open(self._index_path + '.tmp', 'w') as f:
+                json.dump(self._index, f)
+            os.replace(self._index_path + '.tmp', self._index_path)
+        except IOError as e:
+            logging.error('Could not save the cover index: %s', e)
+        self._dirty = False
+
+    def close(self):
+        with self._lock:
+            if self._dirty:
+                self._save_index()
+            if self._mmap is not None:
+                self._mmap.close()
+                self._mmap = None
+            self._blob.close()
@@ -0,0 +1,344 @@
+#! /usr/bin/env python3
+
+# Copyright (C) 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import itertools
+import logging
+import os
+
+from gi.repository import GObject
+
+from gettext import gettext as _
+
+import httppool
+import opds
+import peershare
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+STATE_QUEUED = 'queued'
+STATE_RESOLVING = 'resolving'
+STATE_DOWNLOADING = 'downloading'
+STATE_DONE = 'done'
+STATE_FAILED = 'failed'
+STATE_CANCELLED = 'cancelled'
+
+_ACTIVE_STATES = (STATE_RESOLVING, STATE_DOWNLOADING)
+_FINISHED_STATES = (STATE_DONE, STATE_FAILED, STATE_CANCELLED)
+
+_MAX_ACTIVE = 2
+
+
+class DownloadItem(object):
+    '''
+    A book waiting in, or going through, the download queue.  metadata
+    holds whatever the Journal entry needs, taken when the book was
+    queued, as the selection may have moved on by the time it is done.
+    '''
+
+    _counter = itertools.count()
+
+    def __init__(self, book, content_type, metadata, priority):
+        self.book = book
+        self.content_type = content_type
+        self.metadata = metadata
+        self.priority = priority
+        self.state = STATE_QUEUED
+        self.progress = 0.0
+        self.path = None
+        self.url = None
+        self.checksum = None
+        self.error = None
+        self._downloader = None
+        self._order = next(self._counter)
+
+    def get_title(self):
+        return self.metadata.get('title', self.book.get_title())
+
+    def is_same_download(self, other):
+        '''
+        Whether other downloads the same file, which would write the
+        same partial download as this item does
+        '''
+        if other.content_type != self.content_type:
+            return False
+        if other.url is not None and other.url == self.url:
+            return True
+        if other.book is self.book:
+            return True
+        identifier = self.book.get_identifier()
+        return identifier is not None and \
+            type(other.book) is type(self.book) and \
+            other.book.get_source() == self.book.get_source() and \
+            other.book.get_identifier() == identifier
+
+    def is_active(self):
+        return self.state in _ACTIVE_STATES
+
+    def is_finished(self):
+        return self.state in _FINISHED_STATES
+
+
+class DownloadQueue(GObject.GObject):
+
+    # Runs the downloads of queued books in the background, at most
+    # max_active at a time, higher priority items first.  Only the item
+    # at the head of the queue, the one the user waits for, and the high
+    # priority ones get the foreground share of the bandwidth
+
+    __gsignals__ = {
+        'item-added': (GObject.SignalFlags.RUN_FIRST,
+                       None,
+                       ([GObject.TYPE_PYOBJECT])),
+        'item-changed': (GObject.SignalFlags.RUN_FIRST,
+                         None,
+                         ([GObject.TYPE_PYOBJECT])),
+        'item-finished': (GObject.SignalFlags.RUN_FIRST,
+                          None,
+                          ([GObject.TYPE_PYOBJECT])),
+    }
+
+    def __init__(self, get_path, max_active=_MAX_ACTIVE, segments=1,
+                 segment_min_size=opds._SEGMENT_MIN_SIZE, peer_share=None):
+        '''
+        get_path returns a new temporary file name each time it is
+        called, the downloaded files are left there for the
+        'item-finished' handler.  Books with a known checksum are asked
+        first to the peers of peer_share, a peershare.PeerShare.
+        '''
+        GObject.GObject.__init__(self)
+        self._get_path = get_path
+        self._max_active = max_active
+        self._segments = segments
+        self._segment_min_size = segment_min_size
+        self._peer_share = peer_share
+        self._items = []
+
+    def add(self, book, content_type, metadata, priority=PRIORITY_NORMAL):
+        '''
+        Queues the download of book in content_type, and returns its
+        item.  A book already waiting or downloading in that format is
+        not queued twice, its item is returned instead.
+        '''
+        item = DownloadItem(book, content_type, metadata, priority)
+        duplicate = self._find_duplicate(item)
+        if duplicate is not None:
+            if priority < duplicate.priority:
+                self.set_priority(duplicate, priority)
+            return duplicate
+        self._items.append(item)
+        self.emit('item-added', item)
+        self._schedule()
+        return item
+
+    def get_items(self):
+        return list(self._items)
+
+    def is_active(self):
+        '''Returns True while some item is waiting or downloading'''
+        for item in self._items:
+            if not item.is_finished():
+                return True
+        return False
+
+    def set_priority(self, item, priority):
+        item.priority = priority
+        self.emit('item-changed', item)
+        self._schedule()
+
+    def cancel(self, item):
+        if item.is_finished():
+            return
+        if item._downloader is not None:
+            item._downloader.stop()
+            item._downloader = None
+        item.state = STATE_CANCELLED
+        self.emit('item-changed', item)
+        self.emit('item-finished', item)
+        self._schedule()
+
+    def retry(self, item):
+        '''Queues again a failed or cancelled item, resuming its transfer'''
+        if item.state not in (STATE_FAILED, STATE_CANCELLED):
+            return
+        if self._find_duplicate(item) is not None:
+            # queued again meanwhile
+            return
+        item.state = STATE_QUEUED
+        item.error = None
+        item.progress = 0.0
+        self.emit('item-changed', item)
+        self._schedule()
+
+    def remove(self, item):
+        '''Forgets about a finished item'''
+        if item.is_finished() and item in self._items:
+            self._items.remove(item)
+
+    def stop(self):
+        for item in self._items:
+            if item._downloader is not None:
+                item._downloader.stop()
+                item._downloader = None
+            if not item.is_finished():
+                item.state = STATE_CANCELLED
+
+    def _find_duplicate(self, item):
+        for other in self._items:
+            if other is not item and not other.is_finished() and \
+                    other.is_same_download(item):
+                return other
+        return None
+
+    def _schedule(self):
+        active = len([item for item in self._items if item.is_active()])
+        queued = sorted([item for item in self._items
+                         if item.state == STATE_QUEUED],
+                        key=lambda item: (item.priority, item._order))
+        for item in queued[:max(0, self._max_active - active)]:
+            self._start(item)
+        self._update_background()
+
+    def _is_background(self, item):
+        '''
+        Whether item only gets the background share of the bandwidth:
+        all the active items but the one at the head of the queue, the
+        only one when it runs alone, and the high priority ones
+        '''
+        if item.priority == PRIORITY_HIGH:
+            return False
+        active = [other for other in self._items if other.is_active()]
+        head = min(active, key=lambda other: (other.priority, other._order))
+        return item is not head
+
+    def _update_background(self):
+        for item in self._items:
+            if item._downloader is not None and \
+                    item.state == STATE_DOWNLOADING:
+                item._downloader.set_background(self._is_background(item))
+
+    def _start(self, item):
+        logging.debug('Resolving download of %s', item.get_title())
+        item.state = STATE_RESOLVING
+        self.emit('item-changed', item)
+        # the fetch of the file list, if any, so that cancel stops it
+        item._downloader = item.book.get_download_links(
+            item.content_type,
+            lambda url: self.__links_cb(item, url),
+            self._get_path())
+
+    def __links_cb(self, item, url):
+        if item.state != STATE_RESOLVING:
+            # cancelled meanwhile
+            return False
+        item._downloader = None
+        if url is None:
+            self._fail(item, _('Error: Could not download %s. ' +
+                               'The book is not available in this format.') %
+                       item.get_title())
+            return False
+
+        item.url = url
+        if self._find_duplicate(item) is not None:
+            # found under another name, two writers would mix up the
+            # partial download
+            self._fail(item, _('Error: Could not download %s. ' +
+                               'It is being downloaded already.') %
+                       item.get_title())
+            return False
+
+        item.state = STATE_DOWNLOADING
+        item.checksum = item.book.get_checksum(item.content_type)
+        if self._peer_share is not None and item.checksum is not None:
+            logging.debug('Looking for %s on the peers', item.checksum)
+            item._downloader = peershare.PeerDownloader(
+                self._peer_share, item.checksum, self._get_path())
+            item._downloader.connect('updated', self.__peer_updated_cb,
+                                     item, url)
+            item._downloader.connect('progress', self.__progress_cb, item)
+        else:
+            self._download(item, url)
+        self.emit('item-changed', item)
+        return False
+
+    def __peer_updated_cb(self, downloader, path, content_type, item, url):
+        if item._downloader is not downloader:
+            return
+        if path is None:
+            # no peer has it, or sent it right
+            item.progress = 0.0
+            self._download(item, url)
+            return
+        self.__updated_cb(downloader, path, content_type, item)
+
+    def _download(self, item, url):
+        logging.debug('DOWNLOAD BOOK %s', url)
+        item._downloader = opds.FileDownloader(
+            url, self._get_path(), resumable=True, segments=self._segments,
+            segment_min_size=self._segment_min_size,
+            priority=httppool.PRIORITY_INTERACTIVE, throttled=True,
+            background=self._is_background(item))
+        item._downloader.connect('updated', self.__updated_cb, item)
+        item._downloader.connect('progress', self.__progress_cb, item)
+
+    def __progress_cb(self, downloader, progress, item):
+        if item._downloader is not downloader:
+            return
+        item.progress = progress
+        self.emit('item-changed', item)
+
+    def __updated_cb(self, downloader, path, content_type, item):
+        if item._downloader is not downloader:
+            return
+        item._downloader = None
+
+        if path is None:
+            self._fail(item, _('Error: Could not download %s. ' +
+                               'The path in the catalog seems to be '
+                               'incorrect.') % item.get_title())
+            return
+
+        if os.stat(path).st_size == 0:
+            os.remove(path)
+            self._fail(item, _('Error: Could not download %s. ' +
+                               'The other end sent an empty file.') %
+                       item.get_title())
+            return
+
+        if content_type is not None and content_type.startswith('text/html'):
+            os.remove(path)
+            self._fail(item, _('Error: Could not download %s. ' +
+                               'The other end sent text/html instead of a '
+                               'book.') % item.get_title())
+            return
+
+        item.path = path
+        item.progress = 1.0
+        item.state = STATE_DONE
+        self.emit('item-changed', item)
+        self.emit('item-finished', item)
+        self._schedule()
+
+    def _fail(self, item, error):
+        logging.error('Download of %s failed', item.get_title())
+        item.error = error
+        item.state = STATE_FAILED
+        self.emit('item-changed', item)
+        self.emit('item-finished', item)
+        self._schedule()
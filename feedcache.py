@@ -0,0 +1,149 @@
+#! /usr/bin/env python3
+
+# Copyright (C) 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import urllib.parse
+
+_MAX_SIZE = 32 * 1024 * 1024
+
+# response headers needed to parse the cached body again
+_KEPT_HEADERS = ('content-type', 'content-encoding', 'content-language')
+
+
+def normalize_uri(uri):
+    """
+    Returns uri with a lower case scheme and host, without a default
+    port or a fragment, and with the query arguments sorted
+    """
+    parts = urllib.parse.urlsplit(uri)
+    scheme = parts.scheme.lower()
+    netloc = (parts.hostname or '').lower()
+    if parts.port is not None and \
+            (scheme, parts.port) not in (('http', 80), ('https', 443)):
+        netloc += ':%d' % parts.port
+    query = urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+    query = urllib.parse.urlencode(sorted(query))
+    return urllib.parse.urlunsplit((scheme, netloc, parts.path or '/',
+                                    query, ''))
+
+
+class FeedCache(object):
+    """
+    Persistent cache of OPDS feed bodies and their HTTP validators.
+
+    Entries are keyed by the normalized request URI and the
+    Accept-Language header, so that the same catalog asked in another
+    language is stored apart.
+    """
+
+    def __init__(self, path, max_size=_MAX_SIZE):
+        self._path = path
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        if not os.path.exists(self._path):
+            os.makedirs(self._path)
+
+    def _key(self, uri, language):
+        key = '%s\n%s' % (normalize_uri(uri), language or '')
+        return os.path.join(self._path,
+                            hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+    def lookup(self, uri, language=None):
+        """
+        Returns the cached entry for uri as a dict with 'etag',
+        'modified', 'headers' and 'body', or None
+        """
+        key = self._key(uri, language)
+        try:
+            with open(key + '.json', 'r') as f:
+                entry = json.load(f)
+            with open(key + '.xml', 'rb') as f:
+                entry['body'] = f.read()
+        except (IOError, ValueError):
+            return None
+        os.utime(key + '.json')
+        return entry
+
+    def get_conditional_headers(self, entry):
+        """Returns the request headers that revalidate entry"""
+        headers = {}
+        if entry is None:
+            return headers
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('modified'):
+            headers['If-Modified-Since'] = entry['modified']
+        return headers
+
+    def store(self, uri, language, response_headers, body):
+        """
+        Saves body and the validators found in response_headers.
+        Responses without an ETag or Last-Modified are not stored,
+        they could never be revalidated.
+        """
+        headers = dict((k.lower(), v) for k, v in response_headers.items())
+        entry = {'uri': uri,
+                 'etag': headers.get('etag'),
+                 'modified': headers.get('last-modified'),
+                 'headers': dict((k, headers[k]) for k in _KEPT_HEADERS
+                                 if k in headers)}
+        if entry['etag'] is None and entry['modified'] is None:
+            return
+
+        key = self._key(uri, language)
+        with self._lock:
+            try:
+                with open(key + '.xml.tmp', 'wb') as f:
+                    f.write(body)
+                with open(key + '.json.tmp', 'w') as f:
+                    json.dump(entry, f)
+                os.replace(key + '.xml.tmp', key + '.xml')
+                os.replace(key + '.json.tmp', key + '.json')
+            except IOError as e:
+                logging.error('Could not cache feed %s: %s', uri, e)
+                return
+            self._prune()
+
+    def _prune(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self._path):
+            if not name.endswith('.json'):
+                continue
+            key = os.path.join(self._path, name[:-len('.json')])
+            try:
+                size = os.path.getsize(key + '.xml')
+                used = os.path.getmtime(key + '.json')
+            except OSError:
+                continue
+            entries.append((used, size, key))
+            total += size
+
+        entries.sort()
+        while total > self._max_size and entries:
+            used, size, key = entries.pop(0)
+            for suffix in ('.json', '.xml'):
+                try:
+                    os.remove(key + suffix)
+                except OSError:
+                    pass
+            total -= size
@@ -132,6 +132,7 @@ ACCEPTABLE_URI_SCHEMES = (
 # ---------- required modules (should come with any Python distribution) ----------
 import cgi
 import codecs
+import collections
 import copy
 import datetime
 import itertools
@@ -189,9 +190,10 @@ else:
         _XML_AVAILABLE = 1
 
 # sgmllib is not available by default in Python 3; if the end user doesn't have
-# it available then we'll lose illformed XML parsing and content santizing
+# it available then we'll lose illformed XML parsing and content santizing.
+# This activity ships it as sgmllib3.
 try:
-    import sgmllib
+    import sgmllib3 as sgmllib
 except ImportError:
     # This is probably Python 3, which doesn't include sgmllib anymore
     _SGML_AVAILABLE = 0
@@ -223,6 +225,7 @@ else:
     entityref = sgmllib.entityref
     incomplete = sgmllib.incomplete
     interesting = sgmllib.interesting
+    interesting_markup = sgmllib.interesting_markup
     shorttag = sgmllib.shorttag
     shorttagopen = sgmllib.shorttagopen
     starttagopen = sgmllib.starttagopen
@@ -528,6 +531,9 @@ class _FeedParserMixin:
         self.entries = [] # list of entry-level data
         self.version = '' # feed type/version, see SUPPORTED_VERSIONS
         self.namespacesInUse = {} # dictionary of namespaces defined by the feed
+        # per-parse overrides of RESOLVE_RELATIVE_URIS and SANITIZE_HTML
+        self.resolve_relative_uris = RESOLVE_RELATIVE_URIS
+        self.sanitize_html = SANITIZE_HTML
 
         # the following are used internally to track state;
         # this is really out of control and should be refactored
@@ -911,12 +917,12 @@ class _FeedParserMixin:
 
         is_htmlish = self.mapContentType(self.contentparams.get('type', 'text/html')) in self.html_types
         # resolve relative URIs within embedded markup
-        if is_htmlish and RESOLVE_RELATIVE_URIS:
+        if is_htmlish and self.resolve_relative_uris:
             if element in self.can_contain_relative_uris:
                 output = _resolveRelativeURIs(output, self.baseuri, self.encoding, self.contentparams.get('type', 'text/html'))
 
         # sanitize embedded markup
-        if is_htmlish and SANITIZE_HTML:
+        if is_htmlish and self.sanitize_html:
             if element in self.can_contain_dangerous_markup:
                 output = _sanitizeHTML(output, self.encoding, self.contentparams.get('type', 'text/html'))
 
@@ -2959,6 +2965,16 @@ _date_handlers = []
 def registerDateHandler(func):
     '''Register a date handler function (takes string, returns 9-tuple date in GMT)'''
     _date_handlers.insert(0, func)
+    _date_cache.clear()
+
+# Catalogs are parsed again and again with mostly the same dates, so
+# _parse_date keeps the results of the dates it parsed last, dropping
+# the least recently used first.  Only exact strings are remembered:
+# which handler parses a date can depend on its digits, e.g. '1939-0-0'
+# and '2010-3-4'.  opdsparser leaves the dates alone, this only helps
+# the catalogs that fall back to feedparser.
+_DATE_CACHE_SIZE = 4096
+_date_cache = collections.OrderedDict()
 
 # ISO-8601 date parsing routines written by Fazal Majid.
 # The ISO 8601 standard is very convoluted and irregular - a full ISO 8601
@@ -3440,21 +3456,46 @@ def _parse_date_perforce(aDateString):
         return time.gmtime(rfc822.mktime_tz(tm))
 registerDateHandler(_parse_date_perforce)
 
+def _try_date_handler(handler, dateString):
+    try:
+        date9tuple = handler(dateString)
+    except (KeyError, OverflowError, ValueError):
+        return None
+    if not date9tuple or len(date9tuple) != 9:
+        return None
+    return date9tuple
+
+def _parse_date_with_handlers(dateString, handlers):
+    '''Returns the date parsed by the first of handlers that can, and that handler'''
+    for handler in handlers:
+        date9tuple = _try_date_handler(handler, dateString)
+        if date9tuple is not None:
+            return date9tuple, handler
+    return None, None
+
 def _parse_date(dateString):
     '''Parses a variety of date formats into a 9-tuple in GMT'''
     if not dateString:
         return None
-    for handler in _date_handlers:
+    try:
+        date9tuple = _date_cache[dateString]
+    except KeyError:
+        pass
+    else:
         try:
-            date9tuple = handler(dateString)
-        except (KeyError, OverflowError, ValueError):
-            continue
-        if not date9tuple:
-            continue
-        if len(date9tuple) != 9:
-            continue
+            _date_cache.move_to_end(dateString)
+        except KeyError:
+            # dropped by another thread meanwhile
+            pass
         return date9tuple
-    return None
+    date9tuple, handler = _parse_date_with_handlers(dateString, _date_handlers)
+    _date_cache[dateString] = date9tuple
+    while len(_date_cache) > _DATE_CACHE_SIZE:
+        try:
+            _date_cache.popitem(last=False)
+        except KeyError:
+            break
+    return date9tuple
 
 # Each marker represents some of the characters of the opening XML
 # processing instruction ('<?xm') in the specified encoding.
@@ -3470,10 +3511,47 @@ ZERO_BYTES = _l2bytes([0x00, 0x00])
 # Example: <?xml version="1.0" encoding="utf-8"?>
 RE_XML_DECLARATION = re.compile(r'^<\?xml[^>]*?>')
 
+# The same, on the raw document, with the version it declares.
+RE_XML_DECLARATION_VERSION = re.compile(_s2bytes(r'^<\?xml\s+version\s*=\s*[\'"](.*?)[\'"][^>]*?>'))
+
 # Capture the value of the XML processing instruction's encoding attribute.
 # Example: <?xml version="1.0" encoding="utf-8"?>
 RE_XML_PI_ENCODING = re.compile(_s2bytes(r'^<\?.*encoding=[\'"](.*?)[\'"].*\?>'))
 
+UTF8_ENCODINGS = ('utf-8', 'utf8', 'utf_8')
+
+# convert_to_utf8 checks UTF-8 documents this many bytes at a time
+UTF8_CHECK_SIZE = 64 * 1024
+
+def _is_utf8(data):
+    '''Checks that data decodes as UTF-8 without keeping a decoded copy of it'''
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    view = memoryview(data)
+    try:
+        for start in range(0, len(view), UTF8_CHECK_SIZE):
+            decoder.decode(view[start:start + UTF8_CHECK_SIZE])
+        decoder.decode(_s2bytes(''), True)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+def _is_utf8_as_is(data, bom_encoding, xml_encoding, rfc3023_encoding):
+    '''Whether data can be handed to the parsers without being converted
+
+    That is when it is a UTF-8 document that says so, or says nothing, and
+    that is an XML 1.0 document, as the rewritten declaration would say.'''
+    if rfc3023_encoding.lower() not in UTF8_ENCODINGS or \
+            bom_encoding not in ('', 'utf-8') or \
+            (xml_encoding and xml_encoding not in UTF8_ENCODINGS):
+        return False
+    declaration = RE_XML_DECLARATION_VERSION.match(data)
+    if declaration is None:
+        if data[:5] == _s2bytes('<?xml'):
+            return False
+    elif declaration.group(1) != _s2bytes('1.0'):
+        return False
+    return _is_utf8(data)
+
 def convert_to_utf8(http_headers, data):
     '''Detect and convert the character encoding to UTF-8.
 
@@ -3634,6 +3712,12 @@ def convert_to_utf8(http_headers, data):
             msg = 'no Content-type specified'
         error = NonXMLContentType(msg)
 
+    # The common case of a UTF-8 feed is returned as it came, after being
+    # checked; decoding, rewriting the declaration and encoding it again
+    # would each make a copy of the whole document.
+    if _is_utf8_as_is(data, bom_encoding, xml_encoding, rfc3023_encoding):
+        return data, rfc3023_encoding, error
+
     # determine character encoding
     known_encoding = 0
     lazy_chardet_encoding = None
@@ -3701,6 +3785,8 @@ RE_DOCTYPE_PATTERN = re.compile(_s2bytes(r'^\s*<!DOCTYPE([^>]*?)>'), re.MULTILIN
 # Forbidden: explode1 "&explode2;&explode2;"
 RE_SAFE_ENTITY_PATTERN = re.compile(_s2bytes(r'\s+(\w+)\s+"(&#\w+;|[^&"]*)"'))
 
+RE_FIRST_ELEMENT = re.compile(_s2bytes(r'<\w'))
+
 def replace_doctype(data):
     '''Strips and replaces the DOCTYPE, returns (rss_version, stripped_data)
 
@@ -3710,8 +3796,14 @@ def replace_doctype(data):
 
     # Divide the document into two groups by finding the location
     # of the first element that doesn't begin with '<?' or '<!'.
-    start = re.search(_s2bytes(r'<\w'), data)
+    start = RE_FIRST_ELEMENT.search(data)
     start = start and start.start() or -1
+
+    # Most feeds declare neither, and are left as they are.
+    if data.find(_s2bytes('<!DOCTYPE'), 0, start+1) == -1 and \
+            data.find(_s2bytes('<!ENTITY'), 0, start+1) == -1:
+        return None, data, {}
+
     head, data = data[:start+1], data[start+1:]
 
     # Save and then remove all of the ENTITY declarations.
@@ -3812,12 +3904,21 @@ def _parse_georss_box(value, swap=True, dims=2):
 # end geospatial parsers
 
 
-def parse(url_file_stream_or_string, etag=None, modified=None, agent=None, referrer=None, handlers=None, request_headers=None, response_headers=None):
+def _set_profile(feedparser, resolve_relative_uris, sanitize_html):
+    if resolve_relative_uris is not None:
+        feedparser.resolve_relative_uris = resolve_relative_uris
+    if sanitize_html is not None:
+        feedparser.sanitize_html = sanitize_html
+
+def parse(url_file_stream_or_string, etag=None, modified=None, agent=None, referrer=None, handlers=None, request_headers=None, response_headers=None, resolve_relative_uris=None, sanitize_html=None):
     '''Parse a feed from a URL, file, stream, or string.
 
     request_headers, if given, is a dict from http header name to value to add
     to the request; this overrides internally generated values.
 
+    resolve_relative_uris and sanitize_html, if given, override the
+    RESOLVE_RELATIVE_URIS and SANITIZE_HTML module settings for this call.
+
     :return: A :class:`FeedParserDict`.
     '''
 
@@ -3939,6 +4040,7 @@ def parse(url_file_stream_or_string, etag=None, modified=None, agent=None, refer
     if use_strict_parser:
         # initialize the SAX parser
         feedparser = _StrictFeedParser(baseuri, baselang, 'utf-8')
+        _set_profile(feedparser, resolve_relative_uris, sanitize_html)
         saxparser = xml.sax.make_parser(PREFERRED_XML_PARSERS)
         saxparser.setFeature(xml.sax.handler.feature_namespaces, 1)
         try:
@@ -3958,6 +4060,7 @@ def parse(url_file_stream_or_string, etag=None, modified=None, agent=None, refer
             use_strict_parser = 0
     if not use_strict_parser and _SGML_AVAILABLE:
         feedparser = _LooseFeedParser(baseuri, baselang, 'utf-8', entities)
+        _set_profile(feedparser, resolve_relative_uris, sanitize_html)
         feedparser.feed(data.decode('utf-8', 'replace'))
     result['feed'] = feedparser.feeddata
     result['entries'] = feedparser.entries
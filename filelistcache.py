@@ -0,0 +1,79 @@
+#! /usr/bin/env python3
+
+# Copyright (C) 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import json
+import logging
+import os
+import threading
+import time
+
+_TTL = 7 * 24 * 60 * 60
+_MAX_ENTRIES = 2000
+
+
+class FileListCache(object):
+    """
+    Persistent cache of the book files offered by Internet Archive
+    items, as parsed from their {identifier}_files.xml.
+
+    Only the parsed table is kept, a list of dicts with the 'name',
+    'content_type', 'size', 'md5' and 'sha1' of every book file, all of
+    them in a single JSON file.  Lists older than ttl seconds are still
+    returned, flagged as stale, so that callers can fetch them again and
+    fall back on them when offline.
+    """
+
+    def __init__(self, path, ttl=_TTL, max_entries=_MAX_ENTRIES):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        if not os.path.exists(path):
+            os.makedirs(path)
+        self._path = os.path.join(path, 'files.json')
+        try:
+            with open(self._path, 'r') as f:
+                self._entries = json.load(f)
+        except (IOError, ValueError):
+            self._entries = {}
+
+    def lookup(self, identifier):
+        """
+        Returns the cached file list of identifier and whether it is
+        still fresh, or (None, False)
+        """
+        with self._lock:
+            entry = self._entries.get(identifier)
+        if entry is None:
+            return None, False
+        return entry['files'], time.time() - entry['fetched'] < self._ttl
+
+    def store(self, identifier, files):
+        with self._lock:
+            self._entries[identifier] = {'fetched': time.time(),
+                                         'files': files}
+            if len(self._entries) > self._max_entries:
+                oldest = sorted(self._entries.items(),
+                                key=lambda item: item[1]['fetched'])
+                for key, entry in oldest[:len(oldest) - self._max_entries]:
+                    del self._entries[key]
+            try:
+                with open(self._path + '.tmp', 'w') as f:
+                    json.dump(self._entries, f)
+                os.replace(self._path + '.tmp', self._path)
+            except IOError as e:
+                logging.error('Could not save the file list cache: %s', e)
@@ -0,0 +1,692 @@
+#! /usr/bin/env python3
+
+# Copyright (C) 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import heapq
+import http.client
+import itertools
+import logging
+import random
+import socket
+import ssl
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+USER_AGENT = 'GetBooks/20 (Sugar)'
+
+_MAX_REDIRECTS = 5
+_MAX_IDLE_PER_HOST = 4
+_IDLE_TIMEOUT = 60
+
+# network policy of a host, sources can override it in get-books.cfg:
+# socket timeouts in seconds, how many times an idempotent request is
+# sent again after a failure, how many failures in a row open the
+# circuit breaker of the host for cooldown seconds, how many requests
+# may be in flight to the host at once, and a token bucket refilled
+# with rate requests per second that holds up to burst of them (a rate
+# of 0 does not limit the requests).  Bulk transfers, the downloads of
+# books, may only take max_connections - 1 of the connections, and a
+# request that is not bulk always gets one, so that catalog pages and
+# covers do not wait for a book to finish downloading.
+DEFAULT_POLICY = {
+    'connect_timeout': 10,
+    'read_timeout': 30,
+    'retries': 2,
+    'failure_threshold': 5,
+    'cooldown': 60,
+    'max_connections': 4,
+    'rate': 10,
+    'burst': 10,
+}
+
+# requests waiting for a host go out in this order, those the user is
+# looking at before those that only may be needed later
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_SPECULATIVE = 2
+
+# how often a request waiting for its host checks for cancellation
+_WAIT_INTERVAL = 0.1
+
+_RETRY_DELAY = 0.5
+_IDEMPOTENT_METHODS = ('GET', 'HEAD')
+
+# errors that mean a kept-alive connection was closed by the server
+# while it sat in the pool, the request can safely be sent again
+_STALE_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine,
+                 ConnectionResetError, BrokenPipeError)
+
+
+class _HTTPSConnection(http.client.HTTPSConnection):
+    """HTTPSConnection that resumes the last TLS session of its host."""
+
+    def __init__(self, host, port, context, session, timeout):
+        http.client.HTTPSConnection.__init__(self, host, port,
+                                             context=context,
+                                             timeout=timeout)
+        self._session = session
+
+    def connect(self):
+        http.client.HTTPConnection.connect(self)
+        self.sock = self._context.wrap_socket(self.sock,
+                                              server_hostname=self.host,
+                                              session=self._session)
+
+
+class CancelToken(threading.Event):
+    """
+    Event set to cancel a worker thread.
+
+    Responses opened with the token are aborted as soon as it is set,
+    so that a read blocked on the socket returns at once instead of
+    when the next bytes arrive.  Everything the worker had received by
+    then is counted as wasted in the pool statistics.  The priority of
+    the token orders the requests of its worker against those of other
+    workers waiting for the same host, and bulk ones are held to the
+    connections a host leaves to bulk transfers.
+    """
+
+    def __init__(self, priority=PRIORITY_NORMAL, bulk=False):
+        threading.Event.__init__(self)
+        self._token_lock = threading.Lock()
+        self._responses = set()
+        self.bytes_received = 0
+        self.priority = priority
+        self.bulk = bulk
+
+    def attach(self, response):
+        with self._token_lock:
+            if not self.is_set():
+                self._responses.add(response)
+                return
+        response.abort()
+
+    def detach(self, response):
+        with self._token_lock:
+            self._responses.discard(response)
+
+    def add_bytes(self, count):
+        with self._token_lock:
+            self.bytes_received += count
+
+    def set(self):
+        with self._token_lock:
+            if self.is_set():
+                return
+            threading.Event.set(self)
+            responses, self._responses = self._responses, set()
+        for response in responses:
+            response.abort()
+        if self.bytes_received > 0:
+            logging.debug('Cancelled worker wasted %d bytes',
+                          self.bytes_received)
+            get_pool().add_wasted(self.bytes_received)
+
+
+class PooledResponse(object):
+    """
+    A response read from a pooled connection.
+
+    It quacks like the object returned by urllib.request.urlopen, so it
+    can be handed to feedparser.parse directly.  The connection goes back
+    to the pool once the body has been read completely or the response is
+    closed.
+    """
+
+    def __init__(self, pool, key, conn, response, url, token=None,
+                 slot=None):
+        self._pool = pool
+        self._key = key
+        self._conn = conn
+        self._response = response
+        self._token = token
+        self._slot = slot
+        self._aborted = False
+        self.url = url
+        self.status = response.status
+        self.code = response.status
+        self.reason = response.reason
+        self.headers = response.headers
+        if token is not None:
+            token.attach(self)
+
+    def _received(self, count):
+        if self._token is not None and count:
+            self._token.add_bytes(count)
+
+    def read(self, amt=None):
+        if self._response is None:
+            return b''
+        data = self._response.read(amt)
+        self._received(len(data))
+        if amt is None or (amt and not data) or self._response.isclosed():
+            self.close()
+        return data
+
+    def read1(self, amt=-1):
+        """Returns what is available, blocking only when nothing is"""
+        if self._response is None:
+            return b''
+        data = self._response.read1(amt)
+        self._received(len(data))
+        if not data or self._response.isclosed():
+            self.close()
+        return data
+
+    def readinto(self, buffer):
+        if self._response is None:
+            return 0
+        count = self._response.readinto(buffer)
+        self._received(count)
+        if count == 0 or self._response.isclosed():
+            self.close()
+        return count
+
+    def abort(self):
+        """
+        Shuts the socket down under a read blocked in another thread.
+        The connection is not reused.
+        """
+        self._aborted = True
+        sock = self._conn.sock
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def info(self):
+        return self.headers
+
+    def geturl(self):
+        return self.url
+
+    def getheader(self, name, default=None):
+        return self.headers.get(name, default)
+
+    def close(self):
+        if self._response is None:
+            return
+        response, self._response = self._response, None
+        if self._token is not None:
+            self._token.detach(self)
+        if self._slot is not None:
+            self._pool.release_slot(self._slot)
+        if response.length == 0 and not self._aborted:
+            # 304 and other empty bodies, nothing left on the wire
+            response.read()
+        if response.isclosed() and not response.will_close and \
+                not self._aborted:
+            self._pool.release(self._key, self._conn)
+        else:
+            response.close()
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ConnectionPool(object):
+    """
+    Process-wide pool of persistent HTTP and HTTPS connections.
+
+    Idle connections are kept per (scheme, host, port) and reused by the
+    next request to the same host; TLS sessions are cached per host so
+    that a new connection can skip the full handshake.
+    """
+
+    def __init__(self, max_idle_per_host=_MAX_IDLE_PER_HOST,
+                 idle_timeout=_IDLE_TIMEOUT):
+        self._max_idle = max_idle_per_host
+        self._idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._idle = {}
+        self._tls_sessions = {}
+        self._policies = {}
+        self._proxies = {}
+        self._breakers = {}
+        self._limiters = {}
+        self._limiter_cond = threading.Condition()
+        self._tickets = itertools.count()
+        self._context = ssl.create_default_context()
+        self._stats = {
+            'requests': 0,
+            'connections': 0,
+            'reused': 0,
+            'tls_resumed': 0,
+            'handshake_time': 0.0,
+            'redirects': 0,
+            'bytes_wasted': 0,
+            'retries': 0,
+            'breaker_trips': 0,
+            'fast_failures': 0,
+            'throttled': 0,
+            'throttle_time': 0.0,
+        }
+
+    def set_host_policy(self, host, **policy):
+        """
+        Overrides DEFAULT_POLICY values for host and its subdomains;
+        'archive.org' also covers the ia*.us.archive.org mirrors that
+        downloads are redirected to.
+        """
+        with self._lock:
+            self._policies[host.lower()] = dict(policy)
+
+    def _get_domain(self, host):
+        # the most specific domain with a policy, host itself otherwise
+        host = host.lower()
+        with self._lock:
+            for domain in sorted(self._policies, key=len, reverse=True):
+                if host == domain or host.endswith('.' + domain):
+                    return domain
+        return host
+
+    def set_host_proxy(self, host, proxy_uri):
+        """
+        Sends the requests for host and its subdomains through the
+        caching proxy at proxy_uri (see bookproxy.py), or directly
+        again when proxy_uri is None.
+        """
+        with self._lock:
+            if proxy_uri:
+                self._proxies[host.lower()] = proxy_uri.rstrip('/')
+            else:
+                self._proxies.pop(host.lower(), None)
+
+    def _get_proxied_url(self, url):
+        # http://host/path goes to {proxy_uri}/http/host/path
+        parts = urllib.parse.urlsplit(url)
+        host = (parts.hostname or '').lower()
+        with self._lock:
+            for domain in sorted(self._proxies, key=len, reverse=True):
+                if host == domain or host.endswith('.' + domain):
+                    return '%s/%s/%s' % (self._proxies[domain],
+                                         parts.scheme,
+                                         url.split('://', 1)[1])
+        return url
+
+    def get_host_policy(self, host):
+        policy = dict(DEFAULT_POLICY)
+        domain = self._get_domain(host)
+        with self._lock:
+            policy.update(self._policies.get(domain, {}))
+        return policy
+
+    def _may_start(self, limiter, policy, bulk):
+        max_connections = max(1, policy['max_connections'])
+        if bulk:
+            return limiter['active'] < max_connections and \
+                limiter['bulk'] < max(1, max_connections - 1)
+        return limiter['active'] < max_connections or \
+            limiter['active'] == limiter['bulk']
+
+    def _acquire_slot(self, host, token):
+        """
+        Waits until a request to host may go out: it is the first by
+        priority of the waiting requests that the connection limits let
+        through, and the token bucket of the host is not empty.  Hosts
+        sharing a policy domain share the limits.  Returns the slot to
+        give back with release_slot.
+        """
+        domain = self._get_domain(host)
+        policy = self.get_host_policy(host)
+        rate = policy['rate']
+        burst = max(1, policy['burst'])
+        priority = PRIORITY_NORMAL
+        bulk = False
+        if token is not None:
+            priority = token.priority
+            bulk = token.bulk
+        ticket = (priority, next(self._tickets), bulk)
+        start = time.time()
+
+        with self._limiter_cond:
+            limiter = self._limiters.setdefault(
+                domain, {'active': 0, 'bulk': 0, 'tokens': burst,
+                         'updated': start, 'waiting': []})
+            heapq.heappush(limiter['waiting'], ticket)
+            try:
+                while True:
+                    if token is not None and token.is_set():
+                        raise urllib.error.URLError('cancelled')
+                    now = time.time()
+                    if rate > 0:
+                        limiter['tokens'] = min(
+                            burst, limiter['tokens'] +
+                            (now - limiter['updated']) * rate)
+                    else:
+                        limiter['tokens'] = burst
+                    limiter['updated'] = now
+
+                    wait = _WAIT_INTERVAL
+                    first = None
+                    for waiting in sorted(limiter['waiting']):
+                        if self._may_start(limiter, policy, waiting[2]):
+                            first = waiting
+                            break
+                    if first == ticket:
+                        if limiter['tokens'] >= 1:
+                            break
+                        wait = min(wait, (1 - limiter['tokens']) / rate)
+                    self._limiter_cond.wait(wait)
+            except BaseException:
+                limiter['waiting'].remove(ticket)
+                heapq.heapify(limiter['waiting'])
+                self._limiter_cond.notify_all()
+                raise
+
+            limiter['waiting'].remove(ticket)
+            heapq.heapify(limiter['waiting'])
+            limiter['tokens'] -= 1
+            limiter['active'] += 1
+            if bulk:
+                limiter['bulk'] += 1
+            self._limiter_cond.notify_all()
+
+        waited = time.time() - start
+        if waited > 0.01:
+            with self._lock:
+                self._stats['throttled'] += 1
+                self._stats['throttle_time'] += waited
+        return domain, bulk
+
+    def release_slot(self, slot):
+        domain, bulk = slot
+        with self._limiter_cond:
+            limiter = self._limiters[domain]
+            limiter['active'] -= 1
+            if bulk:
+                limiter['bulk'] -= 1
+            self._limiter_cond.notify_all()
+
+    def _check_breaker(self, host):
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None or breaker['open_until'] is None:
+                return
+            if time.time() < breaker['open_until']:
+                self._stats['fast_failures'] += 1
+                raise urllib.error.URLError('%s is not answering, giving '
+                                            'it a rest' % host)
+            # half open, let this request probe the host
+            breaker['open_until'] = None
+            breaker['failures'] = breaker['threshold'] - 1
+
+    def _record_result(self, host, policy, failed):
+        with self._lock:
+            breaker = self._breakers.setdefault(
+                host, {'failures': 0, 'open_until': None, 'threshold': 0})
+            if not failed:
+                breaker['failures'] = 0
+                return
+            breaker['failures'] += 1
+            breaker['threshold'] = policy['failure_threshold']
+            if breaker['failures'] >= policy['failure_threshold']:
+                breaker['open_until'] = time.time() + policy['cooldown']
+                breaker['failures'] = 0
+                self._stats['breaker_trips'] += 1
+                logging.error('%s failed %d times, not trying it for %g s',
+                              host, policy['failure_threshold'],
+                              policy['cooldown'])
+
+    def _acquire(self, key, policy):
+        now = time.time()
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                conn, last_used = idle.pop()
+                if now - last_used < self._idle_timeout:
+                    self._stats['reused'] += 1
+                    return conn, True
+                conn.close()
+        return self._connect(key, policy), False
+
+    def _connect(self, key, policy):
+        scheme, host, port = key
+        if scheme == 'https':
+            with self._lock:
+                session = self._tls_sessions.get((host, port))
+            conn = _HTTPSConnection(host, port, self._context, session,
+                                    policy['connect_timeout'])
+        else:
+            conn = http.client.HTTPConnection(
+                host, port, timeout=policy['connect_timeout'])
+
+        start = time.time()
+        try:
+            conn.connect()
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            raise urllib.error.URLError(e)
+        elapsed = time.time() - start
+        # a server that stops sending must not hold a thread forever
+        conn.sock.settimeout(policy['read_timeout'])
+
+        with self._lock:
+            self._stats['connections'] += 1
+            self._stats['handshake_time'] += elapsed
+            if scheme == 'https' and conn.sock.session_reused:
+                self._stats['tls_resumed'] += 1
+        return conn
+
+    def release(self, key, conn):
+        """Give back a connection whose response was fully read."""
+        if conn.sock is None:
+            return
+        with self._lock:
+            if key[0] == 'https' and conn.sock.session is not None:
+                self._tls_sessions[key[1:]] = conn.sock.session
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self._max_idle:
+                idle.append((conn, time.time()))
+                return
+        conn.close()
+
+    def request(self, url, headers=None, method='GET', token=None,
+                allow=None):
+        """
+        Send a request and return a PooledResponse once the headers
+        have arrived.  Redirects are followed; any other status is
+        returned to the caller.  Connection failures raise URLError.
+        Setting the CancelToken token aborts the response.
+
+        GET and HEAD requests that fail to connect, time out or get a
+        5xx or 429 answer are sent again, with jittered exponential
+        backoff, as many times as the host policy allows.  A host that
+        keeps failing makes requests fail at once until its cooldown
+        is over.  Requests wait for their turn when the host already
+        has as many as its policy allows, the response holds its slot
+        until it is closed; bulk requests, as told by the token, leave
+        a slot to the others.  Hosts with a proxy are asked through it.
+
+        When allow is given, it is called with url and every URL
+        redirected to, and a URL it returns False for raises URLError
+        instead of being asked.
+        """
+        if headers is None:
+            headers = {}
+        request_headers = {'User-Agent': USER_AGENT}
+        request_headers.update(headers)
+        url = self._get_proxied_url(url)
+
+        for redirect in range(_MAX_REDIRECTS + 1):
+            parts = urllib.parse.urlsplit(url)
+            if parts.scheme not in ('http', 'https'):
+                raise urllib.error.URLError('unsupported scheme %s' %
+                                            parts.scheme)
+            if allow is not None and not allow(url):
+                raise urllib.error.URLError('%s is not allowed' % url)
+            key = (parts.scheme, parts.hostname, parts.port or
+                   (443 if parts.scheme == 'https' else 80))
+            path = parts.path or '/'
+            if parts.query:
+                path += '?' + parts.query
+
+            slot = self._acquire_slot(key[1], token)
+            try:
+                response, conn = self._send_with_retries(
+                    key, method, path, request_headers, token)
+            except BaseException:
+                self.release_slot(slot)
+                raise
+
+            location = response.getheader('Location')
+            if response.status in (301, 302, 303, 307, 308) and location:
+                response.read()
+                pooled = PooledResponse(self, key, conn, response, url,
+                                        slot=slot)
+                pooled.close()
+                url = urllib.parse.urljoin(url, location)
+                with self._lock:
+                    self._stats['redirects'] += 1
+                continue
+
+            return PooledResponse(self, key, conn, response, url, token,
+                                  slot)
+
+        raise urllib.error.URLError('too many redirects')
+
+    def _send_with_retries(self, key, method, path, headers, token):
+        host = key[1]
+        policy = self.get_host_policy(host)
+        retries = 0
+        if method in _IDEMPOTENT_METHODS:
+            retries = policy['retries']
+
+        for attempt in range(retries + 1):
+            self._check_breaker(host)
+            with self._lock:
+                self._stats['requests'] += 1
+            try:
+                response, conn = self._send(key, method, path, headers,
+                                            policy)
+            except urllib.error.URLError as e:
+                self._record_result(host, policy, True)
+                if attempt == retries:
+                    raise
+                error = e
+            else:
+                server_error = response.status >= 500
+                self._record_result(host, policy, server_error)
+                if attempt == retries or \
+                        not (server_error or response.status == 429):
+                    return response, conn
+                error = 'HTTP %d' % response.status
+                # the error page is not worth reading
+                response.close()
+                conn.close()
+
+            delay = _RETRY_DELAY * 2 ** attempt * (0.5 + random.random())
+            logging.debug('%s %s failed (%s), retrying in %.1f s', method,
+                          host, error, delay)
+            with self._lock:
+                self._stats['retries'] += 1
+            if token is not None:
+                if token.wait(delay):
+                    raise urllib.error.URLError('cancelled')
+            else:
+                time.sleep(delay)
+
+    def _send(self, key, method, path, headers, policy):
+        conn, reused = self._acquire(key, policy)
+        try:
+            conn.request(method, path, headers=headers)
+            return conn.getresponse(), conn
+        except _STALE_ERRORS as e:
+            conn.close()
+            if not reused:
+                raise urllib.error.URLError(e)
+            logging.debug('Pooled connection to %s went stale', key[1])
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            raise urllib.error.URLError(e)
+
+        conn = self._connect(key, policy)
+        try:
+            conn.request(method, path, headers=headers)
+            return conn.getresponse(), conn
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            raise urllib.error.URLError(e)
+
+    def add_wasted(self, count):
+        """Counts bytes received by a worker that was then cancelled"""
+        with self._lock:
+            self._stats['bytes_wasted'] += count
+
+    def get_stats(self):
+        """
+        Returns a copy of the pool counters plus the derived reuse ratio
+        and the mean connect (TCP + TLS handshake) time in seconds
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle'] = sum(len(idle) for idle in self._idle.values())
+        if stats['requests'] > 0:
+            stats['reuse_ratio'] = stats['reused'] / float(stats['requests'])
+        else:
+            stats['reuse_ratio'] = 0.0
+        if stats['connections'] > 0:
+            stats['mean_handshake_time'] = \
+                stats['handshake_time'] / stats['connections']
+        else:
+            stats['mean_handshake_time'] = 0.0
+        return stats
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for conn, last_used in connections:
+                conn.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Returns the process-wide ConnectionPool"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+    return _pool
+
+
+def urlopen(url, headers=None, token=None):
+    """
+    Open url through the shared pool.  file:// URIs and plain paths
+    (local volumes) are opened directly.  Setting the CancelToken token
+    aborts the transfer.
+    """
+    scheme = urllib.parse.urlsplit(url).scheme
+    if scheme in ('http', 'https'):
+        return get_pool().request(url, headers, token=token)
+    if scheme == 'file':
+        return urllib.request.urlopen(url)
+    try:
+        return open(url, 'rb')
+    except IOError as e:
+        raise urllib.error.URLError(e)
@@ -0,0 +1,89 @@
+#! /usr/bin/env python3
+
+# Copyright (C) 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+# Journal metadata of the downloaded books the index is built from
+PROPERTIES = ['uid', 'mime_type', 'source', 'source_id', 'source_url',
+              'sha1']
+
+
+class JournalIndex(object):
+    """
+    Finds the Journal entries of the books downloaded before, by the
+    source, identifier and format of the book, by the URL it was
+    downloaded from or by the checksum of its file, as kept in the
+    'source', 'source_id', 'mime_type', 'source_url' and 'sha1' metadata
+    of the entries.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._objects = {}
+
+    def _get_keys(self, metadata):
+        keys = []
+        if metadata.get('source_id'):
+            keys.append(('id', str(metadata.get('source', '')),
+                         str(metadata['source_id']),
+                         str(metadata.get('mime_type', ''))))
+        if metadata.get('source_url'):
+            keys.append(('url', str(metadata['source_url'])))
+        if metadata.get('sha1'):
+            keys.append(('sha1', str(metadata['sha1']).lower()))
+        return keys
+
+    def add(self, object_id, metadata):
+        self.remove(object_id)
+        keys = self._get_keys(metadata)
+        if not keys:
+            return
+        self._objects[object_id] = (keys, str(metadata.get('mime_type')),
+                                    metadata.get('sha1'))
+        for key in keys:
+            self._entries[key] = object_id
+
+    def remove(self, object_id):
+        """Returns the checksum of the removed entry, or None"""
+        keys, mime_type, sha1 = self._objects.pop(object_id,
+                                                  ((), None, None))
+        for key in keys:
+            if self._entries.get(key) == object_id:
+                del self._entries[key]
+        return sha1
+
+    def lookup(self, source=None, identifier=None, mime_type=None, url=None,
+               sha1=None):
+        """Returns the object id of a matching entry, or None"""
+        keys = []
+        if sha1:
+            keys.append(('sha1', sha1.lower()))
+        if url:
+            keys.append(('url', url))
+        if identifier:
+            keys.append(('id', source or '', identifier, mime_type or ''))
+        for key in keys:
+            if key in self._entries:
+                return self._entries[key]
+        return None
+
+    def get_checksums(self):
+        """Returns the (sha1, object_id, mime_type) of the entries"""
+        return [(sha1, object_id, mime_type) for object_id,
+                (keys, mime_type, sha1) in self._objects.items() if sha1]
+
+    def __len__(self):
+        return len(self._objects)
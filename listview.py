@@ -65,7 +65,8 @@ class ListView(ExtListView):
         self.emit('selection-changed')
 
     def populate(self, results):
-        self.populate_with_books(results.get_book_list())
+        # rows already shown stay, only books of new result pages are added
+        self.populate_with_books(results.get_book_list()[len(self):])
 
     def populate_with_books(self, books):
         rows = []
@@ -20,18 +20,27 @@ from gi.repository import GLib
 from gi.repository import GObject
 from gi.repository import Gtk
 
-from sugar3 import network
-
+import codecs
+import hashlib
+import http.client
+import io
+import json
 import logging
+import random
 import threading
 import os
 import urllib.request, urllib.parse, urllib.error
 import time
 import csv
+import zlib
+from xml.etree import ElementTree
 
 import sys
 sys.path.insert(0, './')
 import feedparser
+import bandwidth
+import httppool
+import opdsparser
 
 _REL_OPDS_ACQUISTION = 'http://opds-spec.org/acquisition'
 _REL_SUBSECTION = 'subsection'
@@ -39,44 +48,641 @@ _REL_OPDS_POPULAR = 'http://opds-spec.org/sort/popular'
 _REL_OPDS_NEW = 'http://opds-spec.org/sort/new'
 _REL_ALTERNATE = 'alternate'
 _REL_CRAWLABLE = 'http://opds-spec.org/crawlable'
+_REL_OPDS_IMAGE = 'http://opds-spec.org/image'
 
-GObject.threads_init()
+_CHUNK_SIZE = 64 * 1024
+_PREFETCH_DEPTH = 1
 
+# entries parsed off a streamed feed are shown in batches of
+# _BATCH_SIZE, or whatever arrived in the last _BATCH_INTERVAL seconds
+_BATCH_SIZE = 25
+_BATCH_INTERVAL = 0.1
 
-class ReadURLDownloader(network.GlibURLDownloader):
-    """URLDownloader that provides content-length and content-type."""
+_IA_DOWNLOAD_URI = 'https://archive.org/download/%s'
 
-    def get_content_length(self):
-        """Return the content-length of the download."""
-        if self._info is not None:
-            length = self._info.headers.get('Content-Length')
-            if length is not None:
-                return int(length)
-            else:
-                return 0
+# formats of the files listed in _files.xml, for the content types
+# offered to the user
+_IA_FORMATS = {
+    'text pdf': 'application/pdf',
+    'grayscale luratech pdf': 'application/pdf-bw',
+    'image container pdf': 'application/pdf',
+    'djvu': 'image/x.djvu',
+    'epub': 'application/epub+zip',
+}
+
+_FEDERATED_WORKERS = 4
+_SOURCE_TIMEOUT = 30
+
+# a failed transfer is resumed up to _DOWNLOAD_RETRIES times, waiting
+# _RETRY_DELAY seconds before the first retry and twice as long after
+# every new failure
+_DOWNLOAD_RETRIES = 4
+_RETRY_DELAY = 1
+
+# files of at least _SEGMENT_MIN_SIZE bytes can be fetched as several
+# byte ranges at once when the server supports it
+_SEGMENT_MIN_SIZE = 8 * 1024 * 1024
+
+GObject.threads_init()
 
-    def get_content_type(self):
-        """Return the content-type of the download."""
-        if self._info is not None:
-            return self._info.headers.get('Content-type')
+_file_list_cache = None
+
+
+def set_file_list_cache(cache):
+    """Sets the FileListCache used by Internet Archive books"""
+    global _file_list_cache
+    _file_list_cache = cache
+
+
+def _parse_file_list(data):
+    """
+    Returns the name, content type, size and checksums of the book
+    files listed in an Internet Archive _files.xml, in their order
+    """
+    files = []
+    for element in ElementTree.XML(data).findall('file'):
+        fmt = element.findtext('format')
+        if fmt is None or fmt.lower() not in _IA_FORMATS:
+            continue
+        files.append({'name': element.get('name'),
+                      'content_type': _IA_FORMATS[fmt.lower()],
+                      'size': int(element.findtext('size') or 0),
+                      'md5': element.findtext('md5'),
+                      'sha1': element.findtext('sha1')})
+    return files
+
+
+def _chunk_size(throttle):
+    if throttle is None:
+        return _CHUNK_SIZE
+    return throttle.get_chunk_size(_CHUNK_SIZE)
+
+
+def _download_to_file(url, path, progress_cb=None, headers=None,
+                      stopthread=None, throttle=None):
+    """
+    Fetch url through the shared connection pool into path.
+    Returns the content type, raises URLError on failure.
+    The transfer is abandoned when the stopthread event gets set, and
+    held to the rate of the bandwidth.Transfer throttle if given.
+    """
+    response = httppool.urlopen(url, headers, stopthread)
+    try:
+        status = getattr(response, 'status', None) or 200
+        if status >= 400:
+            raise urllib.error.HTTPError(url, status, response.reason,
+                                         response.headers, None)
+        content_type = response.headers.get('Content-Type')
+        content_length = int(response.headers.get('Content-Length') or 0)
+        bytes_downloaded = 0
+        with open(path, 'wb') as f:
+            while True:
+                if stopthread is not None and stopthread.is_set():
+                    break
+                data = response.read(_chunk_size(throttle))
+                if not data:
+                    break
+                f.write(data)
+                bytes_downloaded += len(data)
+                if progress_cb is not None:
+                    progress_cb(bytes_downloaded, content_length)
+                if throttle is not None:
+                    throttle.throttle(len(data), stopthread)
+    finally:
+        response.close()
+    return content_type
+
+
+class _PartialDownload(object):
+    '''
+    The part of url already downloaded, kept in directory along with
+    the validators needed to resume it with a Range request
+    '''
+
+    def __init__(self, directory, url):
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        self.path = os.path.join(directory, key + '.part')
+        self._info_path = os.path.join(directory, key + '.json')
+        try:
+            with open(self._info_path, 'r') as f:
+                self.info = json.load(f)
+        except (IOError, ValueError):
+            self.info = {}
+
+    def get_offset(self):
+        '''
+        Returns how many bytes can be resumed, none unless the server
+        gave a validator to check the rest still belongs to them
+        '''
+        if not self.info.get('etag') and not self.info.get('modified'):
+            return 0
+        if 'segments' in self.info:
+            # preallocated by a segmented download, the size says nothing
+            return 0
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def get_resume_headers(self):
+        offset = self.get_offset()
+        if offset == 0:
+            return {}
+        # If-Range makes the server send the whole file again if it
+        # changed since the partial download began
+        return {'Range': 'bytes=%d-' % offset,
+                'If-Range': self.info.get('etag') or self.info['modified']}
+
+    def start(self, response_headers, length):
+        '''Records the validators of a transfer starting from zero'''
+        etag = response_headers.get('ETag')
+        if etag is not None and etag.startswith('W/'):
+            # weak validators can not be used with If-Range
+            etag = None
+        self.info = {'etag': etag,
+                     'modified': response_headers.get('Last-Modified'),
+                     'content_type': response_headers.get('Content-Type'),
+                     'length': length}
+        self.save()
+
+    def save(self):
+        with open(self._info_path, 'w') as f:
+            json.dump(self.info, f)
+
+    def is_complete(self):
+        length = self.info.get('length')
+        return bool(length) and self.get_offset() == length
+
+    def finish(self, path):
+        '''Moves the completed download to path'''
+        os.replace(self.path, path)
+        self.discard()
+
+    def discard(self):
+        for path in (self.path, self._info_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        self.info = {}
+
+
+def _download_part(url, partial, progress_cb=None, stopthread=None,
+                   throttle=None):
+    """
+    Fetch what is missing of url into partial.  Returns the content
+    type; an interrupted transfer raises URLError or HTTPException and
+    leaves what was received in place for the next attempt.
+    """
+    if partial.is_complete():
+        return partial.info.get('content_type')
+
+    offset = partial.get_offset()
+    response = httppool.urlopen(url, partial.get_resume_headers(),
+                                stopthread)
+    try:
+        status = getattr(response, 'status', None) or 200
+        if status == 416:
+            # the partial file no longer matches, start over
+            partial.discard()
+            raise urllib.error.URLError('range not satisfiable')
+        if status >= 400:
+            raise urllib.error.HTTPError(url, status, response.reason,
+                                         response.headers, None)
+
+        content_range = response.headers.get('Content-Range', '')
+        if status == 206 and \
+                content_range.startswith('bytes %d-' % offset):
+            mode = 'ab'
+            content_length = int(content_range.rpartition('/')[2]) \
+                if not content_range.endswith('/*') else 0
+        else:
+            # the server ignored the range or the file changed
+            mode = 'wb'
+            offset = 0
+            content_length = int(response.headers.get('Content-Length')
+                                 or 0)
+            partial.start(response.headers, content_length)
+
+        bytes_downloaded = offset
+        with open(partial.path, mode) as f:
+            while True:
+                if stopthread is not None and stopthread.is_set():
+                    break
+                data = response.read(_chunk_size(throttle))
+                if not data:
+                    break
+                f.write(data)
+                bytes_downloaded += len(data)
+                if progress_cb is not None:
+                    progress_cb(bytes_downloaded, content_length)
+                if throttle is not None:
+                    throttle.throttle(len(data), stopthread)
+    finally:
+        response.close()
+
+    if content_length and bytes_downloaded < content_length and \
+            (stopthread is None or not stopthread.is_set()):
+        raise urllib.error.URLError('connection closed after %d of %d '
+                                    'bytes' % (bytes_downloaded,
+                                               content_length))
+    return partial.info.get('content_type')
+
+
+def _download_resumable(url, path, partial_dir, progress_cb=None,
+                        stopthread=None, retries=_DOWNLOAD_RETRIES,
+                        throttle=None):
+    """
+    Like _download_to_file, but the bytes received are kept in
+    partial_dir and transient failures are retried with exponential
+    backoff, resuming from the last byte written.  When all retries
+    fail the partial file stays, and a new download of the same url
+    resumes it.
+    """
+    partial = _PartialDownload(partial_dir, url)
+    for attempt in range(retries + 1):
+        try:
+            content_type = _download_part(url, partial, progress_cb,
+                                          stopthread, throttle)
+        except urllib.error.HTTPError as e:
+            if e.code < 500 and e.code not in (408, 429):
+                partial.discard()
+                raise
+            error = e
+        except (urllib.error.URLError, http.client.HTTPException,
+                OSError) as e:
+            error = e
+        else:
+            if stopthread is None or not stopthread.is_set():
+                partial.finish(path)
+            return content_type
+
+        if attempt == retries:
+            break
+        delay = _RETRY_DELAY * 2 ** attempt * (0.5 + random.random())
+        logging.debug('Download of %s failed (%s), retrying in %.1f s',
+                      url, error, delay)
+        if stopthread is not None:
+            if stopthread.wait(delay):
+                return None
+        else:
+            time.sleep(delay)
+
+    if isinstance(error, urllib.error.URLError):
+        raise error
+    raise urllib.error.URLError(error)
+
+
+def _probe_ranges(url, token=None):
+    """
+    Ask for the headers of url only.  Returns the final url after
+    redirects, its length and headers when the server serves byte ranges
+    with a strong validator, otherwise None.
+    """
+    try:
+        response = httppool.get_pool().request(url, method='HEAD',
+                                               token=token)
+    except urllib.error.URLError as e:
+        logging.debug('Could not probe %s: %s', url, e)
+        return None
+    response.close()
+    headers = response.headers
+    etag = headers.get('ETag')
+    if etag is not None and etag.startswith('W/'):
+        etag = None
+    if response.status != 200 or \
+            headers.get('Accept-Ranges', '').lower() != 'bytes' or \
+            not (etag or headers.get('Last-Modified')):
+        return None
+    return response.url, int(headers.get('Content-Length') or 0), headers
+
+
+class _SegmentsChanged(urllib.error.URLError):
+    '''The file changed on the server while it was downloaded in parts'''
+
+    def __init__(self, url):
+        urllib.error.URLError.__init__(self, '%s changed on the server' % url)
+
+
+def _download_segment(url, partial, fd, segment, lock, progress,
+                      stopthread, throttle=None):
+    """
+    Fetch the byte range [segment[0], segment[1]) of url into fd,
+    advancing segment[2], the position reached, as data is written.
+    """
+    start, end, position = segment
+    if position >= end:
+        return
+    headers = {'Range': 'bytes=%d-%d' % (position, end - 1),
+               'If-Range': partial.info.get('etag') or
+               partial.info['modified']}
+    response = httppool.urlopen(url, headers, stopthread)
+    try:
+        if response.status >= 400 and response.status != 416:
+            raise urllib.error.HTTPError(url, response.status,
+                                         response.reason, response.headers,
+                                         None)
+        content_range = response.headers.get('Content-Range', '')
+        if response.status != 206 or \
+                not content_range.startswith('bytes %d-' % position):
+            raise _SegmentsChanged(url)
+        while position < end:
+            if stopthread is not None and stopthread.is_set():
+                return
+            data = response.read(min(_chunk_size(throttle), end - position))
+            if not data:
+                break
+            os.pwrite(fd, data, position)
+            position += len(data)
+            with lock:
+                segment[2] = position
+                progress[0] += len(data)
+                progress[1](progress[0], partial.info['length'])
+            if throttle is not None:
+                throttle.throttle(len(data), stopthread)
+    finally:
+        response.close()
+    if position < end and (stopthread is None or not stopthread.is_set()):
+        raise urllib.error.URLError('segment %d-%d closed at %d' %
+                                    (start, end, position))
+
+
+def _download_segmented(url, path, partial_dir, segments,
+                        min_size=_SEGMENT_MIN_SIZE, progress_cb=None,
+                        stopthread=None, retries=_DOWNLOAD_RETRIES,
+                        throttle=None):
+    """
+    Download url as segments byte ranges fetched at the same time and
+    written in place into a preallocated partial file.  Every segment
+    is retried and resumed on its own.  Files smaller than min_size, or
+    on servers without range support, are downloaded as a single
+    resumable stream.
+    """
+    def single_stream():
+        return _download_resumable(url, path, partial_dir, progress_cb,
+                                   stopthread, retries, throttle)
+
+    probe = _probe_ranges(url, stopthread)
+    if probe is None or probe[1] < min_size:
+        return single_stream()
+    final_url, length, headers = probe
+
+    partial = _PartialDownload(partial_dir, url)
+    etag = headers.get('ETag')
+    if partial.info.get('segments') is None or \
+            partial.info.get('length') != length or \
+            partial.info.get('etag') != (None if etag and
+                                         etag.startswith('W/') else etag) or \
+            not os.path.exists(partial.path):
+        partial.start(headers, length)
+        size = length // segments
+        partial.info['segments'] = [
+            [n * size, length if n == segments - 1 else (n + 1) * size,
+             n * size] for n in range(segments)]
+        partial.save()
+        with open(partial.path, 'wb') as f:
+            f.truncate(length)
+
+    lock = threading.Lock()
+    progress = [sum(s[2] - s[0] for s in partial.info['segments']),
+                progress_cb or (lambda downloaded, length: None)]
+    errors = []
+
+    def fetch(segment):
+        for attempt in range(retries + 1):
+            try:
+                _download_segment(final_url, partial, fd, segment, lock,
+                                  progress, stopthread, throttle)
+                return
+            except _SegmentsChanged as e:
+                errors.append(e)
+                return
+            except (urllib.error.URLError, http.client.HTTPException,
+                    OSError) as e:
+                error = e
+            if attempt == retries or \
+                    (stopthread is not None and stopthread.is_set()):
+                break
+            delay = _RETRY_DELAY * 2 ** attempt * (0.5 + random.random())
+            logging.debug('Segment %d of %s failed (%s), retrying in '
+                          '%.1f s', segment[0], url, error, delay)
+            if stopthread is not None:
+                if stopthread.wait(delay):
+                    return
+            else:
+                time.sleep(delay)
+        errors.append(error)
+
+    fd = os.open(partial.path, os.O_WRONLY)
+    try:
+        workers = [threading.Thread(target=fetch, args=(segment,))
+                   for segment in partial.info['segments']]
+        for worker in workers:
+            worker.daemon = True
+            worker.start()
+        for worker in workers:
+            worker.join()
+    finally:
+        os.close(fd)
+        partial.save()
+
+    if stopthread is not None and stopthread.is_set():
         return None
+    if any(isinstance(e, _SegmentsChanged) for e in errors):
+        partial.discard()
+        return single_stream()
+    if errors:
+        raise errors[0] if isinstance(errors[0], urllib.error.URLError) \
+            else urllib.error.URLError(errors[0])
+    content_type = partial.info.get('content_type')
+    partial.finish(path)
+    return content_type
+
+
+def _parse_feed(body, headers, url):
+    """
+    Parse a catalog with opdsparser, or with feedparser when it is not
+    a well-formed Atom feed
+    """
+    try:
+        return opdsparser.parse(body, url, headers)
+    except (ElementTree.ParseError, zlib.error) as e:
+        logging.debug('Parsing %s with feedparser: %s', url, e)
+        return feedparser.parse(io.BytesIO(body), response_headers=headers,
+                                **opdsparser.LEAN_PROFILE)
+
+
+def _iter_lines(response, stopthread=None):
+    """
+    Yields the lines of a UTF-8 response, line ends included, as soon
+    as they have been received.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')('replace')
+    pending = ''
+    while stopthread is None or not stopthread.is_set():
+        data = response.read1(_CHUNK_SIZE)
+        if not data:
+            break
+        lines = (pending + decoder.decode(data)).split('\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line + '\n'
+    pending += decoder.decode(b'', True)
+    if pending:
+        yield pending
 
 
 class DownloadThread(threading.Thread):
 
-    def __init__(self, uri, headers, feedobj_cb):
+    def __init__(self, uri, headers, feedobj_cb, cache=None,
+                 entries_cb=None, priority=httppool.PRIORITY_INTERACTIVE):
         threading.Thread.__init__(self)
         self._uri = uri
         self._headers = headers
         self._feedobj_cb = feedobj_cb
+        self._cache = cache
+        self._entries_cb = entries_cb
 
-        self.stopthread = threading.Event()
+        self.stopthread = httppool.CancelToken(priority)
 
     def run(self):
         logging.debug('Searching URL %s headers %s' % (self._uri,
                                                        self._headers))
-        feedobj = feedparser.parse(self._uri, request_headers=self._headers)
-        self._feedobj_cb(feedobj)
+        headers = {'Accept': feedparser.ACCEPT_HEADER,
+                   'Accept-Encoding': 'gzip, deflate'}
+        headers.update(self._headers)
+        language = self._headers.get('Accept-Language')
+
+        cached = None
+        if self._cache is not None:
+            cached = self._cache.lookup(self._uri, language)
+            headers.update(self._cache.get_conditional_headers(cached))
+
+        try:
+            response = httppool.urlopen(self._uri, headers, self.stopthread)
+        except urllib.error.URLError as e:
+            if cached is not None:
+                logging.debug('Offline, using cached feed %s', self._uri)
+                feedobj = self._parse_cached(cached)
+            else:
+                feedobj = feedparser.FeedParserDict()
+                feedobj['feed'] = feedparser.FeedParserDict()
+                feedobj['entries'] = []
+                feedobj['bozo'] = 1
+                feedobj['bozo_exception'] = e
+        else:
+            if cached is not None and response.status == 304:
+                response.close()
+                logging.debug('Feed %s not modified', self._uri)
+                feedobj = self._parse_cached(cached)
+            elif (getattr(response, 'status', None) or 200) == 200:
+                # local catalogs are plain files without headers
+                response_headers = getattr(response, 'headers', {})
+                url = getattr(response, 'url', self._uri)
+                try:
+                    if self._entries_cb is not None:
+                        body, feedobj = self._stream(response,
+                                                     response_headers, url)
+                    else:
+                        body = response.read()
+                        feedobj = _parse_feed(body, self._get_headers(
+                            response_headers, url), url)
+                except (OSError, http.client.HTTPException) as e:
+                    response.close()
+                    if self.stopthread.is_set():
+                        return
+                    logging.error('Reading %s failed: %s', self._uri, e)
+                    feedobj = feedparser.FeedParserDict()
+                    feedobj['feed'] = feedparser.FeedParserDict()
+                    feedobj['entries'] = []
+                    feedobj['bozo'] = 1
+                    feedobj['bozo_exception'] = e
+                    GLib.idle_add(self._feedobj_cb, feedobj)
+                    return
+                if self.stopthread.is_set():
+                    return
+                if self._cache is not None:
+                    self._cache.store(self._uri, language, response_headers,
+                                      body)
+            else:
+                feedobj = feedparser.parse(response,
+                                           **opdsparser.LEAN_PROFILE)
+        GLib.idle_add(self._feedobj_cb, feedobj)
+
+    def _stream(self, response, response_headers, url):
+        """
+        Parse the feed while it downloads, handing the entries read so
+        far to entries_cb every _BATCH_SIZE entries or _BATCH_INTERVAL
+        seconds.  Returns the raw body and the complete feedobj; if the
+        document turns out not to be well-formed, the feedobj comes from
+        feedparser and its first entries are the ones already handed out.
+        """
+        headers = self._get_headers(response_headers, url)
+        decompressor = None
+        if headers.get('content-encoding', '') in ('gzip', 'deflate'):
+            decompressor = zlib.decompressobj(zlib.MAX_WBITS | 32)
+        parser = opdsparser.OPDSStreamParser(url)
+
+        chunks = []
+        batch = []
+        last_batch = time.time()
+        while not self.stopthread.is_set():
+            data = response.read1(_CHUNK_SIZE)
+            if not data:
+                break
+            chunks.append(data)
+            if parser is None:
+                continue
+            try:
+                if decompressor is not None:
+                    data = decompressor.decompress(data)
+                parser.feed_data(data)
+            except (ElementTree.ParseError, zlib.error) as e:
+                logging.debug('Streaming parse of %s failed: %s',
+                              self._uri, e)
+                parser = None
+                continue
+
+            batch.extend(parser.take_entries())
+            if len(batch) >= _BATCH_SIZE or (batch and
+                    time.time() - last_batch >= _BATCH_INTERVAL):
+                GLib.idle_add(self._entries_cb, parser.feed, batch)
+                batch = []
+                last_batch = time.time()
+        response.close()
+        if self.stopthread.is_set():
+            # cancelled, the rest of the feed is not worth parsing
+            return None, None
+
+        body = b''.join(chunks)
+        if parser is not None:
+            try:
+                parser.close()
+            except ElementTree.ParseError as e:
+                logging.debug('Streaming parse of %s failed: %s',
+                              self._uri, e)
+                parser = None
+        if parser is None:
+            return body, feedparser.parse(io.BytesIO(body),
+                                          response_headers=headers,
+                                          **opdsparser.LEAN_PROFILE)
+
+        return body, parser.get_feedobj(headers)
+
+    def _get_headers(self, headers, uri):
+        # feedparser takes the base URI of relative links from
+        # Content-Location when it is not reading from a live response
+        headers = dict((k.lower(), v) for k, v in headers.items())
+        headers['content-location'] = uri
+        return headers
+
+    def _parse_cached(self, cached):
+        return _parse_feed(cached['body'],
+                           self._get_headers(cached['headers'],
+                                             cached['uri']),
+                           cached['uri'])
 
     def stop(self):
         self.stopthread.set()
@@ -88,6 +694,18 @@ class Book(object):
         self._entry = entry
         self._basepath = basepath
         self._configuration = configuration
+        self._source = None
+        self._summary = None
+
+    def get_source(self):
+        '''
+        Returns the source key the book was found in, or None when
+        it came from the source selected in the toolbar
+        '''
+        return self._source
+
+    def set_source(self, source):
+        self._source = source
 
     def get_title(self):
         try:
@@ -126,10 +744,31 @@ class Book(object):
         return ret
 
     def get_download_links(self, content_type, download_cb, _):
+        '''
+        Calls download_cb with the url of the book in content_type, or
+        with None when it is not available.  Returns an object with a
+        stop() method when finding it out takes a download, None
+        otherwise.
+        '''
         types = self.get_types()
-        if content_type in types:
-            url = types[content_type]
-            GLib.idle_add(download_cb, url)
+        GLib.idle_add(download_cb, types.get(content_type))
+        return None
+
+    def resolve_links(self, resolved_cb, path):
+        '''
+        Starts finding out the files get_download_links would download,
+        ahead of time, and calls resolved_cb with the book once
+        get_types gives them.  Returns an object with a stop() method to
+        give up, or None when the links are known already.
+        '''
+        return None
+
+    def get_checksum(self, content_type):
+        '''
+        Returns the SHA-1 the origin gives for the file of the book in
+        content_type, once get_download_links has found it, or None
+        '''
+        return None
 
     def get_publisher(self):
         try:
@@ -172,16 +811,24 @@ class Book(object):
         return ret
 
     def get_summary(self):
+        if self._summary is not None:
+            return self._summary
         if self._configuration is not None \
             and 'summary_field' in self._configuration:
+                field = self._configuration['summary_field']
                 try:
-                    ret = self._entry[self._configuration['summary_field']]
+                    ret = opdsparser.sanitize(self._entry, field)
                 except KeyError:
                     ret = 'Unknown'
         else:
                 ret = 'Unknown'
+        self._summary = ret
         return ret
 
+    def get_identifier(self):
+        '''Returns the id the source gives to the book, or None'''
+        return self._entry.get('id')
+
     def get_object_id(self):
         try:
             ret = self._entry['object_id']
@@ -210,9 +857,12 @@ class QueryResult(GObject.GObject):
                           ([bool])),
     }
 
-    def __init__(self, configuration, query, language):
+    def __init__(self, configuration, query, language, cache=None,
+                 prefetch_depth=_PREFETCH_DEPTH):
         GObject.GObject.__init__(self)
         self._configuration = configuration
+        self._cache = cache
+        self._prefetch_depth = prefetch_depth
         self._uri = self._configuration['query_uri']
         self._query = query
         self._language = language
@@ -223,21 +873,101 @@ class QueryResult(GObject.GObject):
         self._cataloglist = []
         self.threads = []
 
+        # pagination state: pages are fetched one after the other by
+        # following the 'next' link of the last page received, up to
+        # prefetch_depth pages are kept ready ahead of what is shown
+        self._headers = {}
+        self._requested_uris = set()
+        self._last_feedobj = None
+        self._pending = False
+        self._prefetched = []
+        self._wanted = 0
+        self._streamed = 0
+        self._cancelled = False
+
         uri = self._uri
-        headers = {}
         if not self.is_local():
             uri += self._query.replace(' ', '+')
             if self._language is not None and self._language != 'all':
-                headers['Accept-Language'] = self._language
+                self._headers['Accept-Language'] = self._language
                 uri += '&lang=' + self._language
 
-        d_thread = DownloadThread(uri, headers, self.__feedobj_cb)
+        self._start_download(uri, self.__feedobj_cb, self.__entries_cb)
+
+    def _start_download(self, uri, feedobj_cb, entries_cb=None,
+                        priority=httppool.PRIORITY_INTERACTIVE):
+        if uri in self._requested_uris:
+            return False
+        self._requested_uris.add(uri)
+        self._pending = True
+
+        d_thread = DownloadThread(uri, self._headers, feedobj_cb,
+                                  self._cache, entries_cb, priority)
         d_thread.daemon = True
         self.threads.append(d_thread)
         d_thread.start()
+        return True
+
+    def __entries_cb(self, feed, entries):
+        # first rows of a feed that is still downloading
+        if self._cancelled:
+            return
+        self._streamed += len(entries)
+        feedobj = feedparser.FeedParserDict()
+        feedobj['feed'] = feed
+        feedobj['entries'] = entries
+        self._append_feed(feedobj)
+        self.emit('updated', True)
 
     def __feedobj_cb(self, feedobj):
+        if self._cancelled:
+            return
+        self._pending = False
+        self._last_feedobj = feedobj
+        self._append_feed(feedobj, feedobj['entries'][self._streamed:])
+        self._ready = True
+        self.emit('updated', False)
+        self._prefetch()
+
+    def __page_cb(self, feedobj):
+        if self._cancelled:
+            return
+        self._pending = False
+        self._last_feedobj = feedobj
+        self._prefetched.append(feedobj)
+        if self._wanted > 0:
+            self._wanted -= 1
+            self._show_next_page()
+        self._prefetch()
+
+    def _prefetch(self):
+        if self._cancelled or self._pending or \
+                len(self._prefetched) >= self._prefetch_depth:
+            return
+        next_uri = self._get_next_uri(self._last_feedobj)
+        if next_uri is not None:
+            logging.debug('Prefetching page %s', next_uri)
+            self._start_download(next_uri, self.__page_cb,
+                                 priority=httppool.PRIORITY_SPECULATIVE)
+
+    def _show_next_page(self):
+        self._append_feed(self._prefetched.pop(0))
+        self._ready = True
+        self.emit('updated', True)
+
+    def _get_next_uri(self, feedobj):
+        if feedobj is None or not 'links' in feedobj['feed']:
+            return None
+        for link in feedobj['feed']['links']:
+            if link['rel'] == 'next' and \
+                    link['href'] not in self._requested_uris:
+                return link['href']
+        return None
+
+    def _append_feed(self, feedobj, entries=None):
         self._feedobj = feedobj
+        if entries is None:
+            entries = feedobj['entries']
 
         # Get catalog Type
         CATALOG_TYPE = 'COMMON'
@@ -255,14 +985,16 @@ class QueryResult(GObject.GObject):
                 else:
                     return 'BOOK'
 
-        for entry in feedobj['entries']:
+        for entry in entries:
             if entry_type(entry) == 'BOOK' and CATALOG_TYPE != 'CRAWLABLE':
-                self._booklist.append(Book(self._configuration, entry))
+                book = self._create_book(entry)
+                if book is not None:
+                    self._booklist.append(book)
             elif entry_type(entry) == 'CATALOG' or CATALOG_TYPE == 'CRAWLABLE':
                 self._cataloglist.append(Book(self._configuration, entry))
 
-        self._ready = True
-        self.emit('updated', False)
+    def _create_book(self, entry):
+        return Book(self._configuration, entry)
 
     def __len__(self):
         return len(self._booklist)
@@ -270,31 +1002,42 @@ class QueryResult(GObject.GObject):
     def has_next(self):
         '''
         Returns True if more result pages are
-        available for the resultset
+        available for the resultset, never before the first page or
+        while waiting for the next one
         '''
-        if not 'links' in self._feedobj['feed']:
+        if not self._ready:
             return False
-        for link in self._feedobj['feed']['links']:
-            if link['rel'] == 'next':
-                self._next_uri = link['href']
-                return True
+        if self._prefetched or self._pending:
+            return True
+        next_uri = self._get_next_uri(self._last_feedobj)
+        if next_uri is not None:
+            self._next_uri = next_uri
+            return True
 
         return False
 
     def update_with_next(self):
         '''
-        Updates the booklist with the next resultset
+        Updates the booklist with the next resultset, straight from
+        the prefetched pages when it is already there
         '''
-        if len(self._next_uri) > 0:
+        if self._prefetched:
+            self._show_next_page()
+        elif self._pending:
+            self._ready = False
+            self._wanted += 1
+        elif self.has_next():
             self._ready = False
-            self._uri = self._next_uri
-            self.cancel()  # XXX: Is this needed ?
-            self._start_download(midway=True)
+            self._wanted += 1
+            self._start_download(self._next_uri, self.__page_cb)
+        self._prefetch()
 
     def cancel(self):
         '''
-        Cancels the query job
+        Cancels the query job, its downloads are aborted and what they
+        already received is thrown away
         '''
+        self._cancelled = True
         for d_thread in self.threads:
             d_thread.stop()
 
@@ -322,6 +1065,14 @@ class QueryResult(GObject.GObject):
         '''
         return self._ready
 
+    def is_failed(self):
+        '''
+        Returns True if the query ended without results because the
+        source could not be read
+        '''
+        return self._feedobj is not None and \
+            'bozo_exception' in self._feedobj and len(self._booklist) == 0
+
     def is_local(self):
         '''
         Returns True in case of a local school
@@ -334,85 +1085,180 @@ class QueryResult(GObject.GObject):
 class LocalVolumeQueryResult(QueryResult):
 
     def __init__(self, path, query, language):
-        configuration = {'query_uri': os.path.join(path, 'catalog.xml')}
+        configuration = {'query_uri': os.path.join(path, 'catalog.xml'),
+                         'opds_cover': _REL_OPDS_IMAGE}
         QueryResult.__init__(self, configuration, query, language)
 
     def is_local(self):
         return True
 
-    def get_book_list(self):
-        ret = []
-        if self._query is None or self._query == '':
-            for entry in self._feedobj['entries']:
-                ret.append(Book(entry, basepath=os.path.dirname(self._uri)))
-        else:
-            for entry in self._feedobj['entries']:
-                book = Book(entry, basepath=os.path.dirname(self._uri))
-                if book.match(self._query.replace(' ', '+')):
-                    ret.append(book)
-        return ret
+    def _create_book(self, entry):
+        book = Book(self._configuration, entry,
+                    basepath=os.path.dirname(self._uri))
+        if self._query is None or self._query == '' or \
+                book.match(self._query.replace(' ', '+')):
+            return book
+        return None
 
 
 class RemoteQueryResult(QueryResult):
 
-    def __init__(self, configuration, query, language):
-        QueryResult.__init__(self, configuration, query, language)
+    def __init__(self, configuration, query, language, cache=None,
+                 prefetch_depth=_PREFETCH_DEPTH):
+        QueryResult.__init__(self, configuration, query, language, cache,
+                             prefetch_depth)
+
+
+class _FileListRequest(object):
+    '''
+    What a caller of InternetArchiveBook.get_file_list waits on: the
+    fetch of the file list shared with the other callers.  Stopping
+    it drops the callback of this caller only, and the fetch with the
+    last one.
+    '''
+
+    def __init__(self, book, fetch, files_cb):
+        self._book = book
+        self._fetch = fetch
+        self._files_cb = files_cb
+
+    def stop(self):
+        downloader, callbacks = self._fetch
+        if self._files_cb in callbacks:
+            callbacks.remove(self._files_cb)
+            if not callbacks:
+                downloader.stop()
+                if self._book._file_list_fetch is self._fetch:
+                    self._book._file_list_fetch = None
 
 
 class InternetArchiveBook(Book):
 
     def __init__(self, configuration, entry, basepath=None):
         Book.__init__(self, configuration, entry, basepath=None)
+        self._files = None
+        # the (downloader, callbacks) of the file list being fetched
+        self._file_list_fetch = None
 
     def get_types(self):
-        return self._entry['links']
+        '''
+        Returns the formats guessed from the search results or, once
+        the file list is known, the size of the file in every format
+        '''
+        if self._files is None:
+            return self._entry['links']
+        types = {}
+        for book_file in self._files:
+            types.setdefault(book_file['content_type'], book_file['size'])
+        return types
+
+    def resolve_links(self, resolved_cb, path):
+        def files_cb(files):
+            if files is not None:
+                resolved_cb(self)
+            return False
 
-    def get_download_links(self, content_type, download_cb, path):
+        return self.get_file_list(files_cb, path,
+                                  httppool.PRIORITY_SPECULATIVE)
+
+    def get_file_list(self, files_cb, path,
+                      priority=httppool.PRIORITY_INTERACTIVE):
         """
-        Download and parse the {identifier}_files.xml file list in the
-        {identifier} directory and choose a file matching the
-        requested content type.
+        Calls files_cb with the book files of this item, as listed by
+        its {identifier}_files.xml, or with None when the list can not
+        be had.  The list is downloaded to path, unless it is known
+        already or the file list cache has a fresh copy; an object with
+        a stop() method to give up is returned then, None otherwise.
+        Callers asking while the list is being downloaded wait for that
+        download instead of starting another.
         """
-        url_base = 'https://archive.org/download/%s' % self._entry['identifier']
-        url = os.path.join(url_base, '%s_files.xml' % self._entry['identifier'])
-
-        downloader = FileDownloader(url, path)
+        if self._files is not None:
+            GLib.idle_add(files_cb, self._files)
+            return None
+        if self._file_list_fetch is not None:
+            self._file_list_fetch[1].append(files_cb)
+            return _FileListRequest(self, self._file_list_fetch, files_cb)
+
+        identifier = self._entry['identifier']
+        cached, fresh = None, False
+        if _file_list_cache is not None:
+            cached, fresh = _file_list_cache.lookup(identifier)
+        if fresh:
+            self._files = cached
+            GLib.idle_add(files_cb, cached)
+            return None
+
+        url = os.path.join(_IA_DOWNLOAD_URI % identifier,
+                           '%s_files.xml' % identifier)
+        # small enough to be fetched again whole, and a resumable
+        # download would share its partial file with other fetches
+        downloader = FileDownloader(url, path, priority=priority)
+        fetch = (downloader, [files_cb])
+        self._file_list_fetch = fetch
 
         def updated(downloader, path, _):
-            if path is None:
+            if self._file_list_fetch is fetch:
+                self._file_list_fetch = None
+            callbacks = list(fetch[1])
+            del fetch[1][:]
+            files = None
+            if path is not None:
+                try:
+                    with open(path, 'rb') as f:
+                        files = _parse_file_list(f.read())
+                except ElementTree.ParseError as e:
+                    logging.error('Bad file list for %s: %s', identifier, e)
+                os.remove(path)
+
+            if files is None:
                 logging.error('internet archive file list get fail')
-                # FIXME: report to user a failure to download
-                return
+                if cached is not None:
+                    logging.debug('Using the stale file list of %s',
+                                  identifier)
+                files = cached
+            else:
+                if _file_list_cache is not None:
+                    _file_list_cache.store(identifier, files)
+                self._files = files
+            for callback in callbacks:
+                callback(files)
 
-            from xml.etree.ElementTree import XML
-            xml = XML(open(path, 'r').read())
-            os.remove(path)
-
-            table = {
-                'text pdf': 'application/pdf',
-                'grayscale luratech pdf': 'application/pdf-bw',
-                'image container pdf': 'application/pdf',
-                'djvu': 'image/x.djvu',
-                'epub': 'application/epub+zip',
-            }
-
-            chosen = None
-            for element in xml.findall('file'):
-                fmt = element.find('format').text.lower()
-                if fmt in table:
-                    if table[fmt] == content_type:
-                        chosen = element.get('name')
-                        break
-
-            if chosen is None:
-                logging.error('internet archive file list omits content type')
-                # FIXME: report to user a failure to find matching content
-                return
+        downloader.connect('updated', updated)
+        return _FileListRequest(self, fetch, files_cb)
+
+    def get_download_links(self, content_type, download_cb, path):
+        """
+        Get the {identifier}_files.xml file list in the {identifier}
+        directory and choose a file matching the requested content type.
+        Returns what get_file_list returns.
+        """
+        url_base = _IA_DOWNLOAD_URI % self._entry['identifier']
 
-            url = os.path.join(url_base, chosen)
-            GLib.idle_add(download_cb, url)
+        def files_cb(files):
+            if files is None:
+                download_cb(None)
+                return False
 
-        downloader.connect('updated', updated)
+            for book_file in files:
+                if book_file['content_type'] == content_type:
+                    download_cb(os.path.join(
+                        url_base, urllib.parse.quote(book_file['name'])))
+                    return False
+
+            logging.error('internet archive file list omits content type')
+            download_cb(None)
+            return False
+
+        return self.get_file_list(files_cb, path)
+
+    def get_identifier(self):
+        return self._entry['identifier']
+
+    def get_checksum(self, content_type):
+        for book_file in self._files or []:
+            if book_file['content_type'] == content_type:
+                return book_file['sha1']
+        return None
 
     def get_image_url(self):
         return {'jpg': self._entry['cover_image']}
@@ -420,12 +1266,12 @@ class InternetArchiveBook(Book):
 
 class InternetArchiveDownloadThread(threading.Thread):
 
-    def __init__(self, query, path, updated_cb, append_cb, ready_cb):
+    def __init__(self, query, updated_cb, append_cb, ready_cb, error_cb):
         threading.Thread.__init__(self)
-        self._path = path
         self._updated_cb = updated_cb
         self._append_cb = append_cb
         self._ready_cb = ready_cb
+        self._error_cb = error_cb
 
         self._download_content_length = 0
         self._download_content_type = None
@@ -441,69 +1287,100 @@ class InternetArchiveDownloadThread(threading.Thread):
             FL + '=volume'
         self._url += '&' + SORT + '=title&' + SORT + '&' + \
             SORT + '=&rows=500&save=yes&fmt=csv'
-        self.stopthread = threading.Event()
+        self.stopthread = httppool.CancelToken(
+            httppool.PRIORITY_INTERACTIVE)
 
     def run(self):
-        getter = ReadURLDownloader(self._url)
-        getter.connect("finished", self.__finished_cb)
-        getter.connect("error", self.__error_cb)
         try:
-            getter.start(self._path)
-        except:
-            pass
-        self._download_content_type = getter.get_content_type()
-
-    def __error_cb(self, getter, err):
-        self._download_content_length = 0
-        self._download_content_type = None
+            response = httppool.urlopen(self._url, token=self.stopthread)
+        except urllib.error.URLError as e:
+            self.__error_cb(e)
+            return
 
-    def __finished_cb(self, getter, path, suggested_name):
-        if self._download_content_type.startswith('text/html'):
+        self._download_content_type = response.headers.get('Content-Type')
+        if response.status != 200 or self._download_content_type is None \
+                or self._download_content_type.startswith('text/html'):
             # got an error page instead
-            self._get_csv_error_cb(getter, 'HTTP Error')
+            response.close()
+            self.__error_cb('HTTP Error %d' % response.status)
             return
 
-        reader = csv.reader(open(path,  'rt'))
-        next(reader)  # skip the first header row.
+        try:
+            self.__read_rows(response)
+        except (urllib.error.URLError, OSError,
+                http.client.HTTPException) as e:
+            self.__error_cb(e)
+        finally:
+            response.close()
+
+    def __error_cb(self, err):
+        if self.stopthread.is_set():
+            return
+        logging.error('Internet Archive search failed: %s', err)
+        self._download_content_length = 0
+        self._download_content_type = None
+        GLib.idle_add(self._error_cb)
+        GLib.idle_add(self._updated_cb)
+        GLib.idle_add(self._ready_cb)
+
+    def __read_rows(self, response):
+        # rows are parsed as the CSV arrives, books go to the result
+        # in batches so the first ones show up before the download ends
+        reader = csv.reader(_iter_lines(response, self.stopthread))
+        next(reader, None)  # skip the first header row.
+        batch = []
+        last_batch = time.time()
         for row in reader:
             if len(row) >= 7:
-                entry = {}
-                entry['author'] = row[0]
-                entry['description'] = row[1]
-                entry['format'] = row[2]
-                entry['identifier'] = row[3]
-                entry['dcterms_language'] = row[4]
-                entry['dcterms_publisher'] = row[5]
-                entry['title'] = row[6]
-                if len(row) < 8:
-                    volume = ''
-                else:
-                    volume = row[7]
-                if volume is not None and len(volume) > 0:
-                    entry['title'] = row[6] + 'Volume ' + volume
-
-                entry['links'] = {}
-                url_base = 'https://archive.org/download/' + \
-                        row[3] + '/' + row[3]
-
-                formats = entry['format'].split(',')
-                if 'DjVu' in formats:
-                    entry['links']['image/x.djvu'] = 'yes'
-                if entry['format'].find('Grayscale LuraTech PDF') > -1:
-                    # Fake mime type
-                    entry['links']['application/pdf-bw'] = 'yes'
-                if entry['format'].find('PDF') > -1:
-                    entry['links']['application/pdf'] = 'yes'
-                if entry['format'].find('EPUB') > -1:
-                    entry['links']['application/epub+zip'] = 'yes'
-                entry['cover_image'] = 'https://archive.org/download/' + \
-                        row[3] + '/page/cover_thumb.jpg'
-
-                self._append_cb(InternetArchiveBook(None, entry, ''))
-
-        os.remove(path)
-        self._updated_cb()
-        self._ready_cb()
+                batch.append(InternetArchiveBook(None,
+                                                 self.__row_to_entry(row),
+                                                 ''))
+            if len(batch) >= _BATCH_SIZE or (batch and
+                    time.time() - last_batch >= _BATCH_INTERVAL):
+                GLib.idle_add(self._append_cb, batch)
+                batch = []
+                last_batch = time.time()
+
+        if self.stopthread.is_set():
+            return
+        if batch:
+            GLib.idle_add(self._append_cb, batch)
+        GLib.idle_add(self._updated_cb)
+        GLib.idle_add(self._ready_cb)
+
+    def __row_to_entry(self, row):
+        entry = {}
+        entry['author'] = row[0]
+        entry['description'] = row[1]
+        entry['format'] = row[2]
+        entry['identifier'] = row[3]
+        entry['dcterms_language'] = row[4]
+        entry['dcterms_publisher'] = row[5]
+        entry['title'] = row[6]
+        if len(row) < 8:
+            volume = ''
+        else:
+            volume = row[7]
+        if volume is not None and len(volume) > 0:
+            entry['title'] = row[6] + 'Volume ' + volume
+
+        entry['links'] = {}
+        url_base = 'https://archive.org/download/' + \
+                row[3] + '/' + row[3]
+
+        formats = entry['format'].split(',')
+        if 'DjVu' in formats:
+            entry['links']['image/x.djvu'] = 'yes'
+        if entry['format'].find('Grayscale LuraTech PDF') > -1:
+            # Fake mime type
+            entry['links']['application/pdf-bw'] = 'yes'
+        if entry['format'].find('PDF') > -1:
+            entry['links']['application/pdf'] = 'yes'
+        if entry['format'].find('EPUB') > -1:
+            entry['links']['application/epub+zip'] = 'yes'
+        entry['cover_image'] = 'https://archive.org/download/' + \
+                row[3] + '/page/cover_thumb.jpg'
+        return entry
 
     def stop(self):
         self.stopthread.set()
@@ -514,76 +1391,351 @@ class InternetArchiveQueryResult(QueryResult):
     # Search in Internet archive does not use OPDS
     # because the server implementation is not working very well
 
-    def __init__(self, query, path):
+    def __init__(self, query):
         GObject.GObject.__init__(self)
         self._next_uri = ''
         self._ready = False
         self._booklist = []
         self._cataloglist = []
         self.threads = []
+        self._cancelled = False
+        self._failed = False
 
-        d_thread = InternetArchiveDownloadThread(query, path,
+        d_thread = InternetArchiveDownloadThread(query,
                                                  self.__updated_cb,
                                                  self.__append_cb,
-                                                 self.__ready_cb)
+                                                 self.__ready_cb,
+                                                 self.__error_cb)
         d_thread.daemon = True
         self.threads.append(d_thread)
         d_thread.start()
 
     def __updated_cb(self):
-        self.emit('updated', False)
+        if not self._cancelled:
+            self.emit('updated', False)
+
+    def has_next(self):
+        # the advanced search returns all its rows at once
+        return False
 
-    def __append_cb(self, book):
-        self._booklist.append(book)
+    def __append_cb(self, books):
+        if self._cancelled:
+            return
+        self._booklist.extend(books)
+        self.emit('updated', True)
 
     def __ready_cb(self):
         self._ready = True
 
+    def __error_cb(self):
+        self._failed = True
+
+    def is_failed(self):
+        return self._failed and len(self._booklist) == 0
+
+
+class BookListQueryResult(QueryResult):
+
+    # Books found by a function that blocks, like a search in the
+    # Journal, which runs in a thread so that the UI, and the other
+    # sources of a federated search, do not wait for it
+
+    def __init__(self, find):
+        GObject.GObject.__init__(self)
+        self._next_uri = ''
+        self._ready = False
+        self._booklist = []
+        self._cataloglist = []
+        self.threads = []
+        self._cancelled = False
+        self._failed = False
+
+        d_thread = threading.Thread(target=self.__find, args=(find,))
+        d_thread.daemon = True
+        d_thread.start()
+
+    def __find(self, find):
+        try:
+            books = find()
+        except Exception as e:
+            logging.error('Search failed: %s', e)
+            books = None
+        GLib.idle_add(self.__found_cb, books)
+
+    def __found_cb(self, books):
+        if self._cancelled:
+            return False
+        if books is None:
+            self._failed = True
+        else:
+            self._booklist.extend(books)
+        self._ready = True
+        self.emit('updated', False)
+        return False
+
+    def has_next(self):
+        return False
+
+    def is_failed(self):
+        return self._failed
+
+
+class FederatedQueryResult(QueryResult):
+
+    # Runs the same query against several backends at once and merges
+    # their books, dropping duplicates, in the order the answers come
+
+    def __init__(self, backends, max_workers=_FEDERATED_WORKERS,
+                 timeout=_SOURCE_TIMEOUT):
+        '''
+        backends is a list of (source, name, factory) where factory
+        returns a QueryResult, called on the main loop so it must not
+        block: synchronous backends like the Journal are wrapped in a
+        BookListQueryResult
+        '''
+        GObject.GObject.__init__(self)
+        self._next_uri = ''
+        self._ready = False
+        self._booklist = []
+        self._cataloglist = []
+        self.threads = []
+
+        self._max_workers = max_workers
+        self._timeout = timeout
+        self._waiting = list(backends)
+        self._running = {}
+        # the results that may have more pages, by source
+        self._paged = {}
+        self._seen = set()
+        self._cancelled = False
+        self._status = []
+        for source, name, factory in backends:
+            self._status.append({'source': source, 'name': name,
+                                 'status': 'queued', 'books': 0,
+                                 'more': False, 'latency': None,
+                                 'start': None})
+        GLib.idle_add(self._advance)
+
+    def _get_status(self, source):
+        for status in self._status:
+            if status['source'] == source:
+                return status
+
+    def _advance(self):
+        if self._cancelled:
+            return False
+        self._start_backends()
+        if not self._running and not self._waiting:
+            self._ready = True
+            self.emit('updated', False)
+        else:
+            self.emit('updated', True)
+        return False
+
+    def _start_backends(self):
+        while self._waiting and len(self._running) < self._max_workers:
+            source, name, factory = self._waiting.pop(0)
+            status = self._get_status(source)
+            status['status'] = 'running'
+            status['start'] = time.time()
+            try:
+                result = factory()
+            except Exception as e:
+                logging.error('Search in %s failed: %s', name, e)
+                self._finish(source, 'error')
+                continue
+            self._watch(source, result)
+
+    def _watch(self, source, result, paging=False):
+        handler_id = result.connect('updated', self.__source_updated_cb,
+                                    source)
+        timeout_id = GLib.timeout_add_seconds(self._timeout,
+                                              self.__timeout_cb, source)
+        self._running[source] = {'result': result, 'handler': handler_id,
+                                 'timeout': timeout_id, 'paging': paging,
+                                 'merged': len(result.get_book_list())}
+
+    def __source_updated_cb(self, result, midway, source):
+        running = self._running.get(source)
+        if running is None:
+            return
+        books = result.get_book_list()
+        self._merge(source, books[running['merged']:])
+        running['merged'] = len(books)
+        # the pages after the first one all come as midway updates
+        if midway and not (running['paging'] and result.is_ready()):
+            self.emit('updated', True)
+            return
+
+        if result.is_failed():
+            self._finish(source, 'error')
+        else:
+            self._finish(source, 'ok' if books else 'empty')
+        self._advance()
+
+    def __timeout_cb(self, source):
+        logging.debug('Search in %s timed out', source)
+        running = self._running.get(source)
+        if running is not None:
+            running['timeout'] = None
+            self._finish(source, 'timeout')
+            self._advance()
+        return False
+
+    def _merge(self, source, books):
+        status = self._get_status(source)
+        for book in books:
+            key = (book.get_title().strip().lower(),
+                   book.get_author().strip().lower())
+            if key in self._seen:
+                continue
+            self._seen.add(key)
+            if book.get_source() is None:
+                book.set_source(source)
+            self._booklist.append(book)
+            status['books'] += 1
+        if books and status['latency'] is None:
+            # time to the first useful answer of this backend
+            status['latency'] = time.time() - status['start']
+
+    def _finish(self, source, state):
+        status = self._get_status(source)
+        status['status'] = state
+        if status['latency'] is None:
+            status['latency'] = time.time() - status['start']
+
+        running = self._running.pop(source, None)
+        if running is not None:
+            running['result'].disconnect(running['handler'])
+            if running['timeout'] is not None:
+                GLib.source_remove(running['timeout'])
+            if state == 'timeout':
+                running['result'].cancel()
+            elif state in ('ok', 'empty'):
+                self._paged[source] = running['result']
+                status['more'] = running['result'].has_next()
+
+    def get_source_status(self):
+        '''
+        Returns, for every backend, a dict with its 'name', 'status'
+        (queued, running, ok, empty, error or timeout), the number of
+        new 'books' it brought, whether it has 'more' pages and its
+        'latency' in seconds
+        '''
+        return self._status
+
+    def is_failed(self):
+        if self._booklist or self._waiting or self._running:
+            return False
+        for status in self._status:
+            if status['status'] not in ('error', 'timeout'):
+                return False
+        return True
+
+    def has_next(self):
+        for result in self._paged.values():
+            if result.has_next():
+                return True
+        return False
+
+    def update_with_next(self):
+        '''
+        Asks the next page of every backend that has more, their books
+        are merged as they come
+        '''
+        for source, result in list(self._paged.items()):
+            if not result.has_next():
+                continue
+            del self._paged[source]
+            status = self._get_status(source)
+            status['status'] = 'running'
+            status['more'] = False
+            self._ready = False
+            self._watch(source, result, paging=True)
+            result.update_with_next()
+
+    def cancel(self):
+        self._cancelled = True
+        self._waiting = []
+        for result in self._paged.values():
+            result.cancel()
+        self._paged = {}
+        for source in list(self._running.keys()):
+            running = self._running.pop(source)
+            running['result'].disconnect(running['handler'])
+            if running['timeout'] is not None:
+                GLib.source_remove(running['timeout'])
+            running['result'].cancel()
+
 
 class FileDownloaderThread(threading.Thread):
 
-    def __init__(self, url, path, updated_cb, progress_cb):
+    def __init__(self, url, path, updated_cb, progress_cb, partial_dir=None,
+                 segments=1, segment_min_size=_SEGMENT_MIN_SIZE,
+                 priority=httppool.PRIORITY_NORMAL, throttled=False,
+                 background=False):
         threading.Thread.__init__(self)
+        self._url = url
         self._path = path
+        self._partial_dir = partial_dir
+        self._segments = segments
+        self._segment_min_size = segment_min_size
         self._updated_cb = updated_cb
         self._progress_cb = progress_cb
-        self._getter = ReadURLDownloader(url)
         self._download_content_length = 0
         self._download_content_type = None
-        self.stopthread = threading.Event()
+        # resumable downloads are the long ones, of books
+        self.stopthread = httppool.CancelToken(
+            priority, bulk=partial_dir is not None)
+        # only books share the download bandwidth, covers and file
+        # lists are too small to hold back
+        self.transfer = None
+        if throttled:
+            self.transfer = bandwidth.get_manager().add(background)
 
     def run(self):
-        self._getter.connect("finished", self.__result_cb)
-        self._getter.connect("progress", self.__progress_cb)
-        self._getter.connect("error", self.__error_cb)
         try:
-            self._getter.start(self._path)
-        except:
-            self._updated_cb(None, None)
-
-        self._download_content_length = \
-                self._getter.get_content_length()
-        self._download_content_type = self._getter.get_content_type()
+            if self._partial_dir is not None and self._segments > 1:
+                self._download_content_type = _download_segmented(
+                    self._url, self._path, self._partial_dir,
+                    self._segments, self._segment_min_size,
+                    self.__progress_cb, self.stopthread,
+                    throttle=self.transfer)
+            elif self._partial_dir is not None:
+                self._download_content_type = _download_resumable(
+                    self._url, self._path, self._partial_dir,
+                    self.__progress_cb, self.stopthread,
+                    throttle=self.transfer)
+            else:
+                self._download_content_type = _download_to_file(
+                    self._url, self._path, self.__progress_cb,
+                    stopthread=self.stopthread, throttle=self.transfer)
+        except (urllib.error.URLError, IOError,
+                http.client.HTTPException) as e:
+            if self.stopthread.is_set():
+                return
+            logging.error('Download of %s failed: %s', self._url, e)
+            self.__error_cb()
+        else:
+            self.__result_cb()
+        finally:
+            if self.transfer is not None:
+                self.transfer.close()
 
-    def __result_cb(self, getter, path, suggested_name):
-        self._getter = None
+    def __result_cb(self):
         if not self.stopthread.is_set():
-            self._updated_cb(path, self._download_content_type)
+            GLib.idle_add(self._updated_cb, self._path,
+                          self._download_content_type)
 
-    def __progress_cb(self, getter, bytes_downloaded):
-        if self.stopthread.is_set():
-            try:
-                getter.cancel()
-            except:
-                pass
-        self._progress_cb(float(bytes_downloaded) / \
-                          float(self._download_content_length + 1))
+    def __progress_cb(self, bytes_downloaded, content_length):
+        self._download_content_length = content_length
+        GLib.idle_add(self._progress_cb, float(bytes_downloaded) / \
+                      float(self._download_content_length + 1))
 
-    def __error_cb(self, getter, err):
+    def __error_cb(self):
         self._download_content_length = 0
         self._download_content_type = None
-        self._getter = None
-        self._updated_cb(None, None)
+        GLib.idle_add(self._updated_cb, None, None)
 
     def stop(self):
         self.stopthread.set()
@@ -600,12 +1752,32 @@ class FileDownloader(GObject.GObject):
                           ([GObject.TYPE_FLOAT])),
     }
 
-    def __init__(self, url, path):
+    def __init__(self, url, path, resumable=False, segments=1,
+                 segment_min_size=_SEGMENT_MIN_SIZE,
+                 priority=httppool.PRIORITY_NORMAL, throttled=False,
+                 background=False):
+        '''
+        Downloads url into path.  A resumable download keeps what it
+        received in a 'partial' directory next to path, so that failed
+        transfers, retried automatically or by downloading url again,
+        continue where they stopped.  With more than one segment, a
+        resumable download of at least segment_min_size bytes is fetched
+        as that many byte ranges at once, and leaves a connection to
+        the host free for other requests.  priority orders the requests
+        against others waiting for the same host.  A throttled download
+        takes its share of the download bandwidth, the background share
+        if background is set.
+        '''
         GObject.GObject.__init__(self)
         self.threads = []
 
+        partial_dir = None
+        if resumable:
+            partial_dir = os.path.join(os.path.dirname(path), 'partial')
         d_thread = FileDownloaderThread(url, path, self.__updated_cb,
-                                        self.__progress_cb)
+                                        self.__progress_cb, partial_dir,
+                                        segments, segment_min_size,
+                                        priority, throttled, background)
         d_thread.daemon = True
         self.threads.append(d_thread)
         d_thread.start()
@@ -616,6 +1788,11 @@ class FileDownloader(GObject.GObject):
     def __progress_cb(self, progress):
         self.emit('progress', progress)
 
+    def set_background(self, background):
+        for thread in self.threads:
+            if thread.transfer is not None:
+                thread.transfer.set_background(background)
+
     def stop(self):
         for thread in self.threads:
             thread.stop()
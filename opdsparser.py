@@ -0,0 +1,360 @@
+#! /usr/bin/env python3
+
+# Copyright (C) 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import re
+import urllib.parse
+import zlib
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+import sys
+sys.path.insert(0, './')
+import feedparser
+from feedparser import FeedParserDict, _urljoin
+
+_ATOM = '{http://www.w3.org/2005/Atom}'
+_DC = '{http://purl.org/dc/elements/1.1/}'
+_DCTERMS = '{http://purl.org/dc/terms/}'
+_XML = '{http://www.w3.org/XML/1998/namespace}'
+_XML_BASE = _XML + 'base'
+
+# elements stored under another key, as feedparser does
+_ALIASES = {
+    _ATOM + 'title': 'title',
+    _ATOM + 'id': 'id',
+    _ATOM + 'updated': 'updated',
+    _ATOM + 'published': 'published',
+    _ATOM + 'rights': 'rights',
+    _DC + 'title': 'title',
+    _DC + 'language': 'language',
+    _DC + 'publisher': 'publisher',
+    _DC + 'date': 'updated',
+    _DCTERMS + 'issued': 'published',
+    _DCTERMS + 'modified': 'updated',
+}
+
+
+# children of an Atom author and the author_detail keys they go to
+_AUTHOR_KEYS = {
+    _ATOM + 'name': 'name',
+    _ATOM + 'email': 'email',
+    _ATOM + 'uri': 'href',
+}
+
+# as feedparser finds the email in an author given as text
+_EMAIL_RE = re.compile(r'''(([a-zA-Z0-9\_\-\.\+]+)@((\[[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}\.)|(([a-zA-Z0-9\-]+\.)+))([a-zA-Z]{2,4}|[0-9]{1,3})(\]?))(\?subject=\S+)?''')
+
+
+def _text(element):
+    """
+    Returns the text of element, or the markup inside it for type
+    xhtml, written as feedparser writes it
+    """
+    if element.get('type', '').lower() in ('xhtml', 'application/xhtml+xml'):
+        return _xhtml(element)
+    return ''.join(element.itertext()).strip()
+
+
+def _local_name(name):
+    if name.startswith(_XML):
+        return 'xml:' + name[len(_XML):]
+    return name.rpartition('}')[2].lower()
+
+
+def _xhtml(element):
+    pieces = []
+
+    def add(parent):
+        for child in parent:
+            if not isinstance(child.tag, str):
+                # a comment or processing instruction
+                pieces.append(escape(child.tail or ''))
+                continue
+            tag = _local_name(child.tag)
+            attrs = ''
+            for name, value in child.attrib.items():
+                name = _local_name(name)
+                if name in ('rel', 'type'):
+                    value = value.lower()
+                attrs += ' %s="%s"' % (name, escape(value, {'"': '&quot;'}))
+            pieces.append('<%s%s>' % (tag, attrs))
+            pieces.append(escape(child.text or ''))
+            add(child)
+            pieces.append('</%s>' % tag)
+            pieces.append(escape(child.tail or ''))
+
+    pieces.append(escape(element.text or ''))
+    add(element)
+    pieces = [piece for piece in pieces if piece]
+
+    # feedparser drops the <div> around all the rest
+    while len(pieces) > 1 and not pieces[-1].strip():
+        del pieces[-1]
+    while len(pieces) > 1 and not pieces[0].strip():
+        del pieces[0]
+    if pieces and (pieces[0] == '<div>' or pieces[0].startswith('<div ')) \
+            and pieces[-1] == '</div>':
+        depth = 0
+        for piece in pieces[:-1]:
+            if piece.startswith('</'):
+                depth -= 1
+                if depth == 0:
+                    break
+            elif piece.startswith('<'):
+                depth += 1
+        else:
+            pieces = pieces[1:-1]
+    return ''.join(pieces).strip()
+
+
+def _sync_author(entry):
+    # what feedparser makes of the author being read
+    detail = entry['authors'][-1]
+    if detail:
+        name, email = detail.get('name'), detail.get('email')
+        if name and email:
+            entry['author'] = '%s (%s)' % (name, email)
+        elif name or email:
+            entry['author'] = name or email
+        return
+
+    author, email = entry.get('author'), None
+    if not author:
+        return
+    match = _EMAIL_RE.search(author)
+    if match:
+        email = match.group(0)
+        author = author.replace(email, '').replace('()', '')
+        author = author.replace('<>', '').replace('&lt;&gt;', '').strip()
+        if author and author[0] == '(':
+            author = author[1:]
+        if author and author[-1] == ')':
+            author = author[:-1]
+        author = author.strip()
+    if author or email:
+        entry.setdefault('author_detail', detail)
+    if author:
+        detail['name'] = author
+    if email:
+        detail['email'] = email
+
+
+class OPDSStreamParser(object):
+    """
+    Incremental parser for Atom/OPDS catalogs.
+
+    Bytes are pushed with feed_data() as they come off the network, and
+    every <entry> is turned into a FeedParserDict with the same keys
+    that feedparser would give it as soon as its closing tag has been
+    read.  Malformed XML, or a document that is not an Atom feed,
+    raises ElementTree.ParseError, callers are expected to fall back to
+    feedparser.parse then.
+    """
+
+    def __init__(self, base_uri=''):
+        self._parser = ElementTree.XMLPullParser(events=('start', 'end'))
+        self._stack = []
+        self._bases = [base_uri]
+        self._new_entries = []
+        self.feed = FeedParserDict()
+        self.feed['links'] = []
+        self.entries = []
+
+    def feed_data(self, data):
+        self._parser.feed(data)
+        self._read_events()
+
+    def close(self):
+        self._parser.close()
+        self._read_events()
+
+    def take_entries(self):
+        """Returns the entries parsed since the last call"""
+        entries, self._new_entries = self._new_entries, []
+        return entries
+
+    def get_feedobj(self, headers=None):
+        """Returns what feedparser.parse would for the document read"""
+        feedobj = FeedParserDict()
+        feedobj['feed'] = self.feed
+        feedobj['entries'] = self.entries
+        feedobj['bozo'] = 0
+        feedobj['headers'] = headers or {}
+        feedobj['href'] = self._bases[0]
+        return feedobj
+
+    def _read_events(self):
+        for event, element in self._parser.read_events():
+            if event == 'start':
+                if not self._stack and element.tag != _ATOM + 'feed':
+                    raise ElementTree.ParseError('%s is not an Atom feed' %
+                                                 element.tag)
+                base = element.get(_XML_BASE)
+                if base is not None:
+                    base = urllib.parse.urljoin(self._bases[-1], base)
+                else:
+                    base = self._bases[-1]
+                self._stack.append(element)
+                self._bases.append(base)
+                continue
+
+            base = self._bases.pop()
+            self._stack.pop()
+            parent = self._stack[-1] if self._stack else None
+
+            if element.tag == _ATOM + 'entry':
+                entry = self._build_entry(element, base)
+                self.entries.append(entry)
+                self._new_entries.append(entry)
+                # entries are done with, keep memory flat on long feeds
+                if parent is not None:
+                    parent.remove(element)
+            elif parent is not None and parent.tag == _ATOM + 'feed' and \
+                    len(self._stack) == 1:
+                self._add_feed_element(element, base)
+                parent.remove(element)
+
+    def _add_feed_element(self, element, base):
+        if element.tag == _ATOM + 'link':
+            self.feed['links'].append(self._build_link(element, base))
+        elif element.tag in _ALIASES:
+            self.feed[_ALIASES[element.tag]] = _text(element)
+
+    def _build_link(self, element, base):
+        link = FeedParserDict()
+        for key, value in element.attrib.items():
+            if key.startswith('{'):
+                continue
+            if key in ('rel', 'type'):
+                value = value.lower()
+            link[key] = value
+        link.setdefault('rel', 'alternate')
+        if link['rel'] == 'self':
+            link.setdefault('type', 'application/atom+xml')
+        else:
+            link.setdefault('type', 'text/html')
+        if 'href' in link:
+            link['href'] = _urljoin(base, link['href'])
+        return link
+
+    def _build_entry(self, element, base):
+        entry = FeedParserDict()
+        entry['links'] = []
+        for child in element:
+            tag = child.tag
+            if tag == _ATOM + 'link':
+                link_base = child.get(_XML_BASE)
+                if link_base is not None:
+                    link_base = urllib.parse.urljoin(base, link_base)
+                entry['links'].append(self._build_link(child,
+                                                       link_base or base))
+            elif tag == _ATOM + 'author' or tag == _DC + 'creator':
+                self._add_author(entry, child, base)
+            elif tag == _ATOM + 'summary':
+                entry['summary'] = _text(child)
+                entry['summary_detail'] = self._detail(child, base)
+            elif tag == _ATOM + 'content':
+                content = self._detail(child, base)
+                entry.setdefault('content', []).append(content)
+                if content['type'] in ('text/plain', 'text/html',
+                                       'application/xhtml+xml'):
+                    entry.setdefault('summary', content['value'])
+            elif tag in _ALIASES:
+                entry[_ALIASES[tag]] = _text(child)
+            elif tag.startswith(_DCTERMS):
+                entry['dcterms_' + tag[len(_DCTERMS):].lower()] = \
+                    _text(child)
+        return entry
+
+    def _add_author(self, entry, element, base):
+        # as feedparser does it: all the authors share one author_detail,
+        # and one without a name or email of its own starts with those
+        # of the author before it
+        entry.setdefault('authors', []).append(FeedParserDict())
+        for child in element:
+            key = _AUTHOR_KEYS.get(child.tag)
+            if key is None:
+                continue
+            value = _text(child)
+            if key == 'href' and value:
+                value = _urljoin(base, value)
+            entry.setdefault('author_detail', FeedParserDict())[key] = value
+            _sync_author(entry)
+            entry['authors'][-1][key] = value
+        entry['author'] = ((element.text or '') +
+                           ''.join(child.tail or ''
+                                   for child in element)).strip()
+        _sync_author(entry)
+
+    def _detail(self, element, base):
+        content_type = element.get('type', 'text')
+        content_type = {'text': 'text/plain', 'html': 'text/html',
+                        'xhtml': 'application/xhtml+xml'}.get(content_type,
+                                                              content_type)
+        detail = FeedParserDict()
+        detail['type'] = content_type
+        detail['language'] = element.get(
+            '{http://www.w3.org/XML/1998/namespace}lang')
+        detail['base'] = base
+        detail['value'] = _text(element)
+        return detail
+
+
+def parse(data, base_uri='', headers=None):
+    """
+    Parses a whole Atom/OPDS document, as bytes compressed as told by
+    the content-encoding of headers, into the feedobj feedparser.parse
+    would give for it.  Raises ElementTree.ParseError or zlib.error
+    when it is not a well-formed Atom feed.
+    """
+    headers = headers or {}
+    if headers.get('content-encoding', '') in ('gzip', 'deflate'):
+        data = zlib.decompressobj(zlib.MAX_WBITS | 32).decompress(data)
+    parser = OPDSStreamParser(base_uri)
+    parser.feed_data(data)
+    parser.close()
+    return parser.get_feedobj(headers)
+
+
+# feedparser.parse options that skip, as this parser does, resolving
+# the links in and sanitizing the markup of every summary and content;
+# sanitize() does both for the summary opds.Book shows
+LEAN_PROFILE = {'resolve_relative_uris': False, 'sanitize_html': False}
+
+
+def sanitize(entry, field):
+    """
+    Returns the field of an entry parsed by this parser or with
+    LEAN_PROFILE as feedparser.parse would give it, with the links in
+    its markup resolved and the markup sanitized.  Raises KeyError
+    when the entry has no such field.
+    """
+    value = entry[field]
+    detail = entry.get(field + '_detail')
+    if detail is None:
+        for content in entry.get('content', []):
+            if content.get('value') == value:
+                detail = content
+                break
+    if detail is None or detail.get('type') not in \
+            ('text/html', 'application/xhtml+xml'):
+        return value
+    if detail.get('base'):
+        value = feedparser._resolveRelativeURIs(value, detail['base'],
+                                                'utf-8', detail['type'])
+    return feedparser._sanitizeHTML(value, 'utf-8', detail['type'])
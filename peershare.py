@@ -0,0 +1,338 @@
+#! /usr/bin/env python3
+
+# Copyright (C) 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import hashlib
+import http.client
+import http.server
+import json
+import logging
+import os
+import random
+import re
+import socket
+import threading
+import urllib.error
+
+from gi.repository import GLib
+from gi.repository import GObject
+
+import httppool
+
+# laptops ask the multicast group who has a file, by the SHA-1 the
+# origin gives for it, and those that have it answer with the port of
+# the HTTP server they share their books from
+GROUP = '239.255.71.66'
+PORT = 24801
+
+_QUERY_TIMEOUT = 0.5
+_GET_FILE_TIMEOUT = 30
+_MAX_MESSAGE = 1024
+_CHUNK_SIZE = 64 * 1024
+
+_SHA1_RE = re.compile(r'^/([0-9a-f]{40})$')
+
+
+class _ShareHandler(http.server.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        logging.debug('Peer %s %s', self.address_string(), format % args)
+
+    def do_GET(self):
+        match = _SHA1_RE.match(self.path)
+        path = None
+        if match is not None:
+            content_type, path = self.server.share.get_file(match.group(1))
+        if path is None:
+            self.send_error(404)
+            return
+        try:
+            with open(path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(size))
+                self.end_headers()
+                self.connection.sendfile(f)
+        finally:
+            os.remove(path)
+
+
+class PeerShare(object):
+    """
+    Shares the books of the Journal with the laptops nearby.
+
+    Books are added with the SHA-1 the origin gives for their file,
+    and answered for when a peer asks the multicast group for that
+    checksum.  get_file_cb(key) is called in the main loop with the key
+    a book was added with, and returns a copy of its file that is
+    removed once sent.  address picks the network interface, several
+    instances on '127.0.0.1' share books with each other.
+    """
+
+    def __init__(self, get_file_cb, group=GROUP, port=PORT, address=''):
+        self._get_file_cb = get_file_cb
+        self._group = group
+        self._port = port
+        self._address = address
+        self._lock = threading.Lock()
+        self._books = {}
+        self._nonces = set()
+
+        self._server = http.server.ThreadingHTTPServer((address, 0),
+                                                       _ShareHandler)
+        self._server.daemon_threads = True
+        self._server.share = self
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if hasattr(socket, 'SO_REUSEPORT'):
+            self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT,
+                                    1)
+        self._socket.bind(('', port))
+        self._socket.setsockopt(
+            socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP,
+            socket.inet_aton(group) + socket.inet_aton(address or
+                                                       '0.0.0.0'))
+        thread = threading.Thread(target=self._listen)
+        thread.daemon = True
+        thread.start()
+        logging.debug('Sharing books on port %d',
+                      self._server.server_port)
+
+    def add(self, sha1, key, content_type):
+        with self._lock:
+            self._books[sha1.lower()] = (key, content_type)
+
+    def remove(self, sha1):
+        with self._lock:
+            self._books.pop(sha1.lower(), None)
+
+    def has(self, sha1):
+        with self._lock:
+            return sha1.lower() in self._books
+
+    def get_file(self, sha1):
+        """
+        Returns the content type and a copy of the file of the book
+        with checksum sha1, or (None, None)
+        """
+        with self._lock:
+            book = self._books.get(sha1)
+        if book is None:
+            return None, None
+        result = []
+        done = threading.Event()
+
+        def get_file():
+            try:
+                result.append(self._get_file_cb(book[0]))
+            except Exception as e:
+                logging.error('Could not share %s: %s', sha1, e)
+            done.set()
+            return False
+
+        GLib.idle_add(get_file)
+        if not done.wait(_GET_FILE_TIMEOUT) or not result or \
+                result[0] is None:
+            return None, None
+        return book[1], result[0]
+
+    def _listen(self):
+        while True:
+            try:
+                data, address = self._socket.recvfrom(_MAX_MESSAGE)
+                query = json.loads(data.decode('utf-8'))
+                sha1 = str(query['query']).lower()
+                nonce = query['nonce']
+            except OSError:
+                # closed
+                return
+            except (ValueError, KeyError, TypeError, UnicodeError):
+                continue
+            with self._lock:
+                if nonce in self._nonces or sha1 not in self._books:
+                    continue
+            answer = {'have': sha1, 'nonce': nonce,
+                      'port': self._server.server_port}
+            try:
+                self._socket.sendto(json.dumps(answer).encode('utf-8'),
+                                    address)
+            except OSError as e:
+                logging.debug('Could not answer %s: %s', address, e)
+
+    def find_peers(self, sha1, timeout=_QUERY_TIMEOUT):
+        """
+        Asks the group for sha1 and returns the URLs of the peers that
+        answered within timeout seconds
+        """
+        sha1 = sha1.lower()
+        nonce = random.getrandbits(63)
+        with self._lock:
+            self._nonces.add(nonce)
+        query = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        urls = []
+        try:
+            if self._address:
+                query.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF,
+                                 socket.inet_aton(self._address))
+            query.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+            query.sendto(json.dumps({'query': sha1, 'nonce': nonce}).encode(
+                'utf-8'), (self._group, self._port))
+            query.settimeout(timeout)
+            while True:
+                try:
+                    data, address = query.recvfrom(_MAX_MESSAGE)
+                    answer = json.loads(data.decode('utf-8'))
+                    if answer['have'] != sha1 or answer['nonce'] != nonce:
+                        continue
+                    url = 'http://%s:%d/%s' % (address[0],
+                                               int(answer['port']), sha1)
+                except socket.timeout:
+                    break
+                except (ValueError, KeyError, TypeError, UnicodeError):
+                    continue
+                if url not in urls:
+                    urls.append(url)
+        except OSError as e:
+            logging.debug('Could not ask peers for %s: %s', sha1, e)
+        finally:
+            query.close()
+            with self._lock:
+                self._nonces.discard(nonce)
+        return urls
+
+    def close(self):
+        self._socket.close()
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _fetch(url, path, sha1, progress_cb, stopthread):
+    """
+    Downloads url into path, returns its content type if what arrived
+    has checksum sha1 and None otherwise
+    """
+    response = httppool.urlopen(url, token=stopthread)
+    digest = hashlib.sha1()
+    try:
+        if response.status != 200:
+            return None
+        content_type = response.headers.get('Content-Type')
+        content_length = int(response.headers.get('Content-Length') or 0)
+        bytes_downloaded = 0
+        with open(path, 'wb') as f:
+            while not stopthread.is_set():
+                data = response.read(_CHUNK_SIZE)
+                if not data:
+                    break
+                f.write(data)
+                digest.update(data)
+                bytes_downloaded += len(data)
+                progress_cb(bytes_downloaded, content_length)
+    finally:
+        response.close()
+    if stopthread.is_set():
+        return None
+    if digest.hexdigest() != sha1.lower():
+        logging.error('%s sent a file that does not match %s', url, sha1)
+        return None
+    return content_type
+
+
+class PeerDownloaderThread(threading.Thread):
+
+    def __init__(self, share, sha1, path, updated_cb, progress_cb):
+        threading.Thread.__init__(self)
+        self._share = share
+        self._sha1 = sha1
+        self._path = path
+        self._updated_cb = updated_cb
+        self._progress_cb = progress_cb
+        self.stopthread = httppool.CancelToken(
+            httppool.PRIORITY_INTERACTIVE)
+
+    def run(self):
+        content_type = None
+        for url in self._share.find_peers(self._sha1):
+            if self.stopthread.is_set():
+                return
+            logging.debug('Fetching %s from %s', self._sha1, url)
+            try:
+                content_type = _fetch(url, self._path, self._sha1,
+                                      self.__progress_cb, self.stopthread)
+            except (urllib.error.URLError, http.client.HTTPException,
+                    OSError) as e:
+                logging.debug('Peer %s failed: %s', url, e)
+            if content_type is not None:
+                break
+        if self.stopthread.is_set():
+            return
+        if content_type is None:
+            if os.path.exists(self._path):
+                os.remove(self._path)
+            GLib.idle_add(self._updated_cb, None, None)
+        else:
+            GLib.idle_add(self._updated_cb, self._path, content_type)
+
+    def __progress_cb(self, bytes_downloaded, content_length):
+        GLib.idle_add(self._progress_cb, float(bytes_downloaded) /
+                      float(content_length + 1))
+
+    def stop(self):
+        self.stopthread.set()
+
+
+class PeerDownloader(GObject.GObject):
+
+    # Like opds.FileDownloader, for the file with checksum sha1 from
+    # the first peer that has it, 'updated' comes with None as path
+    # when no peer did
+
+    __gsignals__ = {
+        'updated': (GObject.SignalFlags.RUN_FIRST,
+                    None,
+                    ([GObject.TYPE_STRING, GObject.TYPE_STRING])),
+        'progress': (GObject.SignalFlags.RUN_FIRST,
+                     None,
+                     ([GObject.TYPE_FLOAT])),
+    }
+
+    def __init__(self, share, sha1, path):
+        GObject.GObject.__init__(self)
+        self._thread = PeerDownloaderThread(share, sha1, path,
+                                            self.__updated_cb,
+                                            self.__progress_cb)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __updated_cb(self, path, content_type):
+        self.emit('updated', path, content_type)
+
+    def __progress_cb(self, progress):
+        self.emit('progress', progress)
+
+    def set_background(self, background):
+        pass
+
+    def stop(self):
+        self._thread.stop()
@@ -0,0 +1,170 @@
+#! /usr/bin/env python3
+
+# Copyright (C) 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+from gi.repository import GObject
+from gi.repository import Gtk
+from gi.repository import Pango
+
+from gettext import gettext as _
+
+from sugar3.graphics.icon import Icon
+
+import downloadqueue
+
+
+class QueueView(Gtk.Box):
+
+    # Panel listing the books in the download queue, with their
+    # progress, and buttons to reorder, cancel and retry them
+
+    (ROW_TITLE, ROW_STATUS, ROW_PROGRESS, ROW_ITEM) = range(4)
+
+    def __init__(self, queue):
+        Gtk.Box.__init__(self, orientation=Gtk.Orientation.HORIZONTAL)
+        self._queue = queue
+
+        self._model = Gtk.ListStore(str, str, int, GObject.TYPE_PYOBJECT)
+        self._treeview = Gtk.TreeView(model=self._model)
+        self._treeview.set_enable_search(False)
+
+        renderer = Gtk.CellRendererText()
+        renderer.props.ellipsize = Pango.EllipsizeMode.END
+        column = Gtk.TreeViewColumn(_('Downloads'), renderer,
+                                    text=self.ROW_TITLE)
+        column.set_expand(True)
+        self._treeview.append_column(column)
+
+        renderer = Gtk.CellRendererProgress()
+        column = Gtk.TreeViewColumn(_('Progress'), renderer,
+                                    value=self.ROW_PROGRESS,
+                                    text=self.ROW_STATUS)
+        column.set_min_width(200)
+        self._treeview.append_column(column)
+
+        selection = self._treeview.get_selection()
+        selection.set_mode(Gtk.SelectionMode.SINGLE)
+        selection.connect('changed', self.__selection_changed_cb)
+
+        scroller = Gtk.ScrolledWindow()
+        scroller.set_policy(Gtk.PolicyType.NEVER, Gtk.PolicyType.AUTOMATIC)
+        scroller.set_size_request(-1, 120)
+        scroller.add(self._treeview)
+        self.pack_start(scroller, True, True, 10)
+
+        buttons = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+        self._first_btn = self._add_button(buttons, _('Download first'),
+                                           'go-up', self.__first_clicked_cb)
+        self._cancel_btn = self._add_button(buttons, _('Cancel'),
+                                            'dialog-cancel',
+                                            self.__cancel_clicked_cb)
+        self._retry_btn = self._add_button(buttons, _('Retry'),
+                                           'view-refresh',
+                                           self.__retry_clicked_cb)
+        self._clear_btn = self._add_button(buttons, _('Clear finished'),
+                                           'edit-clear',
+                                           self.__clear_clicked_cb)
+        self.pack_start(buttons, False, False, 10)
+
+        queue.connect('item-added', self.__item_added_cb)
+        queue.connect('item-changed', self.__item_changed_cb)
+        self._update_buttons()
+
+    def _add_button(self, box, label, icon_name, callback):
+        button = Gtk.Button(label)
+        button.set_image(Icon(icon_name=icon_name))
+        button.connect('clicked', callback)
+        box.pack_start(button, False, False, 2)
+        return button
+
+    def _get_status(self, item):
+        if item.state == downloadqueue.STATE_QUEUED:
+            if item.priority == downloadqueue.PRIORITY_HIGH:
+                return _('Next')
+            return _('Waiting')
+        if item.state == downloadqueue.STATE_RESOLVING:
+            return _('Looking for the file')
+        if item.state == downloadqueue.STATE_DOWNLOADING:
+            return '%d%%' % (item.progress * 100)
+        if item.state == downloadqueue.STATE_DONE:
+            return _('Done')
+        if item.state == downloadqueue.STATE_FAILED:
+            return _('Failed')
+        return _('Cancelled')
+
+    def _find_row(self, item):
+        for row in self._model:
+            if row[self.ROW_ITEM] is item:
+                return row
+        return None
+
+    def __item_added_cb(self, queue, item):
+        self._model.append([item.get_title(), self._get_status(item),
+                            int(item.progress * 100), item])
+        self._update_buttons()
+
+    def __item_changed_cb(self, queue, item):
+        row = self._find_row(item)
+        if row is None:
+            return
+        row[self.ROW_STATUS] = self._get_status(item)
+        row[self.ROW_PROGRESS] = int(item.progress * 100)
+        self._update_buttons()
+
+    def get_selected_item(self):
+        model, tree_iter = self._treeview.get_selection().get_selected()
+        if tree_iter is None:
+            return None
+        return model.get_value(tree_iter, self.ROW_ITEM)
+
+    def __selection_changed_cb(self, selection):
+        self._update_buttons()
+
+    def _update_buttons(self):
+        item = self.get_selected_item()
+        self._first_btn.set_sensitive(
+            item is not None and item.state == downloadqueue.STATE_QUEUED)
+        self._cancel_btn.set_sensitive(
+            item is not None and not item.is_finished())
+        self._retry_btn.set_sensitive(
+            item is not None and item.state in (
+                downloadqueue.STATE_FAILED, downloadqueue.STATE_CANCELLED))
+        self._clear_btn.set_sensitive(
+            any(row[self.ROW_ITEM].is_finished() for row in self._model))
+
+    def __first_clicked_cb(self, button):
+        item = self.get_selected_item()
+        if item is not None:
+            self._queue.set_priority(item, downloadqueue.PRIORITY_HIGH)
+
+    def __cancel_clicked_cb(self, button):
+        item = self.get_selected_item()
+        if item is not None:
+            self._queue.cancel(item)
+
+    def __retry_clicked_cb(self, button):
+        item = self.get_selected_item()
+        if item is not None:
+            self._queue.retry(item)
+
+    def __clear_clicked_cb(self, button):
+        for row in list(self._model):
+            item = row[self.ROW_ITEM]
+            if item.is_finished():
+                self._queue.remove(item)
+                self._model.remove(row.iter)
+        self._update_buttons()
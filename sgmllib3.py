@@ -16,6 +16,10 @@ __all__ = ["SGMLParser", "SGMLParseError"]
 # Regular expressions used for parsing
 
 interesting = re.compile('[&<]')
+# The same, telling with the group it matches what the markup found is:
+# 1 a start tag, 2 an end tag, 3 a comment, 4 a processing instruction,
+# 5 a declaration, 6 a reference, none a '<' of something else.
+interesting_markup = re.compile('<(?:([>a-zA-Z])|(/)|(!--)|(\\?)|(!))?|(&)')
 incomplete = re.compile('&([a-zA-Z][a-zA-Z0-9]*|#[0-9]*)?|'
                            '<([a-zA-Z][^<>]*|'
                               '/([a-zA-Z][^<>]*)?|'
@@ -108,70 +112,46 @@ class SGMLParser(_markupbase.ParserBase):
     # and data to be processed by a subsequent call.  If 'end' is
     # true, force handling all data as if followed by EOF marker.
     def goahead(self, end):
+        # One search finds and tells apart the next markup, and text is
+        # only sliced out in runs, as long as they are, between markup.
         rawdata = self.rawdata
         i = 0
         n = len(rawdata)
+        search = interesting_markup.search
+        handle_data = self.handle_data
         while i < n:
             if self.nomoretags:
-                self.handle_data(rawdata[i:n])
+                handle_data(rawdata[i:n])
                 i = n
                 break
-            match = interesting.search(rawdata, i)
-            if match: j = match.start()
-            else: j = n
+            match = search(rawdata, i)
+            if not match:
+                handle_data(rawdata[i:n])
+                i = n
+                break
+            j = match.start()
             if i < j:
-                self.handle_data(rawdata[i:j])
+                handle_data(rawdata[i:j])
             i = j
-            if i == n: break
-            if rawdata[i] == '<':
-                if starttagopen.match(rawdata, i):
-                    if self.literal:
-                        self.handle_data(rawdata[i])
-                        i = i+1
-                        continue
-                    k = self.parse_starttag(i)
-                    if k < 0: break
-                    i = k
-                    continue
-                if rawdata.startswith("</", i):
-                    k = self.parse_endtag(i)
-                    if k < 0: break
-                    i = k
-                    self.literal = 0
-                    continue
+            kind = match.lastindex
+            if kind == 1:
                 if self.literal:
-                    if n > (i + 1):
-                        self.handle_data("<")
-                        i = i+1
-                    else:
-                        # incomplete
-                        break
-                    continue
-                if rawdata.startswith("<!--", i):
-                        # Strictly speaking, a comment is --.*--
-                        # within a declaration tag <!...>.
-                        # This should be removed,
-                        # and comments handled only in parse_declaration.
-                    k = self.parse_comment(i)
-                    if k < 0: break
-                    i = k
-                    continue
-                if rawdata.startswith("<?", i):
-                    k = self.parse_pi(i)
-                    if k < 0: break
-                    i = i+k
-                    continue
-                if rawdata.startswith("<!", i):
-                    # This is some sort of declaration; in "HTML as
-                    # deployed," this should only be the document type
-                    # declaration ("<!DOCTYPE html...>").
-                    k = self.parse_declaration(i)
-                    if k < 0: break
-                    i = k
+                    handle_data('<')
+                    i = i+1
                     continue
-            elif rawdata[i] == '&':
+                k = self.parse_starttag(i)
+                if k < 0: break
+                i = k
+                continue
+            if kind == 2:
+                k = self.parse_endtag(i)
+                if k < 0: break
+                i = k
+                self.literal = 0
+                continue
+            if kind == 6:
                 if self.literal:
-                    self.handle_data(rawdata[i])
+                    handle_data('&')
                     i = i+1
                     continue
                 match = charref.match(rawdata, i)
@@ -188,23 +168,51 @@ class SGMLParser(_markupbase.ParserBase):
                     i = match.end(0)
                     if rawdata[i-1] != ';': i = i-1
                     continue
-            else:
-                self.error('neither < nor & ??')
+            elif self.literal:
+                if n > (i + 1):
+                    handle_data("<")
+                    i = i+1
+                else:
+                    # incomplete
+                    break
+                continue
+            elif kind == 3:
+                # Strictly speaking, a comment is --.*--
+                # within a declaration tag <!...>.
+                # This should be removed,
+                # and comments handled only in parse_declaration.
+                k = self.parse_comment(i)
+                if k < 0: break
+                i = k
+                continue
+            elif kind == 4:
+                k = self.parse_pi(i)
+                if k < 0: break
+                i = i+k
+                continue
+            elif kind == 5:
+                # This is some sort of declaration; in "HTML as
+                # deployed," this should only be the document type
+                # declaration ("<!DOCTYPE html...>").
+                k = self.parse_declaration(i)
+                if k < 0: break
+                i = k
+                continue
             # We get here only if incomplete matches but
             # nothing else
             match = incomplete.match(rawdata, i)
             if not match:
-                self.handle_data(rawdata[i])
+                handle_data(rawdata[i])
                 i = i+1
                 continue
             j = match.end(0)
             if j == n:
                 break # Really incomplete
-            self.handle_data(rawdata[i:j])
+            handle_data(rawdata[i:j])
             i = j
         # end while
         if end and i < n:
-            self.handle_data(rawdata[i:n])
+            handle_data(rawdata[i:n])
             i = n
         self.rawdata = rawdata[i:]
         # XXX if end: check for empty stack
@@ -280,8 +288,9 @@ class SGMLParser(_markupbase.ParserBase):
                     attrvalue[:1] == '"' == attrvalue[-1:]):
                     # strip quotes
                     attrvalue = attrvalue[1:-1]
-                attrvalue = self.entity_or_charref.sub(
-                    self._convert_ref, attrvalue)
+                if '&' in attrvalue:
+                    attrvalue = self.entity_or_charref.sub(
+                        self._convert_ref, attrvalue)
             attrs.append((attrname.lower(), attrvalue))
             k = match.end(0)
         if rawdata[j] == '>':
@@ -323,21 +332,19 @@ class SGMLParser(_markupbase.ParserBase):
     # Internal -- finish processing of start tag
     # Return -1 for unknown tag, 0 for open-only tag, 1 for balanced tag
     def finish_starttag(self, tag, attrs):
-        try:
-            method = getattr(self, 'start_' + tag)
-        except AttributeError:
-            try:
-                method = getattr(self, 'do_' + tag)
-            except AttributeError:
+        # most tags have no handler, looking them up without raising
+        # AttributeError saves building an exception for each of them
+        method = getattr(self, 'start_' + tag, None)
+        if method is None:
+            method = getattr(self, 'do_' + tag, None)
+            if method is None:
                 self.unknown_starttag(tag, attrs)
                 return -1
-            else:
-                self.handle_starttag(tag, method, attrs)
-                return 0
-        else:
-            self.stack.append(tag)
             self.handle_starttag(tag, method, attrs)
-            return 1
+            return 0
+        self.stack.append(tag)
+        self.handle_starttag(tag, method, attrs)
+        return 1
 
     # Internal -- finish processing of end tag
     def finish_endtag(self, tag):
@@ -348,22 +355,16 @@ class SGMLParser(_markupbase.ParserBase):
                 return
         else:
             if tag not in self.stack:
-                try:
-                    method = getattr(self, 'end_' + tag)
-                except AttributeError:
+                if getattr(self, 'end_' + tag, None) is None:
                     self.unknown_endtag(tag)
                 else:
                     self.report_unbalanced(tag)
                 return
-            found = len(self.stack)
-            for i in range(found):
-                if self.stack[i] == tag: found = i
+            # the last open one
+            found = len(self.stack) - 1 - self.stack[::-1].index(tag)
         while len(self.stack) > found:
             tag = self.stack[-1]
-            try:
-                method = getattr(self, 'end_' + tag)
-            except AttributeError:
-                method = None
+            method = getattr(self, 'end_' + tag, None)
             if method:
                 self.handle_endtag(tag, method)
             else:
@@ -0,0 +1,136 @@
+#! /usr/bin/env python3
+
+# Copyright (C) 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+Checks that opdsparser gives the same Book fields as feedparser for
+the given catalogs, and compares how fast both parse them:
+
+    python3 tests/bench_opdsparser.py tests/feeds/*.xml
+
+For the catalogs that are not well-formed, times the feedparser
+fallback instead.  The dates of every catalog are timed too, through
+the feedparser date cache, which only the fallback uses.
+"""
+
+import argparse
+import os
+import sys
+import time
+import zlib
+from xml.etree import ElementTree
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import feedparser
+import opdsparser
+from test_opdsparser import compare
+
+_MAX_SHOWN = 10
+
+
+def _time_fallback(path, data, headers, rounds, error):
+    start = time.time()
+    for n in range(rounds):
+        slow = feedparser.parse(data, response_headers=headers,
+                                **opdsparser.LEAN_PROFILE)
+    slow_time = (time.time() - start) / rounds
+    print('%s: %s, feedparser %.1f ms for %d entries' %
+          (path, error, slow_time * 1000, len(slow['entries'])))
+
+
+def _time_dates(path, dates, rounds):
+    # the first pass parses the dates of a catalog never seen, every
+    # round after it those of the same catalog loaded again
+    feedparser._date_cache.clear()
+    start = time.time()
+    for date in dates:
+        feedparser._parse_date(date)
+    cold_time = time.time() - start
+    start = time.time()
+    for n in range(rounds):
+        for date in dates:
+            feedparser._parse_date(date)
+    fast_time = (time.time() - start) / rounds
+    start = time.time()
+    for n in range(rounds):
+        for date in dates:
+            feedparser._parse_date_with_handlers(date,
+                                                 feedparser._date_handlers)
+    slow_time = (time.time() - start) / rounds
+    print('%s: %d dates, %.2f ms, again %.2f ms, every handler in turn '
+          '%.2f ms (%.1fx)' %
+          (path, len(dates), cold_time * 1000, fast_time * 1000,
+           slow_time * 1000, slow_time / fast_time))
+
+
+def _bench(path, rounds):
+    with open(path, 'rb') as f:
+        data = f.read()
+    # as if served, relative links resolve the same way then
+    base_uri = 'http://localhost/' + path.lstrip('/')
+    headers = {'content-location': base_uri}
+
+    try:
+        differences = compare(data, base_uri)
+    except (ElementTree.ParseError, zlib.error) as e:
+        _time_fallback(path, data, headers, rounds, e)
+        return
+    for number, key, ours, theirs in differences[:_MAX_SHOWN]:
+        if number is None:
+            print('%s: %d entries, feedparser %d' % (path, ours, theirs))
+        else:
+            print('%s entry %d %s: %r, feedparser %r' %
+                  (path, number, key, ours, theirs))
+    fast = opdsparser.parse(data, base_uri)
+
+    start = time.time()
+    for n in range(rounds):
+        opdsparser.parse(data, base_uri)
+    fast_time = (time.time() - start) / rounds
+    start = time.time()
+    for n in range(rounds):
+        feedparser.parse(data, response_headers=headers,
+                         **opdsparser.LEAN_PROFILE)
+    slow_time = (time.time() - start) / rounds
+    print('%s: %d entries, %d differences, %.1f ms, feedparser '
+          '%.1f ms (%.1fx)' % (path, len(fast['entries']),
+                               len(differences),
+                               fast_time * 1000, slow_time * 1000,
+                               slow_time / fast_time))
+
+    dates = [entry[key] for entry in fast['entries']
+             for key in ('updated', 'published') if entry.get(key)]
+    if dates:
+        _time_dates(path, dates, rounds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip(),
+                                     formatter_class=argparse.
+                                     RawDescriptionHelpFormatter)
+    parser.add_argument('paths', metavar='CATALOG', nargs='+')
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    for path in args.paths:
+        _bench(path, args.rounds)
+
+
+if __name__ == '__main__':
+    main()
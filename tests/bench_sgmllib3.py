@@ -0,0 +1,100 @@
+#! /usr/bin/env python3
+
+# Copyright (C) 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+"""
+Times the sgmllib3 tokenizer on the malformed catalogs of
+tests/feeds/malformed, and another copy of it for comparison:
+
+    git show <commit>:sgmllib3.py > /tmp/old_sgmllib3.py
+    python3 tests/bench_sgmllib3.py --against /tmp/old_sgmllib3.py
+
+Both copies have to report the same events for the numbers to mean
+anything; the differences are counted.
+"""
+
+import argparse
+import importlib.util
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import sgmllib3
+from test_sgmllib3 import read_corpus, recording_parser
+
+
+def _load(path):
+    spec = importlib.util.spec_from_file_location('other_sgmllib3', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _time(module, texts, rounds):
+    start = time.time()
+    for n in range(rounds):
+        for text in texts:
+            parser = module.SGMLParser()
+            parser.feed(text)
+            parser.close()
+    return (time.time() - start) / rounds
+
+
+def _events(module, text):
+    parser = recording_parser(module)()
+    parser.feed(text)
+    parser.close()
+    return parser.events
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip(),
+                                     formatter_class=argparse.
+                                     RawDescriptionHelpFormatter)
+    parser.add_argument('--against', metavar='SGMLLIB3',
+                        help='another sgmllib3.py to time')
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='copies of every catalog in a document')
+    args = parser.parse_args()
+
+    texts = [text * args.repeat for name, text in read_corpus()]
+    size = sum(len(text) for text in texts)
+    modules = [('sgmllib3', sgmllib3)]
+    if args.against:
+        modules.append((args.against, _load(args.against)))
+
+    times = []
+    for name, module in modules:
+        elapsed = _time(module, texts, args.rounds)
+        times.append(elapsed)
+        print('%s: %.1f ms for %d KB, %.1f MB/s' %
+              (name, elapsed * 1000, size // 1024,
+               size / elapsed / 1024 / 1024))
+    if args.against:
+        differences = sum(1 for name, text in read_corpus()
+                          if _events(sgmllib3, text) !=
+                          _events(modules[1][1], text))
+        print('%.2fx, %d catalogs with other events' %
+              (times[1] / times[0], differences))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+# Copyright (C) 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import http.client
+import http.server
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import bookproxy
+
+_BOOK = bytes(range(256)) * 2048
+_FIRST = 64 * 1024
+
+
+class _Origin(http.server.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _headers(self, status, length, extra=()):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/epub+zip')
+        self.send_header('ETag', '"book"')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(length))
+        for header, value in extra:
+            self.send_header(header, value)
+        self.end_headers()
+
+    def do_HEAD(self):
+        self.server.requests.append(('HEAD', self.path))
+        self._headers(200, len(_BOOK))
+
+    def do_GET(self):
+        self.server.requests.append(('GET', self.path))
+        if self.path.startswith('/redirect'):
+            self.send_response(302)
+            self.send_header('Location', 'http://localhost:%d/book' %
+                             self.server.server_port)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.path.startswith('/gz'):
+            self._headers(200, 4, [('Content-Encoding', 'gzip')])
+            self.wfile.write(b'gzip')
+            return
+        match = re.match(r'bytes=(\d+)-(\d+)', self.headers.get('Range', ''))
+        if match:
+            start, end = int(match.group(1)), int(match.group(2))
+            self._headers(206, end - start + 1,
+                          [('Content-Range', 'bytes %d-%d/%d' %
+                            (start, end, len(_BOOK)))])
+            self.wfile.write(_BOOK[start:end + 1])
+            return
+        self._headers(200, len(_BOOK))
+        self.wfile.write(_BOOK[:_FIRST])
+        self.wfile.flush()
+        # the rest comes when the test lets it
+        self.server.release.wait(10)
+        self.wfile.write(_BOOK[_FIRST:])
+
+
+def _serve(server):
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+
+class ProxyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.origin = http.server.ThreadingHTTPServer(('127.0.0.1', 0),
+                                                      _Origin)
+        self.origin.requests = []
+        self.origin.release = threading.Event()
+        _serve(self.origin)
+        self.cache_dir = tempfile.mkdtemp()
+        self.proxy = bookproxy.Proxy(bookproxy.ProxyCache(self.cache_dir),
+                                     hosts=['127.0.0.1'])
+        self.server = bookproxy.ProxyServer(('127.0.0.1', 0), self.proxy)
+        _serve(self.server)
+
+    def tearDown(self):
+        self.origin.release.set()
+        self.server.shutdown()
+        self.server.server_close()
+        self.origin.shutdown()
+        self.origin.server_close()
+        shutil.rmtree(self.cache_dir)
+
+    def _request(self, method, path, headers=None, host='127.0.0.1'):
+        conn = http.client.HTTPConnection('127.0.0.1',
+                                          self.server.server_port,
+                                          timeout=10)
+        self.addCleanup(conn.close)
+        conn.request(method, '/http/%s:%d%s' %
+                     (host, self.origin.server_port, path),
+                     headers=headers or {})
+        return conn.getresponse()
+
+    def test_sends_while_fetching(self):
+        response = self._request('GET', '/book')
+        self.assertEqual(response.status, 200)
+        self.assertEqual(int(response.getheader('Content-Length')),
+                         len(_BOOK))
+        # the origin is still holding the rest back
+        self.assertEqual(response.read(_FIRST), _BOOK[:_FIRST])
+        self.origin.release.set()
+        self.assertEqual(response.read(), _BOOK[_FIRST:])
+
+        deadline = time.time() + 5
+        while self.proxy.stats['MISS'] and time.time() < deadline:
+            response = self._request('GET', '/book')
+            if response.getheader('X-Cache') == 'HIT':
+                break
+            response.read()
+            time.sleep(0.05)
+        self.assertEqual(response.getheader('X-Cache'), 'HIT')
+        self.assertEqual(response.read(), _BOOK)
+        self.assertEqual(self.origin.requests.count(('GET', '/book')), 1)
+
+    def test_range_ahead_of_fetch(self):
+        first = self._request('GET', '/book')
+        self.assertEqual(first.read(_FIRST), _BOOK[:_FIRST])
+        response = self._request('GET', '/book',
+                                 {'Range': 'bytes=300000-300099',
+                                  'If-Range': '"book"'})
+        self.assertEqual(response.status, 206)
+        self.assertEqual(response.read(), _BOOK[300000:300100])
+
+    def test_head_does_not_fetch(self):
+        response = self._request('HEAD', '/book')
+        response.read()
+        self.assertEqual(response.status, 200)
+        self.assertEqual(int(response.getheader('Content-Length')),
+                         len(_BOOK))
+        self.assertEqual(response.getheader('ETag'), '"book"')
+        self.assertEqual(response.getheader('Accept-Ranges'), 'bytes')
+        self.assertEqual(self.origin.requests, [('HEAD', '/book')])
+
+    def test_keeps_content_encoding(self):
+        for cache in ('MISS', 'HIT'):
+            response = self._request('GET', '/gz')
+            self.assertEqual(response.read(), b'gzip')
+            self.assertEqual(response.getheader('X-Cache'), cache)
+            self.assertEqual(response.getheader('Content-Encoding'), 'gzip')
+
+    def test_evicted_data(self):
+        self._request('GET', '/gz').read()
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.data'):
+                os.remove(os.path.join(self.cache_dir, name))
+        response = self._request('GET', '/gz')
+        self.assertEqual(response.status, 200)
+        self.assertEqual(response.read(), b'gzip')
+
+    def test_other_hosts_refused(self):
+        for method in ('GET', 'HEAD'):
+            response = self._request(method, '/book', host='localhost')
+            response.read()
+            self.assertEqual(response.status, 403)
+        response = self._request('GET', '/redirect')
+        response.read()
+        self.assertEqual(response.status, 502)
+        self.assertEqual(self.origin.requests, [('GET', '/redirect')])
+
+
+class AllowedUrlTest(unittest.TestCase):
+
+    def test_is_allowed_url(self):
+        hosts = ['archive.org']
+        for url in ('https://archive.org/download/x/x.epub',
+                    'http://ia800204.us.archive.org/x.pdf',
+                    'https://bookserver.archive.org:443/catalog/new'):
+            self.assertTrue(bookproxy.is_allowed_url(url, hosts), url)
+        for url in ('ftp://archive.org/x', 'file:///etc/passwd',
+                    'http://127.0.0.1/', 'http://evilarchive.org/',
+                    'http://archive.org.example.com/',
+                    'http://archive.org@169.254.169.254/',
+                    'http://archive.org:bad/'):
+            self.assertFalse(bookproxy.is_allowed_url(url, hosts), url)
+
+
+if __name__ == '__main__':
+    unittest.main()
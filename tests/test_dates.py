@@ -0,0 +1,73 @@
+# Copyright (C) 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import random
+import unittest
+
+import feedparser
+
+_FORMATS = ['%Y-%m-%d', '%Y-%m-%dT%H:%M:%SZ', '%Y-%m-%dT%H:%M:%S+01:00',
+            '%a, %d %b %Y %H:%M:%S GMT', '%Y%m%d', '%Y-%j', '%d %b %Y']
+
+
+def _parse_every_handler(date):
+    return feedparser._parse_date_with_handlers(
+        date, feedparser._date_handlers)[0]
+
+
+class ParseDateTest(unittest.TestCase):
+
+    def setUp(self):
+        feedparser._date_cache.clear()
+
+    def test_same_shape_other_handler(self):
+        for date in ('1939-0-0', '2010-3-4', '1939-0-0', '2010-3-4'):
+            self.assertEqual(feedparser._parse_date(date),
+                             _parse_every_handler(date), date)
+        self.assertEqual(feedparser._parse_date('2010-3-4')[:3],
+                         (2010, 3, 4))
+
+    def test_mixed_shapes(self):
+        rng = random.Random(4)
+        dates = []
+        for n in range(2000):
+            if rng.random() < 0.5:
+                dates.append('%d-%d-%d' % (rng.randint(1800, 2030),
+                                           rng.randint(0, 13),
+                                           rng.randint(0, 32)))
+            else:
+                timestamp = rng.randint(-5000000000, 2000000000)
+                dates.append(feedparser.time.strftime(
+                    rng.choice(_FORMATS), feedparser.time.gmtime(timestamp)))
+        # repeated too, to go through the cache
+        dates += rng.sample(dates, 500)
+        for date in dates:
+            self.assertEqual(feedparser._parse_date(date),
+                             _parse_every_handler(date), date)
+
+    def test_least_recently_used_dropped(self):
+        size = feedparser._DATE_CACHE_SIZE
+        self.addCleanup(setattr, feedparser, '_DATE_CACHE_SIZE', size)
+        feedparser._DATE_CACHE_SIZE = 3
+        for date in ('2001-01-01', '2002-01-01', '2003-01-01',
+                     '2001-01-01', '2004-01-01'):
+            feedparser._parse_date(date)
+        self.assertEqual(list(feedparser._date_cache),
+                         ['2003-01-01', '2001-01-01', '2004-01-01'])
+
+
+if __name__ == '__main__':
+    unittest.main()
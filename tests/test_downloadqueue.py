@@ -0,0 +1,76 @@
+# Copyright (C) 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import unittest
+
+try:
+    import downloadqueue
+except ImportError:
+    # downloadqueue needs the GObject introspection bindings
+    downloadqueue = None
+
+
+class _Book(object):
+
+    def __init__(self, identifier, source=None):
+        self._identifier = identifier
+        self._source = source
+
+    def get_title(self):
+        return self._identifier
+
+    def get_identifier(self):
+        return self._identifier
+
+    def get_source(self):
+        return self._source
+
+    def get_download_links(self, content_type, download_cb, path):
+        # left resolving
+        return None
+
+
+@unittest.skipIf(downloadqueue is None, 'gi is not available')
+class DownloadQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.queue = downloadqueue.DownloadQueue(lambda: '/nonexistent')
+
+    def test_same_book_is_not_queued_twice(self):
+        item = self.queue.add(_Book('a'), 'application/epub+zip', {})
+        self.assertIs(self.queue.add(_Book('a'), 'application/epub+zip',
+                                     {}, downloadqueue.PRIORITY_HIGH),
+                      item)
+        self.assertEqual(item.priority, downloadqueue.PRIORITY_HIGH)
+        self.assertEqual(self.queue.get_items(), [item])
+
+        others = [self.queue.add(_Book('a'), 'application/pdf', {}),
+                  self.queue.add(_Book('a', 'other'),
+                                 'application/epub+zip', {}),
+                  self.queue.add(_Book('b'), 'application/epub+zip', {})]
+        self.assertEqual(self.queue.get_items(), [item] + others)
+
+    def test_queued_again_once_finished(self):
+        item = self.queue.add(_Book('a'), 'application/epub+zip', {})
+        self.queue.cancel(item)
+        again = self.queue.add(_Book('a'), 'application/epub+zip', {})
+        self.assertIsNot(again, item)
+        self.queue.retry(item)
+        self.assertEqual(item.state, downloadqueue.STATE_CANCELLED)
+
+
+if __name__ == '__main__':
+    unittest.main()
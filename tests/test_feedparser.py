@@ -0,0 +1,69 @@
+# Copyright (C) 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import os
+import unittest
+
+import feedparser
+import sgmllib3
+
+MALFORMED = os.path.join(os.path.dirname(__file__), 'feeds', 'malformed')
+
+_UNSAFE = b'''<?xml version="1.0" encoding="utf-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+  <id>urn:unsafe</id>
+  <title>Unsafe</title>
+  <entry>
+    <id>urn:book:1</id>
+    <title>Book</title>
+    <summary type="html">&lt;p onclick="steal()"&gt;Nice&lt;script&gt;steal()&lt;/script&gt; &lt;a href="/book"&gt;book&lt;/a&gt;&lt;/p&gt;</summary>
+  </entry>
+</feed>'''
+
+
+class LooseParserTest(unittest.TestCase):
+
+    def test_uses_sgmllib3(self):
+        self.assertTrue(feedparser._SGML_AVAILABLE)
+        self.assertIs(feedparser.sgmllib, sgmllib3)
+
+    def test_malformed_catalogs(self):
+        # without the loose parser these give no entries at all
+        for name in sorted(os.listdir(MALFORMED)):
+            with open(os.path.join(MALFORMED, name), 'rb') as f:
+                result = feedparser.parse(f.read())
+            self.assertTrue(result['bozo'], name)
+            self.assertEqual(len(result['entries']), 12, name)
+            self.assertTrue(result['entries'][0]['title'].startswith(
+                'Book 0 &'), name)
+            self.assertTrue(result['entries'][-1]['links'], name)
+
+    def test_sanitizer(self):
+        result = feedparser.parse(
+            _UNSAFE,
+            response_headers={'content-location': 'http://example.org/'})
+        self.assertEqual(result['entries'][0]['summary'],
+                         '<p>Nice <a href="http://example.org/book">'
+                         'book</a></p>')
+
+    def test_lean_profile(self):
+        result = feedparser.parse(_UNSAFE, resolve_relative_uris=False,
+                                  sanitize_html=False)
+        self.assertIn('<script>', result['entries'][0]['summary'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+# Copyright (C) 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import http.server
+import sys
+import threading
+import time
+import unittest
+
+import httppool
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        slow = self.path == '/book'
+        self.send_response(200)
+        self.send_header('Content-Length', '2' if slow else '1')
+        self.end_headers()
+        self.wfile.write(b'x')
+        self.wfile.flush()
+        if slow:
+            self.server.release.wait(10)
+            self.wfile.write(b'x')
+
+
+class _Server(http.server.ThreadingHTTPServer):
+
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # the pool drops the connections of a test when it is closed
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            http.server.ThreadingHTTPServer.handle_error(
+                self, request, client_address)
+
+
+class ConnectionLimitTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = _Server(('127.0.0.1', 0), _Handler)
+        self.server.release = threading.Event()
+        threading.Thread(target=self.server.serve_forever,
+                         daemon=True).start()
+        self.base = 'http://127.0.0.1:%d' % self.server.server_port
+        self.pool = httppool.ConnectionPool()
+
+    def tearDown(self):
+        self.server.release.set()
+        self.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _start_books(self, count):
+        responses = []
+
+        def download():
+            token = httppool.CancelToken(httppool.PRIORITY_INTERACTIVE,
+                                         bulk=True)
+            response = self.pool.request(self.base + '/book', token=token)
+            responses.append(response)
+            response.read()
+
+        for n in range(count):
+            threading.Thread(target=download, daemon=True).start()
+        return responses
+
+    def test_bulk_transfers_leave_a_connection(self):
+        self.pool.set_host_policy('127.0.0.1', max_connections=4)
+        responses = self._start_books(4)
+        deadline = time.time() + 5
+        while len(responses) < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.2)
+        # the fourth segment waits, a catalog page does not
+        self.assertEqual(len(responses), 3)
+        start = time.time()
+        response = self.pool.request(self.base + '/catalog')
+        self.assertEqual(response.read(), b'x')
+        self.assertLess(time.time() - start, 1)
+
+        self.server.release.set()
+        deadline = time.time() + 5
+        while len(responses) < 4 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(responses), 4)
+
+    def test_single_connection_host(self):
+        self.pool.set_host_policy('127.0.0.1', max_connections=1)
+        responses = self._start_books(1)
+        deadline = time.time() + 5
+        while not responses and time.time() < deadline:
+            time.sleep(0.01)
+        response = self.pool.request(self.base + '/catalog')
+        self.assertEqual(response.read(), b'x')
+
+    def test_zero_rate_is_unlimited(self):
+        self.pool.set_host_policy('127.0.0.1', rate=0, burst=0)
+        for n in range(3):
+            response = self.pool.request(self.base + '/catalog')
+            self.assertEqual(response.read(), b'x')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+# Copyright (C) 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import unittest
+
+import journalindex
+
+
+class JournalIndexTest(unittest.TestCase):
+
+    def test_remove_gives_checksum(self):
+        index = journalindex.JournalIndex()
+        index.add('1', {'source': 'IA', 'source_id': 'book',
+                        'mime_type': 'application/epub+zip',
+                        'sha1': 'ABC'})
+        index.add('2', {'source_url': 'http://archive.org/b.pdf',
+                        'mime_type': 'application/pdf', 'sha1': 'abc'})
+        self.assertEqual(index.lookup(sha1='abc'), '2')
+
+        self.assertEqual(index.remove('2'), 'abc')
+        self.assertIsNone(index.lookup(url='http://archive.org/b.pdf'))
+        self.assertEqual(index.get_checksums(),
+                         [('ABC', '1', 'application/epub+zip')])
+        self.assertEqual(index.remove('1'), 'ABC')
+        self.assertIsNone(index.remove('1'))
+        self.assertEqual(len(index), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
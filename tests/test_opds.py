@@ -0,0 +1,90 @@
+# Copyright (C) 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import os
+import tempfile
+import unittest
+
+import bandwidth
+import opdsparser
+
+try:
+    import opds
+except ImportError:
+    # opds needs the GObject introspection bindings
+    opds = None
+
+_FEEDS = os.path.join(os.path.dirname(__file__), 'feeds')
+
+
+@unittest.skipIf(opds is None, 'gi is not available')
+class BookTest(unittest.TestCase):
+
+    def test_summary_is_sanitized_when_shown(self):
+        with open(os.path.join(_FEEDS, 'unsafe.xml'), 'rb') as f:
+            entries = opdsparser.parse(
+                f.read(), 'http://localhost/feeds/unsafe.xml')['entries']
+        book = opds.Book({'summary_field': 'summary'}, entries[0])
+        self.assertEqual(
+            book.get_summary(),
+            '<p>Nice <a href="http://localhost/feeds/more.html">book</a></p>'
+            '<img src="http://localhost/feeds/cover.jpg" />')
+        self.assertEqual(opds.Book({'summary_field': 'rights'},
+                                   entries[0]).get_summary(), 'Unknown')
+
+
+@unittest.skipIf(opds is None, 'gi is not available')
+class QueryResultTest(unittest.TestCase):
+
+    def test_no_next_page_before_the_first(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(os.rmdir, path)
+        result = opds.LocalVolumeQueryResult(path, '', 'all')
+        self.addCleanup(result.cancel)
+        self.assertFalse(result.has_next())
+
+
+@unittest.skipIf(opds is None, 'gi is not available')
+class FileDownloaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = bandwidth.get_manager()
+        limits = self.manager.get_limits()
+        self.addCleanup(self.manager.set_limits, **limits)
+        self.manager.set_limits(foreground=64 * 1024)
+
+    def _thread(self, **kwargs):
+        # not started, the transfer is taken when the thread is made
+        thread = opds.FileDownloaderThread(
+            'http://localhost/x', '/nonexistent', None, None, **kwargs)
+        if thread.transfer is not None:
+            self.addCleanup(thread.transfer.close)
+        return thread
+
+    def test_cover_does_not_take_the_book_share(self):
+        book = self._thread(partial_dir='/nonexistent', throttled=True)
+        self.assertEqual(book.transfer.bucket.get_rate(), 64 * 1024)
+        cover = self._thread()
+        self.assertIsNone(cover.transfer)
+        self.assertEqual(book.transfer.bucket.get_rate(), 64 * 1024)
+
+        other = self._thread(partial_dir='/nonexistent', throttled=True)
+        self.assertEqual(book.transfer.bucket.get_rate(), 32 * 1024)
+        self.assertEqual(other.transfer.bucket.get_rate(), 32 * 1024)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+# Copyright (C) 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import os
+import unittest
+
+import feedparser
+import opdsparser
+
+_FEEDS = os.path.join(os.path.dirname(__file__), 'feeds')
+
+
+def _read(name):
+    with open(os.path.join(_FEEDS, name), 'rb') as f:
+        return f.read()
+
+# what Book reads of an entry
+_BOOK_FIELDS = ('id', 'title', 'author', 'author_detail', 'authors',
+                'published', 'summary', 'summary_detail', 'content')
+
+
+def _book_fields(entry):
+    fields = dict((key, entry.get(key)) for key in _BOOK_FIELDS)
+    for key in entry:
+        if key.startswith('dcterms_'):
+            fields[key] = entry[key]
+    fields['links'] = sorted((link.get('rel'), link.get('type'),
+                              link.get('href'))
+                             for link in entry.get('links', []))
+    return fields
+
+
+def compare(data, base_uri):
+    """
+    Returns the differences between the Book fields opdsparser and
+    feedparser give for the feed in data served from base_uri, as
+    (entry number, key, ours, feedparser's); an entry number of None
+    tells the number of entries differs.  Raises what parse raises.
+    """
+    fast = opdsparser.parse(data, base_uri)
+    slow = feedparser.parse(data,
+                            response_headers={'content-location': base_uri},
+                            **opdsparser.LEAN_PROFILE)
+    differences = []
+    if len(fast['entries']) != len(slow['entries']):
+        differences.append((None, 'entries', len(fast['entries']),
+                            len(slow['entries'])))
+    for number, (ours, theirs) in enumerate(zip(fast['entries'],
+                                                slow['entries'])):
+        ours, theirs = _book_fields(ours), _book_fields(theirs)
+        for key in sorted(set(ours) | set(theirs)):
+            if ours.get(key) != theirs.get(key):
+                differences.append((number, key, ours.get(key),
+                                    theirs.get(key)))
+    return differences
+
+
+class ParityTest(unittest.TestCase):
+
+    def test_no_differences_with_feedparser(self):
+        for name in sorted(os.listdir(_FEEDS)):
+            if not name.endswith('.xml'):
+                continue
+            base_uri = 'http://localhost/feeds/' + name
+            self.assertEqual(compare(_read(name), base_uri), [], name)
+
+    def test_xhtml(self):
+        entries = opdsparser.parse(_read('xhtml.xml'))['entries']
+        self.assertEqual(entries[0]['title'], 'The <i>Odyssey</i>')
+        self.assertEqual(entries[0]['summary'], '<p>Para <i>it</i></p>')
+        self.assertEqual(entries[3]['title'],
+                         '<div>First</div><div>Second</div>')
+
+    def test_authors(self):
+        entries = opdsparser.parse(_read('authors.xml'))['entries']
+        self.assertEqual(entries[0]['author'], 'Alice (j@x.org)')
+        self.assertEqual(entries[0]['author_detail'],
+                         {'name': 'Alice', 'email': 'j@x.org'})
+        self.assertEqual(entries[2]['author'], 'Eve')
+        self.assertEqual(entries[2]['author_detail'], {'name': 'Dan'})
+
+    def test_xml_base(self):
+        entries = opdsparser.parse(_read('base.xml'),
+                                   'http://localhost/base.xml')['entries']
+        self.assertEqual(sorted(link['href'] for link in
+                                entries[0]['links']),
+                         ['http://books.example.org/catalog/shelf/one.epub',
+                          'http://books.example.org/other/one.jpg'])
+
+
+class SanitizeTest(unittest.TestCase):
+
+    def test_as_feedparser_gives_it(self):
+        data = _read('unsafe.xml')
+        base_uri = 'http://localhost/feeds/unsafe.xml'
+        full = feedparser.parse(
+            data, response_headers={'content-location': base_uri})
+        lean = opdsparser.parse(data, base_uri)
+        for ours, theirs in zip(lean['entries'], full['entries']):
+            self.assertEqual(opdsparser.sanitize(ours, 'summary'),
+                             theirs['summary'])
+        self.assertIn('<script>', lean['entries'][0]['summary'])
+
+    def test_unsafe_markup_removed(self):
+        entries = opdsparser.parse(
+            _read('unsafe.xml'),
+            'http://localhost/feeds/unsafe.xml')['entries']
+        self.assertEqual(
+            opdsparser.sanitize(entries[0], 'summary'),
+            '<p>Nice <a href="http://localhost/feeds/more.html">book</a></p>'
+            '<img src="http://localhost/feeds/cover.jpg" />')
+        self.assertEqual(opdsparser.sanitize(entries[1], 'summary'),
+                         '<p>Hi <a href="">there</a></p>')
+        self.assertEqual(opdsparser.sanitize(entries[2], 'summary'),
+                         '<script> is only text here')
+        self.assertRaises(KeyError, opdsparser.sanitize, entries[0],
+                          'rights')
+
+
+if __name__ == '__main__':
+    unittest.main()
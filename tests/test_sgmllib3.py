@@ -0,0 +1,159 @@
+# Copyright (C) 2026 Sugar Labs
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import hashlib
+import os
+import unittest
+
+import sgmllib3
+
+MALFORMED = os.path.join(os.path.dirname(__file__), 'feeds', 'malformed')
+
+# the SHA-1 of what the sgmllib3 of before goahead was rewritten reported
+# for the malformed catalogs, fed whole and 3 characters at a time
+_CORPUS_EVENTS = {
+    'ampersands.xml': ('583ecff4dcca3b04eea2cda2100da034d22c08cd',
+                       '583ecff4dcca3b04eea2cda2100da034d22c08cd'),
+    'attrs.xml': ('e890037f7487d1b7c94b9fcd5f53cb9aa6f6fb62',
+                  '384e33d041de256232543f0ab38140502c13ee24'),
+    'comments.xml': ('d1a25fd279f2e036fe6b64957b049f0895e40760',
+                     'd1a25fd279f2e036fe6b64957b049f0895e40760'),
+    'entities.xml': ('2e5f979ec9ddd36404f1e03887dde33b6c828587',
+                     '2e5f979ec9ddd36404f1e03887dde33b6c828587'),
+    'latin1.xml': ('96d5765a4bae4605f95d720f18f1491a8ab42eb3',
+                   '96d5765a4bae4605f95d720f18f1491a8ab42eb3'),
+    'noclose.xml': ('93b40457716a138de1a172bbe051561b45cf4849',
+                    '93b40457716a138de1a172bbe051561b45cf4849'),
+    'truncated.xml': ('850180e4907960589623bde784a50ccbbf8a34e9',
+                      '850180e4907960589623bde784a50ccbbf8a34e9'),
+    'unclosed.xml': ('18ca552eab4e7e553a0cd8c677f9897ce4c5b9bc',
+                     '18ca552eab4e7e553a0cd8c677f9897ce4c5b9bc'),
+}
+
+
+def recording_parser(module):
+    """
+    Returns a parser class of the sgmllib3 module that keeps what the
+    tokenizer reports, with the runs of text joined
+    """
+
+    class RecordingParser(module.SGMLParser):
+
+        def __init__(self):
+            self.events = []
+            module.SGMLParser.__init__(self)
+
+        def _add(self, *event):
+            self.events.append(event)
+
+        def handle_data(self, data):
+            if self.events and self.events[-1][0] == 'data':
+                self.events[-1] = ('data', self.events[-1][1] + data)
+            else:
+                self._add('data', data)
+
+        def handle_comment(self, data):
+            self._add('comment', data)
+
+        def handle_pi(self, data):
+            self._add('pi', data)
+
+        def handle_decl(self, data):
+            self._add('decl', data)
+
+        def unknown_decl(self, data):
+            self._add('unknown_decl', data)
+
+        def unknown_starttag(self, tag, attrs):
+            self._add('start', tag, attrs)
+
+        def unknown_endtag(self, tag):
+            self._add('end', tag)
+
+        def unknown_charref(self, ref):
+            self._add('charref', ref)
+
+        def unknown_entityref(self, ref):
+            self._add('entityref', ref)
+
+        def start_pre(self, attrs):
+            self._add('start', 'pre', attrs)
+            self.setliteral()
+
+        def end_pre(self):
+            self._add('end', 'pre')
+
+        def do_br(self, attrs):
+            self._add('br', attrs)
+
+    return RecordingParser
+
+
+RecordingParser = recording_parser(sgmllib3)
+
+
+def tokenize(text, chunk=None):
+    parser = RecordingParser()
+    if chunk is None:
+        parser.feed(text)
+    else:
+        for start in range(0, len(text), chunk):
+            parser.feed(text[start:start + chunk])
+    parser.close()
+    return parser.events
+
+
+def read_corpus():
+    for name in sorted(os.listdir(MALFORMED)):
+        with open(os.path.join(MALFORMED, name), 'rb') as f:
+            yield name, f.read().decode('utf-8', 'replace')
+
+
+class TokenizerTest(unittest.TestCase):
+
+    def test_markup(self):
+        self.assertEqual(
+            tokenize('<a href="x&amp;y" B=1>t &amp; &#65; &bogus; '
+                     '&#x41;</a></b <!-- c --><?pi x?><!DOCTYPE html>'),
+            [('start', 'a', [('href', 'x&y'), ('b', '1')]),
+             ('data', 't & A '), ('entityref', 'bogus'),
+             ('data', ' &#x41;'), ('end', 'a'), ('end', 'b'),
+             ('comment', ' c '), ('pi', 'pi x?'), ('decl', 'DOCTYPE html')])
+
+    def test_stray_markup(self):
+        # <> and </> repeat the last tag, <x/y/ is a short tag
+        self.assertEqual(tokenize('1 < 2 & <> </> <1> <x/y/ &'),
+                         [('data', '1 < 2 & '), ('start', '???', []),
+                          ('data', ' '), ('end', ''), ('data', ' <1> '),
+                          ('start', 'x', []), ('data', 'y'), ('end', 'x'),
+                          ('data', ' &')])
+
+    def test_handlers(self):
+        self.assertEqual(
+            tokenize('<br class=a><pre><b>&amp;</pre>after</b>'),
+            [('br', [('class', 'a')]), ('start', 'pre', []),
+             ('data', '<b>&amp;'), ('end', 'pre'), ('data', 'after'),
+             ('end', 'b')])
+
+    def test_corpus(self):
+        for name, text in read_corpus():
+            events = tuple(hashlib.sha1(repr(tokenize(text, chunk)).encode())
+                           .hexdigest() for chunk in (None, 3))
+            self.assertEqual(events, _CORPUS_EVENTS[name], name)
+
+
+if __name__ == '__main__':
+    unittest.main()